@@ -1,4 +1,6 @@
 import os
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
@@ -9,8 +11,26 @@ from .routers.sessao_votacao_router import sessaovotacao_router
 from .routers.voto_individual_router import voto_router
 from .routers.partido_router import partido_router
 from .routers.proposicao_router import proposicao_router
+from .tratamentoDados.database import registro_engines
+from .tratamentoDados.statusBancos import anos_com_banco
 
-app = FastAPI()
+# Anos abertos e aquecidos quando o worker sobe ("2023,2024"; vazio = os bancos mais recentes da pasta 'dbs')
+ANOS_AQUECIDOS = os.getenv("API_ANOS_AQUECIDOS", "")
+# Threads que executam as rotas síncronas (e as consultas ao SQLite) em cada worker; 0 = padrão do anyio (40)
+THREADS_API = int(os.getenv("API_THREADS", "0"))
+
+# Cada worker do uvicorn importa este módulo no seu próprio processo, então tem o seu registro de engines;
+# ao subir, ele já abre e aquece os bancos para que a primeira requisição não pague a abertura.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if THREADS_API > 0:
+        to_thread.current_default_thread_limiter().total_tokens = THREADS_API
+    anos = [int(ano) for ano in ANOS_AQUECIDOS.split(",") if ano.strip()] or anos_com_banco()
+    await to_thread.run_sync(registro_engines.aquecer, anos)
+    yield
+    registro_engines.descartar()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,12 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class AgregadoDeputado(SQLModel, table=True):
+    # Uma linha por deputado do banco, refeita ao final de cada ETL do ano (api/tratamentoDados/agregados.py)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    id_deputado: int = Field(index=True, unique=True, description="ID do deputado (deputado.id).")
+    total_despesas: float = Field(default=0.0, description="Soma de valor_liquido de todas as despesas do deputado.")
+    quantidade_despesas: int = Field(default=0)
+    sessoes_votadas: int = Field(default=0, description="Sessões de votação distintas em que o deputado votou.")
+    votacoes_com_proposicao: int = Field(default=0, description="Sessões votadas ligadas a ao menos uma proposição.")
+    proposicoes_votadas: int = Field(default=0, description="Proposições distintas dessas sessões.")
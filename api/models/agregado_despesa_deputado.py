@@ -0,0 +1,17 @@
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class AgregadoDespesaDeputado(SQLModel, table=True):
+    # Tabela de resumo, refeita ao final de cada ETL do ano (api/tratamentoDados/agregados.py)
+    __table_args__ = (
+        Index("ix_agregadodespesadeputado_chave", "id_deputado", "ano", "mes", "tipo_despesa", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    id_deputado: int = Field(description="ID do deputado (deputado.id).")
+    ano: int = Field(description="Ano das despesas.")
+    mes: int = Field(description="Mês das despesas.")
+    tipo_despesa: Optional[str] = Field(default=None, max_length=300)
+    total_valor: float = Field(default=0.0, description="Soma de valor_liquido.")
+    quantidade: int = Field(default=0, description="Número de despesas somadas.")
@@ -0,0 +1,16 @@
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class AgregadoDespesaUf(SQLModel, table=True):
+    # Tabela de resumo, refeita ao final de cada ETL do ano (api/tratamentoDados/agregados.py)
+    __table_args__ = (
+        Index("ix_agregadodespesauf_ano_uf", "ano", "sigla_uf", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    sigla_uf: str = Field(max_length=2)
+    ano: int = Field(description="Ano das despesas.")
+    total_gasto: float = Field(default=0.0, description="Soma de valor_liquido dos deputados da UF.")
+    quantidade: int = Field(default=0, description="Número de despesas somadas.")
+    total_deputados: int = Field(default=0, description="Deputados da UF com alguma despesa no ano.")
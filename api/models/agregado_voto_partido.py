@@ -0,0 +1,15 @@
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class AgregadoVotoPartido(SQLModel, table=True):
+    # Tabela de resumo, refeita ao final de cada ETL do ano (api/tratamentoDados/agregados.py)
+    __table_args__ = (
+        Index("ix_agregadovotopartido_tipo_ano", "tipo_voto", "ano", "id_partido"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    id_partido: int = Field(description="ID do partido (partido.id) do deputado que votou.")
+    ano: Optional[int] = Field(default=None, description="Ano do voto (NULL quando a data não foi reconhecida).")
+    tipo_voto: Optional[str] = Field(default=None, max_length=50)
+    total_votos: int = Field(default=0)
@@ -0,0 +1,15 @@
+from typing import Optional
+from sqlalchemy import TEXT, Column
+from sqlmodel import Field, SQLModel
+
+class CheckpointEtapa(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    etapa: str = Field(index=True, unique=True, max_length=50, description="Etapa do ETL (partidos, deputados, despesas, votacoes, votos).")
+    status: str = Field(default="pendente", max_length=20, description="pendente, em_andamento, concluida ou falhou.")
+    lotes_concluidos: int = Field(default=0, description="Lotes já gravados e confirmados no banco nesta execução da etapa.")
+    registros: int = Field(default=0, description="Registros gravados pelos lotes concluídos.")
+    posicao_arquivo: Optional[int] = Field(default=None, description="Itens do arquivo anual já consumidos pelos lotes concluídos.")
+    iniciado_em: Optional[str] = Field(default=None)
+    concluido_em: Optional[str] = Field(default=None)
+    duracao_segundos: Optional[float] = Field(default=None)
+    erro: Optional[str] = Field(default=None, sa_column=Column(TEXT))
@@ -1,8 +1,15 @@
 
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 
 class Despesa(SQLModel, table=True):
+    # Somas de valor_liquido por deputado (rankings) e por ano (análise por UF) lidas só do índice
+    __table_args__ = (
+        Index("ix_despesa_deputado_valor", "id_deputado", "valor_liquido"),
+        Index("ix_despesa_ano_deputado_valor", "ano", "id_deputado", "valor_liquido"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     id_deputado: int = Field(foreign_key="deputado.id", index=True, description="ID do deputado a quem a despesa pertence.")
     ano: int = Field(description="Ano da despesa.")
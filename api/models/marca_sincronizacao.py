@@ -0,0 +1,12 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class MarcaSincronizacao(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    etapa: str = Field(index=True, unique=True, max_length=50, description="Etapa ou arquivo do ETL (despesas, votacoes, votos...).")
+    ultima_data_sessao: Optional[str] = Field(default=None, description="dataHoraRegistro da sessão mais recente já gravada.")
+    ultimo_id_sessao: Optional[int] = Field(default=None, description="Maior id (do banco) de sessão já considerada pela etapa.")
+    ultimo_mes_despesa: Optional[int] = Field(default=None, description="Mês mais recente com despesas gravadas.")
+    etag: Optional[str] = Field(default=None, max_length=255, description="ETag (ou Last-Modified) do arquivo remoto na última sincronização.")
+    hash_arquivo: Optional[str] = Field(default=None, max_length=64, description="SHA-256 do arquivo processado na última sincronização.")
+    atualizado_em: Optional[str] = Field(default=None)
@@ -0,0 +1,13 @@
+from typing import Optional
+from sqlalchemy import TEXT, Column
+from sqlmodel import Field, SQLModel
+
+class RequisicaoFalha(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    uri: str = Field(index=True, unique=True, max_length=1000, description="URI que falhou depois de esgotadas as tentativas.")
+    etapa: str = Field(index=True, max_length=50, description="Etapa do ETL que fez a requisição (partidos, deputados, sessoes, proposicoes, votos).")
+    erro: Optional[str] = Field(default=None, sa_column=Column(TEXT))
+    tentativas: int = Field(default=1, description="Execuções (completas ou de reprocessamento) em que a URI falhou.")
+    contexto: Optional[str] = Field(default=None, sa_column=Column(TEXT), description="JSON com o que depende da URI (ex: sessões que citam a proposição).")
+    primeira_falha: Optional[str] = Field(default=None)
+    ultima_falha: Optional[str] = Field(default=None)
@@ -1,12 +1,20 @@
 from typing import Optional, List
 from datetime import date, datetime
-from sqlalchemy import TEXT, Column
+from sqlalchemy import TEXT, Column, DateTime, Index
 from sqlmodel import Field, SQLModel, Relationship
 
 class SessaoVotacao(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_sessaovotacao_ano_mes", "ano", "mes"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     id_dados_abertos: str = Field(index=True, unique=True, description="ID da votação nos Dados Abertos da Câmara.")
     data_hora_registro: Optional[str] = Field(default=None, description="Data e hora do registro da votação.")
+    # Horário de Brasília, sem fuso (como vem da API)
+    data_hora: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, index=True))
+    ano: Optional[int] = Field(default=None, description="Ano de data_hora, para os filtros por ano.")
+    mes: Optional[int] = Field(default=None, description="Mês de data_hora.")
     descricao: Optional[str] = Field(description="Descrição da votação.", sa_column=Column(TEXT))
 
     sigla_orgao: Optional[str] = Field(default=None, max_length=500)
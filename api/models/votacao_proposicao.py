@@ -1,7 +1,14 @@
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 
 class VotacaoProposicao(SQLModel, table=True):
+    # Os dois sentidos do link, para os joins não precisarem voltar à tabela
+    __table_args__ = (
+        Index("ix_votacaoproposicao_proposicao_votacao", "id_proposicao", "id_votacao"),
+        Index("ix_votacaoproposicao_votacao_proposicao", "id_votacao", "id_proposicao"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     id_proposicao: int = Field(foreign_key="proposicao.id", index=True, description="ID da proposição associada.")
     id_votacao: int = Field(foreign_key="sessaovotacao.id", index=True, description="ID da sessão de votação associada.")
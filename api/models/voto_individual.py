@@ -1,13 +1,26 @@
 from typing import Optional, List
 from datetime import date, datetime
+from sqlalchemy import Column, DateTime, Index
 from sqlmodel import Field, SQLModel, Relationship
 
 class VotoIndividual(SQLModel, table=True):
+    # Filtros por ano nas análises: o ano vem junto com as chaves usadas nos joins (deputado e sessão)
+    __table_args__ = (
+        Index("ix_votoindividual_ano_deputado_tipo", "ano", "id_deputado", "tipo_voto"),
+        Index("ix_votoindividual_ano_votacao", "ano", "id_votacao"),
+        # Votos de uma sessão por partido/tipo e sessões distintas votadas por deputado
+        Index("ix_votoindividual_votacao_deputado_tipo", "id_votacao", "id_deputado", "tipo_voto"),
+        Index("ix_votoindividual_deputado_votacao", "id_deputado", "id_votacao"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     id_votacao: int = Field(foreign_key="sessaovotacao.id", index=True)
     id_deputado: int = Field(foreign_key="deputado.id", index=True)
     tipo_voto: Optional[str] = Field(max_length=50, description="Sim, Não, Abstenção, Obstrução, Ausente")
     data_hora_registro: Optional[str] = Field(default=None)
+    data_hora: Optional[datetime] = Field(default=None, sa_column=Column(DateTime))
+    ano: Optional[int] = Field(default=None, description="Ano de data_hora, para os filtros por ano.")
+    mes: Optional[int] = Field(default=None, description="Mês de data_hora.")
     sigla_partido_deputado: Optional[str] = Field(default=None, max_length=50)
     uri_deputado: Optional[str] = Field(default=None, max_length=500)
     uri_sessao_votacao:  Optional[str] = Field(default=None, max_length=500)
@@ -1,9 +1,11 @@
+from types import SimpleNamespace
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Query, Depends
-from sqlmodel import Session, String, case, desc, func, select
+from sqlmodel import Session, case, desc, func, select
 from api.tratamentoDados.database import get_session
+from api.tratamentoDados.matrizVotos import alinhamento_por_partido, matriz_do_ano
+from api.models.agregado_despesa_uf import AgregadoDespesaUf
 from api.models.deputado import Deputado
-from api.models.despesa import Despesa
 from api.models.partido import Partido
 from api.models.sessao_votacao import SessaoVotacao
 from api.models.voto_individual import VotoIndividual
@@ -27,37 +29,35 @@ async def comparativo_gastos_estados(
     """
     Agrupa os gastos parlamentares por estado, retornando o gasto 
     total, a média e a quantidade de despesas. 
-    Entidades: `Deputado` e `Despesa`.
+    Entidades: `AgregadoDespesaUf` (soma de `Despesa` por UF do `Deputado`, montada ao final do ETL).
     """
     try:
         
         stmt = (
             select(
-                Deputado.sigla_uf,
-                func.sum(Despesa.valor_liquido).label("total_gasto"),
-                func.avg(Despesa.valor_liquido).label("media_gasto"),
-                func.count(Despesa.id).label("quantidade"),
-                func.count(Deputado.id.distinct()).label("total_deputados")
+                AgregadoDespesaUf.sigla_uf,
+                AgregadoDespesaUf.total_gasto,
+                AgregadoDespesaUf.quantidade,
+                AgregadoDespesaUf.total_deputados
             )
-            .join(Despesa, Despesa.id_deputado == Deputado.id)
-            .where(Despesa.ano == year)
+            .where(AgregadoDespesaUf.ano == year)
         )
 
         if uf:
-            stmt = stmt.where(Deputado.sigla_uf == uf.upper())
+            stmt = stmt.where(AgregadoDespesaUf.sigla_uf == uf.upper())
 
-        stmt = stmt.group_by(Deputado.sigla_uf).order_by(desc("total_gasto"))
+        stmt = stmt.order_by(desc(AgregadoDespesaUf.total_gasto))
         results = session.exec(stmt).all()
 
         return [
             {
                 "uf": sigla_uf,
                 "total_gasto": round(total, 2) if total else 0,
-                "media_gasto": round(media, 2) if media else 0,
+                "media_gasto": round(total / quantidade, 2) if total and quantidade else 0,
                 "quantidade": quantidade,
                 "total_deputados": total_deputados
             }
-            for sigla_uf, total, media, quantidade, total_deputados in results
+            for sigla_uf, total, quantidade, total_deputados in results
         ]
 
     except Exception as e:
@@ -75,39 +75,49 @@ def get_ranking_alinhamento_partidario(
     """
     Calcula e ranqueia os partidos pelo seu percentual de alinhamento com o resultado
     final das votações (votar 'Sim' em pautas aprovadas ou 'Não' em reprovadas).
-    Entidades: `Partido`, `Deputado`, `VotoIndividual` e `SessaoVotacao`.
+    Entidades: `Partido`, `Deputado`, `VotoIndividual` e `SessaoVotacao` (ou a matriz de votos do ano, quando gerada).
     """
     try:
-        
-        voto_alinhado_expression = case(
-            (
-                (VotoIndividual.tipo_voto == 'Sim') & (SessaoVotacao.aprovacao == '1'), 1
-            ),
-            (
-                (VotoIndividual.tipo_voto == 'Não') & (SessaoVotacao.aprovacao == '0'), 1
-            ),
-            else_=0
-        )
+        matriz = matriz_do_ano(year)
+        if matriz is not None:
+            contagens = alinhamento_por_partido(matriz, year)
+            partidos = session.exec(select(Partido).where(Partido.id.in_(list(contagens)))).all()
+            resultados = sorted(
+                (SimpleNamespace(sigla=p.sigla, nome_completo=p.nome_completo,
+                                 votos_alinhados=contagens[p.id][0], votos_totais_decisivos=contagens[p.id][1])
+                 for p in partidos),
+                key=lambda r: (r.sigla, r.nome_completo)
+            )
+        else:
+            voto_alinhado_expression = case(
+                (
+                    (VotoIndividual.tipo_voto == 'Sim') & (SessaoVotacao.aprovacao == '1'), 1
+                ),
+                (
+                    (VotoIndividual.tipo_voto == 'Não') & (SessaoVotacao.aprovacao == '0'), 1
+                ),
+                else_=0
+            )
 
-        stmt = (
-            select(
-                Partido.sigla,
-                Partido.nome_completo,
-                func.sum(voto_alinhado_expression).label("votos_alinhados"),
-                func.count(VotoIndividual.id).label("votos_totais_decisivos")
+            stmt = (
+                select(
+                    Partido.sigla,
+                    Partido.nome_completo,
+                    func.sum(voto_alinhado_expression).label("votos_alinhados"),
+                    func.count(VotoIndividual.id).label("votos_totais_decisivos")
+                )
+                .select_from(Partido)
+                .join(Deputado, Partido.id == Deputado.id_partido)
+                .join(VotoIndividual, Deputado.id == VotoIndividual.id_deputado)
+                .join(SessaoVotacao, VotoIndividual.id_votacao == SessaoVotacao.id)
+                .where(VotoIndividual.tipo_voto.in_(['Sim', 'Não']))
+                .where(SessaoVotacao.aprovacao.in_(['1', '0']))
+                .where(VotoIndividual.ano == year)
             )
-            .select_from(Partido)
-            .join(Deputado, Partido.id == Deputado.id_partido)
-            .join(VotoIndividual, Deputado.id == VotoIndividual.id_deputado)
-            .join(SessaoVotacao, VotoIndividual.id_votacao == SessaoVotacao.id)
-            .where(VotoIndividual.tipo_voto.in_(['Sim', 'Não']))
-            .where(SessaoVotacao.aprovacao.in_(['1', '0']))
-            .where(func.cast(VotoIndividual.data_hora_registro, String).startswith(str(year)))
-        )
 
-        stmt = stmt.group_by(Partido.sigla, Partido.nome_completo)
-        
-        resultados = session.exec(stmt).all()
+            stmt = stmt.group_by(Partido.sigla, Partido.nome_completo)
+            
+            resultados = session.exec(stmt).all()
         
         items = []
         for r in resultados:
@@ -6,9 +6,8 @@ from api.tratamentoDados.database import get_session
 from api.dtos.analise_dtos import DeputadoRankingDespesa, ResumoDeputado
 from api.dtos.deputado_dtos import DeputadoResponse
 from api.dtos.ranking_deputados_atuantes_dtos import DeputadoRankingDTO
+from api.models.agregado_deputado import AgregadoDeputado
 from api.models.deputado import Deputado
-from api.models.votacao_proposicao import VotacaoProposicao
-from api.models.voto_individual import VotoIndividual
 from api.utils.pagination import PaginatedResponse, PaginationParams
 
 from api.utils.querys import get_despesas_deputado_2024_subquery
@@ -72,15 +71,15 @@ def get_resumo_deputado(id_deputado: int, session: Session = Depends(get_session
     """
     Retorna um resumo de um deputado específico, com seu gasto total em 2024 e o número de sessões que votou. 
 
-    Entidades: Deputado e VotoIndividual.
+    Entidades: AgregadoDeputado (resumo de Despesa e VotoIndividual montado ao final do ETL).
     """
     
     despesas_subq = get_despesas_deputado_2024_subquery()
     gasto_statement = select(despesas_subq.c.total_despesas).where(despesas_subq.c.id_deputado == id_deputado)
     total_gasto = session.exec(gasto_statement).first() or 0.0
 
-    sessoes_votadas_statement = select(func.count(VotoIndividual.id_votacao.distinct())).where(VotoIndividual.id_deputado == id_deputado)
-    sessoes_votadas = session.exec(sessoes_votadas_statement).one()
+    sessoes_votadas_statement = select(AgregadoDeputado.sessoes_votadas).where(AgregadoDeputado.id_deputado == id_deputado)
+    sessoes_votadas = session.exec(sessoes_votadas_statement).first() or 0
     
     return ResumoDeputado(
         id=id_deputado,
@@ -92,7 +91,7 @@ def get_resumo_deputado(id_deputado: int, session: Session = Depends(get_session
 def get_ranking_deputados_despesa(pagination: PaginationParams = Depends(), session: Session = Depends(get_session)):
     """
     Retorna um ranking paginado de deputados com base no total de suas despesas em 2024, do maior para o menor. 
-    Entidades: Deputado e Despesa
+    Entidades: Deputado e AgregadoDeputado (total de Despesa por deputado)
     """
     despesas_subq = get_despesas_deputado_2024_subquery()
 
@@ -147,7 +146,7 @@ def get_ranking_deputados__mais_atuantes(
     deputado participou. O endpoint também retorna o número de proposições únicas votadas como 
     uma métrica secundária.
 
-    Entidades: Deputado, VotoIndividual e VotacaoProposicao
+    Entidades: Deputado e AgregadoDeputado (contagens de VotoIndividual e VotacaoProposicao montadas ao final do ETL)
     """
     stmt = (
         select(
@@ -155,24 +154,19 @@ def get_ranking_deputados__mais_atuantes(
             Deputado.nome_eleitoral,
             Deputado.sigla_partido,
             Deputado.sigla_uf,
-            func.count(func.distinct(VotoIndividual.id_votacao)).label("total_votacoes"),
-            func.count(func.distinct(VotacaoProposicao.id_proposicao)).label("total_proposicoes")
+            AgregadoDeputado.votacoes_com_proposicao.label("total_votacoes"),
+            AgregadoDeputado.proposicoes_votadas.label("total_proposicoes")
         )
-        .join(VotoIndividual, VotoIndividual.id_deputado == Deputado.id)
-        .join(VotacaoProposicao, VotacaoProposicao.id_votacao == VotoIndividual.id_votacao)
-        .group_by(Deputado.id)
-        .order_by(func.count(func.distinct(VotoIndividual.id_votacao)).desc())
+        .join(AgregadoDeputado, AgregadoDeputado.id_deputado == Deputado.id)
+        .where(AgregadoDeputado.votacoes_com_proposicao > 0)
+        .order_by(AgregadoDeputado.votacoes_com_proposicao.desc(), Deputado.id)
         .offset((pagination.page - 1) * pagination.per_page)
         .limit(pagination.per_page)
     )
 
     results = session.exec(stmt).all()
 
-    count_stmt = (
-        select(func.count(func.distinct(Deputado.id)))
-        .join(VotoIndividual, VotoIndividual.id_deputado == Deputado.id)
-        .join(VotacaoProposicao, VotacaoProposicao.id_votacao == VotoIndividual.id_votacao)
-    )
+    count_stmt = select(func.count()).select_from(AgregadoDeputado).where(AgregadoDeputado.votacoes_com_proposicao > 0)
 
     total = session.exec(count_stmt).one()
 
@@ -5,6 +5,8 @@ from typing import Optional
 
 from api.dtos.analise_dtos import PartidoRankingDespesa
 from api.tratamentoDados.database import get_session
+from api.tratamentoDados.matrizVotos import distribuicao_partido_sessao, matriz_do_ano
+from api.tratamentoDados.coesaoPartidos import coesao_partidos
 from api.models.partido import Partido
 from api.utils.pagination import PaginationParams, PaginatedResponse
 import math
@@ -12,6 +14,7 @@ from api.models.deputado import Deputado
 from sqlalchemy.orm import selectinload
 from api.models.sessao_votacao import SessaoVotacao
 from api.models.voto_individual import VotoIndividual
+from api.models.agregado_voto_partido import AgregadoVotoPartido
 from api.utils.querys import get_despesas_deputado_2024_subquery
 
 partido_router = APIRouter(prefix="/partido", tags=["Partido"])
@@ -116,13 +119,14 @@ def get_deputados_de_um_partido(
 def get_coesao_partido_em_votacao(
     sigla_partido: str,
     id_votacao: int,
+    year: int = Query(..., description="Ano do database"),
     session: Session = Depends(get_session)
 ):
     """
     Analisa a distribuição de votos de um partido específico em uma determinada sessão de votação.
     Retorna a contagem e o percentual para cada tipo de voto (Sim, Não, Abstenção, etc.).
 
-    Entidades: Partido, Deputado, VotoIndividual, SessaoVotacao
+    Entidades: Partido, Deputado, VotoIndividual, SessaoVotacao (ou a matriz de votos do ano, quando gerada)
     """
     #Validar existencias
     partido = session.exec(select(Partido).where(Partido.sigla == sigla_partido.upper())).first()
@@ -133,27 +137,32 @@ def get_coesao_partido_em_votacao(
     if not votacao:
         raise HTTPException(status_code=404, detail=f"Votação com ID {id_votacao} não encontrada.")
 
-    # Contrução de query para votação
-    stmt = (
-        select(VotoIndividual.tipo_voto, func.count(VotoIndividual.id).label("total"))
-        .join(Deputado, Deputado.id == VotoIndividual.id_deputado)
-        .where(Deputado.id_partido == partido.id)
-        .where(VotoIndividual.id_votacao == id_votacao)
-        .group_by(VotoIndividual.tipo_voto)
-    )
-
-    resultados_votos = session.exec(stmt).all()
+    matriz = matriz_do_ano(year)
+    if matriz is not None:
+        # Mesma ordem do GROUP BY do SQL: por tipo de voto, com os votos sem tipo primeiro
+        contagem = distribuicao_partido_sessao(matriz, partido.id, id_votacao)
+        resultados_votos = sorted(contagem.items(), key=lambda r: (r[0] is not None, r[0] or ""))
+    else:
+        # Contrução de query para votação
+        stmt = (
+            select(VotoIndividual.tipo_voto, func.count(VotoIndividual.id).label("total"))
+            .join(Deputado, Deputado.id == VotoIndividual.id_deputado)
+            .where(Deputado.id_partido == partido.id)
+            .where(VotoIndividual.id_votacao == id_votacao)
+            .group_by(VotoIndividual.tipo_voto)
+        )
+        resultados_votos = session.exec(stmt).all()
 
     # Formatar para dicionario
-    total_votantes_partido = sum(r.total for r in resultados_votos)
+    total_votantes_partido = sum(total for _, total in resultados_votos)
     distribuicao = []
     if total_votantes_partido > 0:
         distribuicao = [
             {
-                "tipo_voto": r.tipo_voto,
-                "total": r.total,
-                "percentual": round((r.total / total_votantes_partido) * 100, 2)
-            } for r in resultados_votos
+                "tipo_voto": tipo_voto,
+                "total": total,
+                "percentual": round((total / total_votantes_partido) * 100, 2)
+            } for tipo_voto, total in resultados_votos
         ]
 
     return {
@@ -164,12 +173,28 @@ def get_coesao_partido_em_votacao(
         "distribuicao_votos": distribuicao
     }
 
+@partido_router.get("/ranking/coesao")
+def get_ranking_coesao_partidos(
+    year: int = Query(..., description="Ano do database (todas as sessões de votação do ano)."),
+    sigla_orgao: Optional[str] = Query(None, description="Filtrar pelo órgão da sessão (ex: 'PLEN')."),
+    sigla_tipo: Optional[str] = Query(None, description="Filtrar pelo tipo das proposições votadas (ex: 'PL', 'PEC', 'MPV')."),
+    session: Session = Depends(get_session)
+):
+    """
+    Calcula a coesão de todos os partidos em todas as sessões de votação do ano: o índice de Rice
+    (|Sim - Não| / (Sim + Não)) e o percentual da bancada que votou com a maioria do partido, por sessão
+    e em média. Ordenado do partido mais coeso para o menos coeso.
+
+    Entidades: Partido, Deputado, VotoIndividual, SessaoVotacao e Proposicao (ou a matriz de votos do ano, quando gerada).
+    """
+    return coesao_partidos(session, year, sigla_orgao, sigla_tipo)
+
 @partido_router.get("/ranking/partidos_despesa")
 def get_ranking_partidos_despesa(session: Session = Depends(get_session)):
     """
     Retorna um ranking de partidos ordenado pela soma total das despesas de seus deputados em 2024. 
     
-    Entidades: Partido, Deputado e Despesa.
+    Entidades: Partido, Deputado e AgregadoDeputado (total de Despesa por deputado).
     """
     
     despesas_subq = get_despesas_deputado_2024_subquery()
@@ -210,24 +235,25 @@ def get_ranking_partidos_por_voto(
     """
     Cria um ranking de partidos com base na contagem total de um tipo de voto específico.
     Permite filtrar por ano.
+
+    Entidades: Partido e AgregadoVotoPartido (contagem de VotoIndividual por partido, ano e tipo, montada ao final do ETL).
     """
     stmt = (
         select(
             Partido.sigla,
             Partido.nome_completo,
-            func.count(VotoIndividual.id).label("total_votos")
+            func.sum(AgregadoVotoPartido.total_votos).label("total_votos")
         )
-        .join(Deputado, Partido.id == Deputado.id_partido)
-        .join(VotoIndividual, Deputado.id == VotoIndividual.id_deputado)
-        .where(VotoIndividual.tipo_voto == tipo_voto)
+        .join(AgregadoVotoPartido, Partido.id == AgregadoVotoPartido.id_partido)
+        .where(AgregadoVotoPartido.tipo_voto == tipo_voto)
     )
 
     if ano:
-        stmt = stmt.where(func.cast(VotoIndividual.data_hora_registro, str).startswith(str(ano)))
+        stmt = stmt.where(AgregadoVotoPartido.ano == ano)
 
     stmt = stmt.group_by(Partido.sigla, Partido.nome_completo).order_by(desc("total_votos"))
     
-    count_subquery = select(func.count(func.distinct(Partido.id))).select_from(stmt.subquery())
+    count_subquery = select(func.count()).select_from(stmt.subquery())
     total = session.exec(count_subquery).one()
 
     offset = (pagination.page - 1) * pagination.per_page
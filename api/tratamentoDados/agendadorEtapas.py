@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from .checkpoint import concluir_etapa, etapa_concluida, etapa_interrompida, falhar_etapa, iniciar_etapa, obter_checkpoint
+
+# Quantidade máxima de etapas rodando ao mesmo tempo
+MAX_ETAPAS_PARALELAS = int(os.getenv("ETL_ETAPAS_PARALELAS", "3"))
+
+# Roda uma etapa com checkpoint. Etapas concluídas numa execução anterior são puladas (exceto no modo incremental);
+# etapas interrompidas (falha ou processo encerrado) são retomadas a partir do último lote gravado.
+def executar_etapa(session: Session, etapa: str, descricao: str, funcao, progress_callback, incremental: bool = False) -> bool:
+    if etapa_concluida(session, etapa) and not incremental:
+        progress_callback('log', f"-> Etapa '{etapa}' já foi concluída em uma execução anterior. Pulando.")
+        return True
+
+    retomar = etapa_interrompida(session, etapa)
+    if retomar:
+        checkpoint = obter_checkpoint(session, etapa)
+        progress_callback('log', f"-> Retomando etapa '{etapa}' a partir do checkpoint ({checkpoint.lotes_concluidos} lote(s) já gravados).")
+    iniciar_etapa(session, etapa)
+
+    inicio = time.perf_counter()
+    try:
+        funcao(retomar)
+        session.commit()
+    except Exception as e:
+        progress_callback('log', f"ERRO durante a coleta de dados ({etapa}): {e}")
+        session.rollback()
+        falhar_etapa(session, etapa, e)
+        return False
+
+    duracao = time.perf_counter() - inicio
+    concluir_etapa(session, etapa, duracao)
+    progress_callback('log', f"⏱️ Tempo de processamento {descricao}: {duracao:.2f} segundos.\n")
+    return True
+
+# Uma etapa do ETL e as etapas das quais ela depende.
+# funcao(session, retomar) recebe uma Session própria da etapa.
+class EtapaETL:
+    def __init__(self, nome: str, descricao: str, funcao: Callable[[Session, bool], None],
+                 dependencias: Iterable[str] = (), peso: float = 1.0):
+        self.nome = nome
+        self.descricao = descricao
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.peso = peso
+
+# Executa as etapas respeitando as dependências (um DAG): toda etapa cujas dependências já terminaram
+# é iniciada imediatamente, em paralelo com as demais, cada uma com a sua própria Session.
+# O tempo total fica próximo ao da cadeia de dependências mais longa, e não à soma das etapas.
+# Se uma etapa falha, as que dependem dela não são iniciadas; as independentes vão até o fim.
+class AgendadorEtapas:
+    def __init__(self, engine: Engine, etapas: List[EtapaETL], progress_callback, incremental: bool = False,
+                 max_paralelas: int = MAX_ETAPAS_PARALELAS, progresso_inicial: int = 10, progresso_final: int = 95):
+        self.engine = engine
+        self.etapas = {etapa.nome: etapa for etapa in etapas}
+        self.progress_callback = progress_callback
+        self.incremental = incremental
+        self.max_paralelas = max(1, max_paralelas)
+        self.progresso_inicial = progresso_inicial
+        self.progresso_final = progresso_final
+
+        self.concluidas: List[str] = []
+        self.falhas: List[str] = []
+        self.bloqueadas: List[str] = []
+        self.duracoes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._validar()
+
+    # Garante que toda dependência existe e que não há ciclos
+    def _validar(self):
+        for etapa in self.etapas.values():
+            for dependencia in etapa.dependencias:
+                if dependencia not in self.etapas:
+                    raise ValueError(f"Etapa '{etapa.nome}' depende de '{dependencia}', que não foi declarada.")
+
+        visitadas, em_visita = set(), set()
+        def visitar(nome: str):
+            if nome in em_visita:
+                raise ValueError(f"Dependência circular envolvendo a etapa '{nome}'.")
+            if nome in visitadas:
+                return
+            em_visita.add(nome)
+            for dependencia in self.etapas[nome].dependencias:
+                visitar(dependencia)
+            em_visita.discard(nome)
+            visitadas.add(nome)
+        for nome in self.etapas:
+            visitar(nome)
+
+    def _informar_progresso(self):
+        peso_total = sum(e.peso for e in self.etapas.values()) or 1
+        peso_feito = sum(self.etapas[nome].peso for nome in self.concluidas)
+        faixa = self.progresso_final - self.progresso_inicial
+        self.progress_callback('progress', int(self.progresso_inicial + faixa * peso_feito / peso_total))
+
+    def _rodar(self, etapa: EtapaETL) -> bool:
+        inicio = time.perf_counter()
+        with Session(self.engine) as session:
+            ok = executar_etapa(session, etapa.nome, etapa.descricao, lambda retomar: etapa.funcao(session, retomar),
+                                self.progress_callback, self.incremental)
+        self.duracoes[etapa.nome] = time.perf_counter() - inicio
+        return ok
+
+    # Executa todas as etapas e retorna True se nenhuma falhou.
+    def executar(self) -> bool:
+        pendentes = dict(self.etapas)
+        em_execucao = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_paralelas, thread_name_prefix="etapa") as executor:
+            while pendentes or em_execucao:
+                for nome, etapa in list(pendentes.items()):
+                    if any(d in self.falhas or d in self.bloqueadas for d in etapa.dependencias):
+                        del pendentes[nome]
+                        self.bloqueadas.append(nome)
+                        self.progress_callback('log', f"-> Etapa '{nome}' não será executada: uma de suas dependências falhou.")
+                    elif all(d in self.concluidas for d in etapa.dependencias):
+                        del pendentes[nome]
+                        em_execucao[executor.submit(self._rodar, etapa)] = nome
+
+                if not em_execucao:
+                    break
+
+                terminadas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    nome = em_execucao.pop(futuro)
+                    try:
+                        ok = futuro.result()
+                    except Exception as e:
+                        self.progress_callback('log', f"ERRO inesperado na etapa '{nome}': {e}")
+                        ok = False
+                    with self._lock:
+                        (self.concluidas if ok else self.falhas).append(nome)
+                    if ok:
+                        self._informar_progresso()
+
+        return not self.falhas and not self.bloqueadas
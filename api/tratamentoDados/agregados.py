@@ -0,0 +1,82 @@
+import time
+from typing import Dict
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection
+from ..models.agregado_deputado import AgregadoDeputado
+from ..models.agregado_despesa_deputado import AgregadoDespesaDeputado
+from ..models.agregado_despesa_uf import AgregadoDespesaUf
+from ..models.agregado_voto_partido import AgregadoVotoPartido
+from ..models.deputado import Deputado
+from ..models.despesa import Despesa
+from ..models.votacao_proposicao import VotacaoProposicao
+from ..models.voto_individual import VotoIndividual
+
+def _despesa_deputado():
+    colunas = [Despesa.id_deputado, Despesa.ano, Despesa.mes, Despesa.tipo_despesa]
+    return (["id_deputado", "ano", "mes", "tipo_despesa", "total_valor", "quantidade"],
+            select(*colunas, func.sum(Despesa.valor_liquido), func.count(Despesa.id)).group_by(*colunas))
+
+def _despesa_uf():
+    origem = AgregadoDespesaDeputado
+    return (["sigla_uf", "ano", "total_gasto", "quantidade", "total_deputados"],
+            select(Deputado.sigla_uf, origem.ano, func.sum(origem.total_valor), func.sum(origem.quantidade),
+                   func.count(origem.id_deputado.distinct()))
+            .join(Deputado, Deputado.id == origem.id_deputado)
+            .group_by(Deputado.sigla_uf, origem.ano))
+
+# Uma linha por deputado, inclusive os sem despesas ou votos (com zeros), para os rankings não precisarem de outer join
+def _deputado():
+    despesas = (select(AgregadoDespesaDeputado.id_deputado,
+                       func.sum(AgregadoDespesaDeputado.total_valor).label("total"),
+                       func.sum(AgregadoDespesaDeputado.quantidade).label("quantidade"))
+                .group_by(AgregadoDespesaDeputado.id_deputado).subquery())
+    sessoes = (select(VotoIndividual.id_deputado, func.count(VotoIndividual.id_votacao.distinct()).label("sessoes"))
+               .group_by(VotoIndividual.id_deputado).subquery())
+    proposicoes = (select(VotoIndividual.id_deputado,
+                          func.count(VotoIndividual.id_votacao.distinct()).label("votacoes"),
+                          func.count(VotacaoProposicao.id_proposicao.distinct()).label("proposicoes"))
+                   .join(VotacaoProposicao, VotacaoProposicao.id_votacao == VotoIndividual.id_votacao)
+                   .group_by(VotoIndividual.id_deputado).subquery())
+    return (["id_deputado", "total_despesas", "quantidade_despesas", "sessoes_votadas", "votacoes_com_proposicao", "proposicoes_votadas"],
+            select(Deputado.id,
+                   func.coalesce(despesas.c.total, 0.0), func.coalesce(despesas.c.quantidade, 0),
+                   func.coalesce(sessoes.c.sessoes, 0),
+                   func.coalesce(proposicoes.c.votacoes, 0), func.coalesce(proposicoes.c.proposicoes, 0))
+            .outerjoin(despesas, despesas.c.id_deputado == Deputado.id)
+            .outerjoin(sessoes, sessoes.c.id_deputado == Deputado.id)
+            .outerjoin(proposicoes, proposicoes.c.id_deputado == Deputado.id))
+
+# Votos pelo partido atual do deputado (Deputado.id_partido), como nas rotas de partido
+def _voto_partido():
+    colunas = [Deputado.id_partido, VotoIndividual.ano, VotoIndividual.tipo_voto]
+    return (["id_partido", "ano", "tipo_voto", "total_votos"],
+            select(*colunas, func.count(VotoIndividual.id))
+            .join(Deputado, Deputado.id == VotoIndividual.id_deputado)
+            .where(Deputado.id_partido.is_not(None))
+            .group_by(*colunas))
+
+# Tabelas de resumo lidas pelas rotas de ranking, na ordem em que são montadas (as de despesa por UF e por
+# deputado saem da de despesa por deputado/mês/tipo, que é a única que percorre a tabela de despesas)
+CONSULTAS_AGREGADAS = {
+    AgregadoDespesaDeputado: _despesa_deputado,
+    AgregadoDespesaUf: _despesa_uf,
+    AgregadoDeputado: _deputado,
+    AgregadoVotoPartido: _voto_partido,
+}
+
+# Refaz as tabelas de resumo a partir das tabelas de dados, na transação da conexão recebida: quem lê o banco
+# ao mesmo tempo vê os resumos antigos ou os novos, nunca uma tabela pela metade. Retorna as linhas por tabela.
+def construir_agregados(conexao: Connection, progress_callback=None) -> Dict[str, int]:
+    inicio = time.perf_counter()
+    linhas = {}
+    for modelo, montar_consulta in CONSULTAS_AGREGADAS.items():
+        tabela = modelo.__table__
+        colunas, consulta = montar_consulta()
+        conexao.execute(delete(tabela))
+        conexao.execute(insert(tabela).from_select(colunas, consulta))
+        linhas[tabela.name] = conexao.execute(select(func.count()).select_from(tabela)).scalar_one()
+
+    if progress_callback:
+        progress_callback('log', f"   - Tabelas agregadas: {time.perf_counter() - inicio:.2f}s ("
+                                 + ", ".join(f"{quantidade} em {tabela}" for tabela, quantidade in linhas.items()) + ").")
+    return linhas
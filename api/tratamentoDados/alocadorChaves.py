@@ -0,0 +1,28 @@
+import threading
+from sqlalchemy import func, select
+from sqlmodel import Session, SQLModel
+
+# Distribui chaves primárias no próprio ETL, a partir do maior id já gravado na tabela.
+# Com o id conhecido antes do INSERT, as linhas que apontam para ele (ex: links votação-proposição)
+# são montadas e gravadas em lote, sem flush nem SELECT para descobrir o id gerado pelo banco.
+# Só funciona se o ETL for o único a escrever na tabela enquanto o alocador existir (um banco por ano,
+# uma etapa por tabela). Ids de lotes desfeitos por rollback ficam sem uso, o que não causa problema.
+class AlocadorChaves:
+    def __init__(self, session: Session, modelo: type[SQLModel]):
+        self.tabela = modelo.__table__
+        maior_id = session.execute(select(func.max(self.tabela.c.id))).scalar()
+        self._proximo = (maior_id or 0) + 1
+        self._lock = threading.Lock()
+
+    def proximo(self) -> int:
+        with self._lock:
+            chave = self._proximo
+            self._proximo += 1
+            return chave
+
+    # Reserva um bloco contínuo de chaves
+    def reservar(self, quantidade: int) -> range:
+        with self._lock:
+            inicio = self._proximo
+            self._proximo += quantidade
+            return range(inicio, inicio + quantidade)
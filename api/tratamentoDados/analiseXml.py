@@ -0,0 +1,74 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+# lxml é opcional: quando instalado, o XML é lido por ele (em C, bem mais rápido); senão, pelo xml.etree
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# 'auto' usa o lxml quando disponível; 'etree' força a biblioteca padrão
+PARSER_XML = os.getenv("ETL_PARSER_XML", "auto")
+# Processos dedicados à leitura dos XMLs (0 = lê na própria thread que fez a requisição)
+PROCESSOS_PARSE = int(os.getenv("ETL_PROCESSOS_PARSE", "0"))
+
+# Exceções de XML malformado, qualquer que seja o parser em uso
+ERROS_XML = (ET.ParseError,) + ((lxml_etree.XMLSyntaxError,) if lxml_etree is not None else ())
+
+_local = threading.local()
+_pool: Optional[ProcessPoolExecutor] = None
+_lock_pool = threading.Lock()
+
+def usando_lxml() -> bool:
+    return lxml_etree is not None and PARSER_XML != "etree"
+
+# Parsers do lxml não podem ser compartilhados entre threads: um por thread, sem entidades externas nem rede
+def _parser_lxml():
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = lxml_etree.XMLParser(resolve_entities=False, no_network=True)
+    return parser
+
+# Converte os bytes da resposta em árvore XML (mesma interface find/findtext/findall nos dois parsers)
+def xml_fromstring(conteudo: bytes):
+    if usando_lxml():
+        return lxml_etree.fromstring(conteudo, parser=_parser_lxml())
+    return ET.fromstring(conteudo)
+
+# Liga (processos > 0) ou desliga (0) o pool que tira a leitura dos XMLs das threads de I/O.
+# A leitura com xml.etree segura o GIL; com respostas chegando rápido (ex: vindas do cache), ela vira o gargalo
+# das threads/event loop. Os processos usam 'spawn', seguro mesmo com as threads das etapas rodando.
+def configurar_processos_parse(processos: int):
+    global _pool
+    with _lock_pool:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+        if processos > 0:
+            _pool = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+
+def encerrar_processos_parse():
+    configurar_processos_parse(0)
+
+def processos_parse_ativos() -> bool:
+    return _pool is not None
+
+# Aplica o parser (função de módulo que recebe bytes e devolve um dict/lista pequeno) no pool, se ligado.
+# Para uso nas threads de I/O: a thread espera o resultado sem segurar o GIL.
+def analisar_xml(parser: Callable[[bytes], Any], conteudo: bytes) -> Any:
+    pool = _pool
+    if pool is None:
+        return parser(conteudo)
+    return pool.submit(parser, conteudo).result()
+
+# Mesma coisa para o event loop do BuscadorAsync
+async def analisar_xml_async(parser: Callable[[bytes], Any], conteudo: bytes) -> Any:
+    pool = _pool
+    if pool is None:
+        return parser(conteudo)
+    return await asyncio.get_running_loop().run_in_executor(pool, parser, conteudo)
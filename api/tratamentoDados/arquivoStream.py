@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import re
+import zipfile
+from typing import Dict, Iterator, Optional, TextIO
+import requests
+
+TAMANHO_BLOCO_DOWNLOAD = 1024 * 1024   # 1 MB por bloco gravado em disco
+TAMANHO_BLOCO_LEITURA = 64 * 1024      # 64 KB de texto lidos por vez pelo parser
+
+# Baixa um arquivo em blocos direto para o disco, sem manter o conteúdo inteiro em memória.
+# O download é feito em um arquivo '.part', renomeado apenas quando termina com sucesso.
+def baixar_arquivo_em_partes(url: str, destino: str, http_session: requests.Session, headers: Optional[Dict] = None, timeout=300):
+    temporario = f"{destino}.part"
+    try:
+        with http_session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            with open(temporario, 'wb') as f:
+                for bloco in response.iter_content(chunk_size=TAMANHO_BLOCO_DOWNLOAD):
+                    if bloco:
+                        f.write(bloco)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+# Percorre, um item por vez, o array JSON guardado em `chave` (ex: {"dados": [ {...}, {...} ]}).
+# Apenas um bloco de texto e o item atual ficam em memória, independente do tamanho do arquivo.
+def iterar_array_json(arquivo_texto: TextIO, chave: str = 'dados') -> Iterator:
+    decoder = json.JSONDecoder()
+    padrao_inicio = re.compile(r'"%s"\s*:\s*\[' % re.escape(chave))
+    buffer = ''
+    pos = 0
+    fim_arquivo = False
+
+    def ler_mais():
+        nonlocal buffer, pos, fim_arquivo
+        bloco = arquivo_texto.read(TAMANHO_BLOCO_LEITURA)
+        if not bloco:
+            fim_arquivo = True
+        buffer = buffer[pos:] + bloco
+        pos = 0
+
+    # --- 1. Avança até o início do array ---
+    while True:
+        encontrado = padrao_inicio.search(buffer, pos)
+        if encontrado:
+            pos = encontrado.end()
+            break
+        if fim_arquivo:
+            return
+        # Mantém só a cauda do buffer, caso a chave esteja dividida entre dois blocos
+        pos = max(0, len(buffer) - len(chave) - 16)
+        ler_mais()
+
+    # --- 2. Decodifica os itens do array um a um ---
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buffer):
+            if fim_arquivo:
+                raise ValueError(f"Array '{chave}' terminou sem ']' no arquivo JSON.")
+            ler_mais()
+            continue
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, fim = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if fim_arquivo:
+                raise
+            ler_mais()
+            continue
+
+        # Um número no fim do buffer pode ter sido cortado no meio; garante o próximo caractere
+        if fim >= len(buffer) and not fim_arquivo:
+            ler_mais()
+            continue
+
+        pos = fim
+        yield item
+
+# Abre um arquivo JSON do disco e percorre seu array sem carregá-lo inteiro.
+def iterar_array_json_no_arquivo(caminho: str, chave: str = 'dados') -> Iterator:
+    with open(caminho, 'r', encoding='utf-8-sig') as texto:
+        yield from iterar_array_json(texto, chave)
+
+# Abre o primeiro arquivo de dentro de um ZIP e percorre seu array JSON sem extraí-lo para o disco.
+def iterar_array_json_no_zip(caminho_zip: str, chave: str = 'dados') -> Iterator:
+    with zipfile.ZipFile(caminho_zip, 'r') as arquivo_zip:
+        nome_interno = arquivo_zip.namelist()[0]
+        with arquivo_zip.open(nome_interno) as bruto:
+            texto = io.TextIOWrapper(bruto, encoding='utf-8-sig')
+            yield from iterar_array_json(texto, chave)
@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict
+from .orcamentoHttp import OrcamentoHttp
+from .processador import run_data_processing
+from .eventosProgresso import CAMINHO_LOG_EVENTOS, RenderizadorTerminal, criar_barramento
+
+# Quantos anos são processados ao mesmo tempo (um processo por ano)
+MAX_PROCESSOS_BACKFILL = int(os.getenv("ETL_PROCESSOS_BACKFILL", "4"))
+# Teto de requisições HTTP simultâneas somando todos os processos, para não sermos limitados pela API
+ORCAMENTO_HTTP_GLOBAL = int(os.getenv("ETL_ORCAMENTO_HTTP", "32"))
+
+# Executado em cada processo do pool: roda o ETL completo de um ano no seu próprio dbs/camara_{ano}.db.
+# As mensagens do progress_callback são enviadas ao processo principal pela fila compartilhada.
+def _processar_ano(ano: int, semaforo, fila, opcoes: Dict) -> Dict:
+    def progress_callback(msg_type, data):
+        fila.put((ano, msg_type, data))
+
+    inicio = time.perf_counter()
+    erro = None
+    try:
+        ok = run_data_processing(ano, progress_callback, orcamento=OrcamentoHttp(semaforo), **opcoes)
+    except Exception as e:
+        ok, erro = False, str(e)
+    return {"ano": ano, "ok": bool(ok), "duracao": time.perf_counter() - inicio, "erro": erro}
+
+# Repassa ao callback do processo principal as mensagens que os workers deixaram na fila.
+# Logs ganham o prefixo do ano e eventos, o campo 'ano'; o progresso é a média dos anos.
+def _repassar_mensagens(fila, progress_callback, progresso: Dict[int, int]):
+    while True:
+        try:
+            ano, msg_type, data = fila.get_nowait()
+        except queue.Empty:
+            return
+        if msg_type == 'log':
+            progress_callback('log', f"[{ano}] {data}")
+        elif msg_type == 'progress':
+            progresso[ano] = data
+            progress_callback('progress', int(sum(progresso.values()) / len(progresso)))
+        elif msg_type == 'concorrencia':
+            progress_callback('concorrencia', {**data, 'etapa': f"{ano}/{data['etapa']}"})
+        elif msg_type == 'evento':
+            progress_callback('evento', {**data, 'ano': ano})
+        else:
+            progress_callback(msg_type, data)
+
+# Tabela final com o tempo de cada ano e o ganho do paralelismo sobre a soma dos tempos
+def resumo_backfill(resultados: Dict[int, Dict], duracao_total: float) -> str:
+    linhas = ["="*50, "Resumo do backfill:", f"{'Ano':<6}{'Status':<10}{'Tempo':>12}"]
+    for ano in sorted(resultados):
+        r = resultados[ano]
+        status = "ok" if r["ok"] else "FALHOU"
+        linhas.append(f"{ano:<6}{status:<10}{r['duracao'] / 60:>8.2f} min" + (f"  ({r['erro']})" if r["erro"] else ""))
+
+    soma = sum(r["duracao"] for r in resultados.values())
+    concluidos = sum(1 for r in resultados.values() if r["ok"])
+    linhas.append("-"*50)
+    linhas.append(f"{concluidos}/{len(resultados)} ano(s) concluído(s).")
+    linhas.append(f"Soma dos tempos por ano: {soma / 60:.2f} minutos.")
+    linhas.append(f"⏳ Tempo total do backfill: {duracao_total / 60:.2f} minutos"
+                  + (f" ({soma / duracao_total:.1f}x mais rápido que em sequência)." if duracao_total > 0 else "."))
+    return "\n".join(linhas)
+
+# Processa vários anos em paralelo, um processo por ano, cada um escrevendo o seu próprio banco.
+# Todos os processos dividem o mesmo orçamento de requisições HTTP simultâneas (um semáforo do Manager);
+# dentro dele, o BuscadorAsync de cada processo continua ajustando a própria concorrência.
+# opcoes: repassadas para run_data_processing (usar_async, usar_cache, incremental, max_etapas_paralelas, reprocessar_falhas).
+def run_backfill(ano_inicial: int, ano_final: int, progress_callback, max_processos: int = MAX_PROCESSOS_BACKFILL,
+                 orcamento_http: int = ORCAMENTO_HTTP_GLOBAL, **opcoes) -> Dict[int, Dict]:
+    anos = list(range(ano_inicial, ano_final + 1))
+    if not anos:
+        progress_callback('log', f"ERRO: Intervalo de anos vazio ({ano_inicial}-{ano_final}).")
+        return {}
+
+    inicio_total = time.perf_counter()
+    processos = max(1, min(max_processos, len(anos)))
+    progress_callback('log', f"Iniciando backfill de {anos[0]} a {anos[-1]}: {processos} processo(s), "
+                             f"até {orcamento_http} requisições HTTP simultâneas no total.")
+
+    resultados: Dict[int, Dict] = {}
+    progresso = {ano: 0 for ano in anos}
+    with multiprocessing.Manager() as manager:
+        semaforo = manager.BoundedSemaphore(orcamento_http)
+        fila = manager.Queue()
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = {executor.submit(_processar_ano, ano, semaforo, fila, opcoes): ano for ano in anos}
+            pendentes = set(futuros)
+            while pendentes:
+                _repassar_mensagens(fila, progress_callback, progresso)
+                terminados, pendentes = wait(pendentes, timeout=0.2, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    ano = futuros[futuro]
+                    try:
+                        resultados[ano] = futuro.result()
+                    except Exception as e:
+                        # Ex: o processo do ano morreu (BrokenProcessPool)
+                        resultados[ano] = {"ano": ano, "ok": False, "duracao": 0.0, "erro": str(e)}
+        _repassar_mensagens(fila, progress_callback, progresso)
+
+    progress_callback('log', resumo_backfill(resultados, time.perf_counter() - inicio_total))
+    return resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processa um intervalo de anos em paralelo, um banco por ano.")
+    parser.add_argument("ano_inicial", type=int)
+    parser.add_argument("ano_final", type=int)
+    parser.add_argument("--processos", type=int, default=MAX_PROCESSOS_BACKFILL, help="anos processados ao mesmo tempo")
+    parser.add_argument("--orcamento-http", type=int, default=ORCAMENTO_HTTP_GLOBAL, help="requisições HTTP simultâneas somando todos os processos")
+    parser.add_argument("--incremental", action="store_true", help="busca apenas o que é novo ou mudou")
+    parser.add_argument("--sem-cache", action="store_true", help="não usa o cache HTTP em disco")
+    parser.add_argument("--retry-failed", action="store_true", help="busca de novo apenas as requisições registradas no livro de falhas de cada ano")
+    parser.add_argument("--log-jsonl", default=CAMINHO_LOG_EVENTOS, help="arquivo JSON-lines que recebe logs e eventos de progresso")
+    args = parser.parse_args()
+
+    barramento = criar_barramento(RenderizadorTerminal(), caminho_jsonl=args.log_jsonl)
+    try:
+        resultados = run_backfill(args.ano_inicial, args.ano_final, barramento, max_processos=args.processos,
+                                  orcamento_http=args.orcamento_http, incremental=args.incremental, usar_cache=not args.sem_cache,
+                                  reprocessar_falhas=args.retry_failed)
+    finally:
+        barramento.fechar()
+    raise SystemExit(0 if resultados and all(r["ok"] for r in resultados.values()) else 1)
@@ -0,0 +1,117 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from . import analiseXml
+from .deputadosProcessor import extrair_detalhes_deputado_xml
+from .partidoProcessor import extrair_detalhes_partido_xml
+from .sessaoProposicaoProcessor import extrair_ids_proposicoes_xml
+
+# Micro-benchmark da leitura dos XMLs de detalhes (não é um teste): mede quantas respostas por segundo
+# cada modo consegue transformar nos dicts extraídos pelo ETL, para deputados, partidos e votações.
+#   python -m api.tratamentoDados.benchmarkParse --quantidade 5000 --threads 10 --processos 4
+
+# Respostas sintéticas no formato da API de Dados Abertos (tamanhos próximos dos reais)
+def xml_deputado(i: int) -> bytes:
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<xml><dados>
+  <id>{200000 + i}</id><uri>https://dadosabertos.camara.leg.br/api/v2/deputados/{200000 + i}</uri>
+  <nomeCivil>Nome Civil Completo do Deputado {i}</nomeCivil><cpf>000000000{i % 10}0</cpf><sexo>{'MF'[i % 2]}</sexo>
+  <urlWebsite/><redeSocial><item>https://twitter.com/dep{i}</item><item>https://instagram.com/dep{i}</item></redeSocial>
+  <dataNascimento>1970-01-{i % 28 + 1:02d}</dataNascimento><ufNascimento>SP</ufNascimento><municipioNascimento>São Paulo</municipioNascimento>
+  <escolaridade>Superior</escolaridade>
+  <ultimoStatus>
+    <id>{200000 + i}</id><nome>Dep {i}</nome><siglaPartido>P{i % 20}</siglaPartido><siglaUf>SP</siglaUf>
+    <idLegislatura>57</idLegislatura><urlFoto>https://www.camara.leg.br/internet/deputado/bandep/{200000 + i}.jpg</urlFoto>
+    <email>dep.{i}@camara.leg.br</email><data>2023-02-01</data><nomeEleitoral>Dep {i}</nomeEleitoral>
+    <gabinete><nome>{i}</nome><predio>4</predio><sala>{i}</sala><andar>2</andar><telefone>3215-5{i % 1000:03d}</telefone>
+      <email>dep.{i}@camara.leg.br</email></gabinete>
+    <situacao>Exercício</situacao><condicaoEleitoral>Titular</condicaoEleitoral>
+  </ultimoStatus>
+</dados><links><link><rel>self</rel><href>https://dadosabertos.camara.leg.br/api/v2/deputados/{200000 + i}</href></link></links></xml>""".encode()
+
+def xml_partido(i: int) -> bytes:
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<xml><dados>
+  <id>{36000 + i}</id><sigla>P{i}</sigla><nome>Partido Número {i}</nome><uri>https://dadosabertos.camara.leg.br/api/v2/partidos/{36000 + i}</uri>
+  <status><data>2023-02-01</data><idLegislatura>57</idLegislatura><situacao>Ativo</situacao>
+    <totalPosse>{i % 90}</totalPosse><totalMembros>{i % 80}</totalMembros>
+    <uriMembros>https://dadosabertos.camara.leg.br/api/v2/deputados?idLegislatura=57&amp;siglaPartido=P{i}</uriMembros>
+    <lider><uri>https://dadosabertos.camara.leg.br/api/v2/deputados/{200000 + i}</uri><nome>Líder {i}</nome>
+      <siglaPartido>P{i}</siglaPartido><uf>SP</uf><idLegislatura>57</idLegislatura><urlFoto>https://x/{i}.jpg</urlFoto></lider>
+  </status>
+  <numeroEleitoral>{i}</numeroEleitoral><urlLogo>https://www.camara.leg.br/internet/Deputado/img/partidos/P{i}.gif</urlLogo>
+</dados></xml>""".encode()
+
+def xml_votacao(i: int) -> bytes:
+    proposicoes = "".join(
+        f"<proposicoesAfetadas><id>{2300000 + i * 3 + k}</id><uri>https://dadosabertos.camara.leg.br/api/v2/proposicoes/{2300000 + i * 3 + k}</uri>"
+        f"<siglaTipo>PL</siglaTipo><numero>{i}</numero><ano>2024</ano><ementa>Dispõe sobre o assunto {i}.</ementa></proposicoesAfetadas>"
+        for k in range(2)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<xml><dados>
+  <id>{2400000 + i}-{i % 300}</id><uri>https://dadosabertos.camara.leg.br/api/v2/votacoes/{2400000 + i}-{i % 300}</uri>
+  <data>2024-05-{i % 28 + 1:02d}</data><dataHoraRegistro>2024-05-{i % 28 + 1:02d}T18:30:00</dataHoraRegistro>
+  <siglaOrgao>PLEN</siglaOrgao><descricao>Aprovado o requerimento {i}.</descricao><aprovacao>1</aprovacao>
+  <proposicoesAfetadas>{proposicoes}</proposicoesAfetadas>
+  <ultimaApresentacaoProposicao><descricao>Apresentação do requerimento {i}</descricao></ultimaApresentacaoProposicao>
+</dados></xml>""".encode()
+
+ENTIDADES: Dict[str, tuple] = {
+    "deputado": (xml_deputado, extrair_detalhes_deputado_xml),
+    "partido": (xml_partido, extrair_detalhes_partido_xml),
+    "votacao": (xml_votacao, extrair_ids_proposicoes_xml),
+}
+
+# Mede as respostas por segundo aplicando o parser pelo mesmo caminho do ETL (analisar_xml, nas threads de I/O)
+def medir(parser: Callable[[bytes], object], conteudos: List[bytes], threads: int) -> float:
+    inicio = time.perf_counter()
+    if threads <= 1:
+        for conteudo in conteudos:
+            analiseXml.analisar_xml(parser, conteudo)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda conteudo: analiseXml.analisar_xml(parser, conteudo), conteudos))
+    return len(conteudos) / (time.perf_counter() - inicio)
+
+def executar_benchmark(quantidade: int, threads: int, processos: int) -> List[Dict]:
+    parsers = ["etree"] + (["lxml"] if analiseXml.lxml_etree is not None else [])
+    resultados = []
+    for nome_parser in parsers:
+        # A variável de ambiente também vale para os processos 'spawn', que importam analiseXml de novo
+        analiseXml.PARSER_XML = os.environ["ETL_PARSER_XML"] = nome_parser
+        modos = [("1 thread", 1, 0), (f"{threads} threads", threads, 0)]
+        if processos > 0:
+            modos.append((f"{threads} threads + {processos} processos", threads, processos))
+
+        for modo, n_threads, n_processos in modos:
+            analiseXml.configurar_processos_parse(n_processos)
+            try:
+                for entidade, (gerar, parser) in ENTIDADES.items():
+                    conteudos = [gerar(i) for i in range(quantidade)]
+                    # Aquece o pool (processos 'spawn' importam o projeto na primeira tarefa)
+                    medir(parser, conteudos[:max(n_processos * 2, 1)], n_threads)
+                    taxa = medir(parser, conteudos, n_threads)
+                    resultados.append({"parser": nome_parser, "modo": modo, "entidade": entidade, "por_segundo": taxa,
+                                       "bytes_medio": sum(map(len, conteudos)) // len(conteudos)})
+            finally:
+                analiseXml.encerrar_processos_parse()
+    return resultados
+
+def formatar_resultados(resultados: List[Dict]) -> str:
+    linhas = [f"{'Parser':<8}{'Modo':<28}{'Entidade':<10}{'Tamanho':>9}{'Respostas/s':>14}"]
+    for r in resultados:
+        linhas.append(f"{r['parser']:<8}{r['modo']:<28}{r['entidade']:<10}{r['bytes_medio']:>7} B{r['por_segundo']:>14,.0f}")
+    return "\n".join(linhas)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede a taxa de leitura dos XMLs de detalhes por entidade e modo.")
+    parser.add_argument("--quantidade", type=int, default=5000, help="respostas por entidade")
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 2, help="0 para não medir o modo com processos")
+    args = parser.parse_args()
+
+    print(f"lxml {'disponível' if analiseXml.lxml_etree is not None else 'não instalado (apenas xml.etree)'}.")
+    print(formatar_resultados(executar_benchmark(args.quantidade, args.threads, args.processos)))
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+import aiohttp
+from .cacheHttp import CacheHttp
+from .orcamentoHttp import OrcamentoHttp
+from .analiseXml import analisar_xml_async
+from .concorrenciaAdaptativa import ControladorAIMD, PortaoAdaptativo
+
+# Mesmos status que disparam nova tentativa em create_session_with_retries
+STATUS_RETRY = (429, 500, 502, 503, 504)
+
+MAX_CONCORRENCIA = int(os.getenv("ETL_MAX_CONCORRENCIA", "50"))
+CONCORRENCIA_INICIAL = int(os.getenv("ETL_CONCORRENCIA_INICIAL", "10"))
+REQUISICOES_POR_SEGUNDO_POR_HOST = float(os.getenv("ETL_REQ_POR_SEGUNDO_HOST", "100"))
+BACKOFF_MAXIMO = 120
+# Respostas já processadas que podem esperar consumo em buscar_em_fluxo
+TAMANHO_FILA_FLUXO = int(os.getenv("ETL_TAMANHO_FILA", "16"))
+
+FIM_FLUXO = object()
+
+# Erro final de uma requisição, depois de esgotadas as tentativas.
+class FalhaRequisicaoAsync(Exception):
+    def __init__(self, url: str, mensagem: str, tentativas: int, status: Optional[int] = None):
+        super().__init__(f"{mensagem} ({url}, {tentativas} tentativa(s))")
+        self.url = url
+        self.tentativas = tentativas
+        self.status = status
+
+# Espaça as requisições para um mesmo host, respeitando um número máximo por segundo.
+# A vaga de cada requisição é reservada sob um lock de thread (sem await dentro), então o mesmo limitador
+# vale para os event loops de todas as chamadas em andamento, inclusive de etapas rodando em paralelo.
+class LimitadorTaxa:
+    def __init__(self, requisicoes_por_segundo: float):
+        self.intervalo = 1.0 / requisicoes_por_segundo if requisicoes_por_segundo > 0 else 0.0
+        self._proxima_liberacao = 0.0
+        self._lock = threading.Lock()
+
+    async def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima_liberacao - agora
+            self._proxima_liberacao = max(agora, self._proxima_liberacao) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+# Busca muitas URLs em paralelo com asyncio/aiohttp.
+# O número de requisições em andamento é limitado por um semáforo global e cada host tem sua própria taxa máxima,
+# compartilhada por todas as chamadas feitas com a mesma instância.
+# Dentro desse teto, cada etapa tem um ControladorAIMD que ajusta a concorrência conforme latência e erros.
+# Falhas de conexão, timeouts e os status de STATUS_RETRY são repetidos com backoff exponencial,
+# como o Retry(total=5, backoff_factor=1) usado nas sessões do requests.
+# Com um CacheHttp, respostas ainda válidas nem chegam à rede e as expiradas são revalidadas (ETag/Last-Modified).
+# Com um OrcamentoHttp, cada requisição também precisa de uma vaga no limite global compartilhado entre processos.
+class BuscadorAsync:
+    def __init__(self, max_concorrencia: int = MAX_CONCORRENCIA, requisicoes_por_segundo_por_host: float = REQUISICOES_POR_SEGUNDO_POR_HOST,
+                 timeout_conexao: float = 5, timeout_leitura: float = 30, tentativas: int = 5, backoff: float = 1.0,
+                 status_retry: Iterable[int] = STATUS_RETRY, concorrencia_inicial: int = CONCORRENCIA_INICIAL, progress_callback=None,
+                 cache: Optional[CacheHttp] = None, orcamento: Optional[OrcamentoHttp] = None):
+        self.max_concorrencia = max_concorrencia
+        self.concorrencia_inicial = concorrencia_inicial
+        self.progress_callback = progress_callback
+        self.cache = cache
+        self.orcamento = orcamento
+        self.controladores: Dict[str, ControladorAIMD] = {}
+        self.requisicoes_por_segundo_por_host = requisicoes_por_segundo_por_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout_conexao, sock_read=timeout_leitura)
+        self.tentativas = tentativas
+        self.backoff = backoff
+        self.status_retry = set(status_retry)
+        self._limitadores: Dict[str, LimitadorTaxa] = {}
+        self._lock_limitadores = threading.Lock()
+
+    # Tempo de espera antes da n-ésima nova tentativa (1, 2, 4, 8... segundos)
+    def _espera_backoff(self, tentativa: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAXIMO)
+        return min(self.backoff * (2 ** (tentativa - 1)), BACKOFF_MAXIMO)
+
+    # Cada etapa mantém o seu controlador entre chamadas, preservando o limite aprendido.
+    def controlador(self, etapa: str) -> ControladorAIMD:
+        if etapa not in self.controladores:
+            self.controladores[etapa] = ControladorAIMD(
+                etapa, inicial=self.concorrencia_inicial, maximo=self.max_concorrencia, ao_mudar=self._informar_concorrencia
+            )
+        return self.controladores[etapa]
+
+    # Expõe o limite atual e o histórico pelo progress_callback, no tipo de mensagem 'concorrencia'.
+    def _informar_concorrencia(self, controlador: ControladorAIMD):
+        if self.progress_callback:
+            self.progress_callback('concorrencia', controlador.resumo())
+
+    def _limitador(self, url: str) -> LimitadorTaxa:
+        host = urlsplit(url).netloc
+        with self._lock_limitadores:
+            if host not in self._limitadores:
+                self._limitadores[host] = LimitadorTaxa(self.requisicoes_por_segundo_por_host)
+            return self._limitadores[host]
+
+    # Faz um GET com novas tentativas e devolve o corpo da resposta em bytes.
+    async def buscar(self, client: aiohttp.ClientSession, url: str, headers: Optional[Dict] = None,
+                     semaforo: Optional[asyncio.Semaphore] = None, limitador: Optional[LimitadorTaxa] = None,
+                     portao: Optional[PortaoAdaptativo] = None) -> bytes:
+        if semaforo is None:
+            semaforo = asyncio.Semaphore(self.max_concorrencia)
+        if portao is None:
+            portao = PortaoAdaptativo(self.controlador("geral"))
+        controlador = portao.controlador
+
+        entrada, revalidar = None, False
+        if self.cache:
+            accept = next((v for k, v in (headers or {}).items() if k.lower() == 'accept'), None)
+            entrada, revalidar = self.cache.consultar(url, accept)
+            if entrada is not None and not revalidar:
+                return entrada.conteudo
+            if revalidar:
+                headers = {**(headers or {}), **entrada.headers_revalidacao()}
+
+        ultimo_erro, ultimo_status = "", None
+        for tentativa in range(1, self.tentativas + 2):
+            retry_after = None
+            if limitador:
+                await limitador.aguardar()
+            try:
+                async with semaforo, portao, (self.orcamento or nullcontext()):
+                    inicio = time.monotonic()
+                    async with client.get(url, headers=headers) as response:
+                        status, corpo, response_headers = response.status, await response.read(), response.headers
+                        retry_after = response_headers.get('Retry-After')
+                    latencia = time.monotonic() - inicio
+
+                if status in self.status_retry:
+                    controlador.registrar_falha(status)
+                else:
+                    controlador.registrar_sucesso(latencia)
+
+                if status == 304 and entrada is not None:
+                    self.cache.renovar(entrada, self.cache.ttl_para(url))
+                    return entrada.conteudo
+                if status < 400:
+                    if self.cache and status == 200:
+                        ttl = self.cache.ttl_para(url)
+                        if ttl is not None:
+                            self.cache.guardar(url, accept, corpo, response_headers, ttl)
+                    return corpo
+                ultimo_erro, ultimo_status = f"HTTP {status}", status
+                if status not in self.status_retry:
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                ultimo_erro, ultimo_status = f"{type(e).__name__}: {e}", None
+                controlador.registrar_falha()
+
+            if tentativa <= self.tentativas:
+                await asyncio.sleep(self._espera_backoff(tentativa, retry_after))
+
+        raise FalhaRequisicaoAsync(url, ultimo_erro, tentativa, ultimo_status)
+
+    async def _buscar_todos(self, urls: List[str], parser: Callable[[bytes], Any], headers: Optional[Dict],
+                            em_erro: Callable[[str, Exception], Any], etapa: str, parse_xml: bool = False) -> List[Any]:
+        semaforo = asyncio.Semaphore(self.max_concorrencia)
+        portao = PortaoAdaptativo(self.controlador(etapa))
+        conector = aiohttp.TCPConnector(limit=self.max_concorrencia)
+
+        async with aiohttp.ClientSession(timeout=self.timeout, connector=conector) as client:
+            async def buscar_um(url: str):
+                try:
+                    corpo = await self.buscar(client, url, headers, semaforo, self._limitador(url), portao)
+                    return await analisar_xml_async(parser, corpo) if parse_xml else parser(corpo)
+                except Exception as e:
+                    return em_erro(url, e)
+
+            return await asyncio.gather(*(buscar_um(url) for url in urls))
+
+    async def _buscar_em_fluxo(self, urls: List[str], parser: Callable[[bytes], Any], headers: Optional[Dict],
+                               em_erro: Callable[[str, Exception], Any], etapa: str, fila: "queue.Queue", parar: threading.Event,
+                               parse_xml: bool = False):
+        semaforo = asyncio.Semaphore(self.max_concorrencia)
+        portao = PortaoAdaptativo(self.controlador(etapa))
+        conector = aiohttp.TCPConnector(limit=self.max_concorrencia)
+        # Resultados prontos que ainda não couberam na fila seguram a vaga, limitando o que fica em memória
+        janela = asyncio.Semaphore(self.max_concorrencia)
+
+        async with aiohttp.ClientSession(timeout=self.timeout, connector=conector) as client:
+            async def buscar_um(indice: int, url: str):
+                async with janela:
+                    if parar.is_set():
+                        return
+                    try:
+                        corpo = await self.buscar(client, url, headers, semaforo, self._limitador(url), portao)
+                        resultado = await analisar_xml_async(parser, corpo) if parse_xml else parser(corpo)
+                    except Exception as e:
+                        resultado = em_erro(url, e)
+                    # A fila é de threads: tenta sem bloquear o event loop e espera um pouco quando está cheia
+                    espera = 0.001
+                    while not parar.is_set():
+                        try:
+                            fila.put_nowait((indice, resultado))
+                            return
+                        except queue.Full:
+                            await asyncio.sleep(espera)
+                            espera = min(espera * 2, 0.05)
+
+            await asyncio.gather(*(buscar_um(indice, url) for indice, url in enumerate(urls)))
+
+    # Versão em fluxo de buscar_todos: gera (indice, parser(corpo)) assim que cada resposta chega, fora de ordem,
+    # enquanto as próximas continuam sendo buscadas numa thread própria. A fila entre as duas é limitada:
+    # se quem consome (montagem/gravação) fica para trás, as novas requisições esperam.
+    def buscar_em_fluxo(self, urls: Iterable[str], parser: Callable[[bytes], Any], headers: Optional[Dict] = None,
+                        em_erro: Callable[[str, Exception], Any] = lambda url, erro: None, etapa: str = "geral",
+                        tamanho_fila: int = TAMANHO_FILA_FLUXO, parse_xml: bool = False) -> Iterator[Tuple[int, Any]]:
+        urls = list(urls)
+        if not urls:
+            return
+        fila: "queue.Queue" = queue.Queue(maxsize=tamanho_fila)
+        parar = threading.Event()
+        erros: List[BaseException] = []
+
+        def produzir():
+            try:
+                asyncio.run(self._buscar_em_fluxo(urls, parser, headers, em_erro, etapa, fila, parar, parse_xml))
+            except BaseException as e:
+                erros.append(e)
+            fila.put(FIM_FLUXO)
+
+        produtor = threading.Thread(target=produzir, name=f"busca-{etapa}", daemon=True)
+        produtor.start()
+        try:
+            while True:
+                item = fila.get()
+                if item is FIM_FLUXO:
+                    break
+                yield item
+            if erros:
+                raise erros[0]
+        finally:
+            # Consumo interrompido: avisa o produtor e esvazia a fila até ele terminar
+            parar.set()
+            while produtor.is_alive():
+                try:
+                    fila.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            produtor.join()
+        self._informar_concorrencia(self.controlador(etapa))
+
+    # Versão síncrona: busca todas as URLs e devolve parser(corpo) para cada uma, na mesma ordem.
+    # Quando uma URL falha (ou o parser lança exceção), o resultado é em_erro(url, erro).
+    # `etapa` identifica o controlador de concorrência usado (ex: 'votos', 'deputados').
+    # parse_xml: o parser lê XML e pode rodar no pool de processos de analiseXml, se estiver ligado.
+    def buscar_todos(self, urls: Iterable[str], parser: Callable[[bytes], Any], headers: Optional[Dict] = None,
+                     em_erro: Callable[[str, Exception], Any] = lambda url, erro: None, etapa: str = "geral",
+                     parse_xml: bool = False) -> List[Any]:
+        urls = list(urls)
+        if not urls:
+            return []
+        resultados = asyncio.run(self._buscar_todos(urls, parser, headers, em_erro, etapa, parse_xml))
+        self._informar_concorrencia(self.controlador(etapa))
+        return resultados
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from .orcamentoHttp import AdaptadorComOrcamento
+
+DIRETORIO_CACHE = os.getenv("ETL_CACHE_HTTP_DIR", "cache_http")
+TAMANHO_MAXIMO_CACHE = int(os.getenv("ETL_CACHE_HTTP_MAX_MB", "2048")) * 1024 * 1024
+
+DIA = 24 * 3600
+
+# Tempo de vida (segundos) por classe de endpoint, avaliado na ordem. None significa "não guardar":
+# os arquivos em massa já são salvos na pasta 'data' e não precisam de uma segunda cópia.
+TTL_POR_ENDPOINT = [
+    (re.compile(r"/arquivos/|/cotas/"), None),
+    (re.compile(r"/api/v2/deputados/\d+$"), 30 * DIA),
+    (re.compile(r"/api/v2/partidos/\d+$"), 30 * DIA),
+    (re.compile(r"/api/v2/votacoes/[^/]+/votos$"), 30 * DIA),
+    (re.compile(r"/api/v2/votacoes/[^/]+$"), 30 * DIA),
+    (re.compile(r"/api/v2/proposicoes/\d+$"), 7 * DIA),
+    (re.compile(r"/api/v2/(deputados|partidos)$"), 1 * DIA),
+]
+TTL_PADRAO = 3600
+
+# Os hits não gravam o ultimo_acesso na hora: os acessos ficam em memória e vão para o índice juntos,
+# no próximo commit do cache ou quando acumularem tantos quanto este limite
+ACESSOS_POR_GRAVACAO = 500
+
+# Resposta guardada no cache
+class EntradaCache:
+    def __init__(self, chave: str, url: str, conteudo: bytes, headers: Dict, etag: Optional[str],
+                 last_modified: Optional[str], expira_em: float):
+        self.chave = chave
+        self.url = url
+        self.conteudo = conteudo
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expira_em = expira_em
+
+    @property
+    def expirada(self) -> bool:
+        return time.time() >= self.expira_em
+
+    # Cabeçalhos para revalidar a entrada com o servidor (resposta 304 se nada mudou)
+    def headers_revalidacao(self) -> Dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+# Cache de respostas HTTP em disco, compartilhado entre anos e execuções.
+# O índice (sqlite) é chaveado por URL + Accept; os corpos ficam em arquivos nomeados pelo SHA-256 do conteúdo,
+# de forma que respostas idênticas ocupam espaço uma única vez. Ao passar de `tamanho_maximo` bytes,
+# as entradas acessadas há mais tempo são removidas. O tamanho total é somado uma vez, ao abrir, e mantido
+# em memória a cada gravação e remoção (outro processo pode gravar no mesmo cache, então a soma é refeita
+# no banco antes de despejar).
+class CacheHttp:
+    def __init__(self, diretorio: str = DIRETORIO_CACHE, tamanho_maximo: int = TAMANHO_MAXIMO_CACHE):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        self.diretorio_objetos = os.path.join(diretorio, "objetos")
+        os.makedirs(self.diretorio_objetos, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(os.path.join(diretorio, "indice.db"), check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS resposta (
+                chave TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                accept TEXT,
+                hash_conteudo TEXT NOT NULL,
+                tamanho INTEGER NOT NULL,
+                headers TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                expira_em REAL NOT NULL,
+                ultimo_acesso REAL NOT NULL
+            )""")
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS ix_resposta_ultimo_acesso ON resposta (ultimo_acesso)")
+        self._conexao.commit()
+        self._tamanho_total = self._somar_tamanhos()
+        self._acessos_pendentes: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidados = 0
+        self.armazenados = 0
+        self.despejados = 0
+
+    @staticmethod
+    def ttl_para(url: str) -> Optional[int]:
+        caminho = requests.utils.urlparse(url).path
+        for padrao, ttl in TTL_POR_ENDPOINT:
+            if padrao.search(caminho):
+                return ttl
+        return TTL_PADRAO
+
+    # Sem Accept e com 'Accept: */*' (o padrão do requests e do aiohttp) a resposta é a mesma: as duas formas
+    # viram a mesma chave, para o BuscadorAsync e a sessão síncrona aproveitarem as entradas uma da outra
+    @staticmethod
+    def chave_para(url: str, accept: Optional[str]) -> str:
+        accept = (accept or '').strip().lower()
+        if accept == '*/*':
+            accept = ''
+        return hashlib.sha256(f"{url}\n{accept}".encode()).hexdigest()
+
+    def _caminho_objeto(self, hash_conteudo: str) -> str:
+        return os.path.join(self.diretorio_objetos, hash_conteudo[:2], hash_conteudo)
+
+    # Devolve a entrada guardada (mesmo expirada, para revalidação) ou None.
+    def obter(self, url: str, accept: Optional[str]) -> Optional[EntradaCache]:
+        chave = self.chave_para(url, accept)
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT hash_conteudo, headers, etag, last_modified, expira_em FROM resposta WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            self._acessos_pendentes[chave] = time.time()
+            if len(self._acessos_pendentes) >= ACESSOS_POR_GRAVACAO:
+                self._gravar_acessos_pendentes()
+                self._conexao.commit()
+
+        hash_conteudo, headers, etag, last_modified, expira_em = linha
+        try:
+            with open(self._caminho_objeto(hash_conteudo), 'rb') as f:
+                conteudo = f.read()
+        except FileNotFoundError:
+            return None
+        return EntradaCache(chave, url, conteudo, json.loads(headers or "{}"), etag, last_modified, expira_em)
+
+    def guardar(self, url: str, accept: Optional[str], conteudo: bytes, headers: Dict, ttl: int):
+        hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+        caminho = self._caminho_objeto(hash_conteudo)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporario, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, caminho)
+
+        headers_guardados = {k: v for k, v in headers.items() if k.lower() in ('content-type', 'etag', 'last-modified')}
+        agora = time.time()
+        chave = self.chave_para(url, accept)
+        with self._lock:
+            anterior = self._conexao.execute("SELECT tamanho FROM resposta WHERE chave = ?", (chave,)).fetchone()
+            self._acessos_pendentes.pop(chave, None)
+            self._gravar_acessos_pendentes()
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO resposta VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (chave, url, accept, hash_conteudo, len(conteudo), json.dumps(headers_guardados),
+                 headers.get('ETag'), headers.get('Last-Modified'), agora + ttl, agora)
+            )
+            self._conexao.commit()
+            self._tamanho_total += len(conteudo) - (anterior[0] if anterior else 0)
+            self.armazenados += 1
+            if self._tamanho_total > self.tamanho_maximo:
+                self._despejar()
+
+    # Servidor respondeu 304: a entrada continua válida por mais um TTL.
+    def renovar(self, entrada: EntradaCache, ttl: int):
+        with self._lock:
+            self._conexao.execute("UPDATE resposta SET expira_em = ? WHERE chave = ?", (time.time() + ttl, entrada.chave))
+            self._gravar_acessos_pendentes()
+            self._conexao.commit()
+            self.revalidados += 1
+
+    def registrar_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def registrar_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def tamanho_total(self) -> int:
+        with self._lock:
+            return self._tamanho_total
+
+    def _somar_tamanhos(self) -> int:
+        return self._conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM resposta").fetchone()[0]
+
+    # Chamado com o lock: os acessos pendentes entram na transação aberta (quem chama faz o commit)
+    def _gravar_acessos_pendentes(self):
+        if self._acessos_pendentes:
+            self._conexao.executemany("UPDATE resposta SET ultimo_acesso = ? WHERE chave = ?",
+                                      [(momento, chave) for chave, momento in self._acessos_pendentes.items()])
+            self._acessos_pendentes.clear()
+
+    # Grava os acessos ainda em memória (ao fim da execução; se o processo cair antes, só a ordem do despejo muda)
+    def gravar_acessos(self):
+        with self._lock:
+            self._gravar_acessos_pendentes()
+            self._conexao.commit()
+
+    # Chamado com o lock: remove as entradas menos acessadas até o cache voltar para 90% do tamanho máximo.
+    def _despejar(self):
+        self._gravar_acessos_pendentes()
+        self._conexao.commit()
+        total = self._tamanho_total = self._somar_tamanhos()
+        if total <= self.tamanho_maximo:
+            return
+        alvo = int(self.tamanho_maximo * 0.9)
+        removidos = []
+        for chave, hash_conteudo, tamanho in self._conexao.execute(
+                "SELECT chave, hash_conteudo, tamanho FROM resposta ORDER BY ultimo_acesso").fetchall():
+            if total <= alvo:
+                break
+            removidos.append((chave, hash_conteudo))
+            total -= tamanho
+        self._conexao.executemany("DELETE FROM resposta WHERE chave = ?", [(c,) for c, _ in removidos])
+        self._conexao.commit()
+        self._tamanho_total = total
+        self.despejados += len(removidos)
+
+        # Só apaga o arquivo se nenhuma outra entrada apontar para o mesmo conteúdo
+        for _, hash_conteudo in removidos:
+            ainda_usado = self._conexao.execute(
+                "SELECT 1 FROM resposta WHERE hash_conteudo = ? LIMIT 1", (hash_conteudo,)).fetchone()
+            if not ainda_usado:
+                try:
+                    os.remove(self._caminho_objeto(hash_conteudo))
+                except FileNotFoundError:
+                    pass
+
+    def estatisticas(self) -> Dict:
+        consultas = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidados": self.revalidados,
+            "armazenados": self.armazenados,
+            "despejados": self.despejados,
+            "taxa_acerto": round(self.hits / consultas, 3) if consultas else 0.0,
+            "tamanho_bytes": self.tamanho_total(),
+        }
+
+    def resumo(self) -> str:
+        e = self.estatisticas()
+        return (f"Cache HTTP: {e['hits']} hits, {e['misses']} misses ({e['taxa_acerto']:.0%} de acerto), "
+                f"{e['revalidados']} revalidados, {e['despejados']} despejados, {e['tamanho_bytes'] / 1024 / 1024:.1f} MB em disco.")
+
+    # Versão para uso fora do adaptador (ex: BuscadorAsync). Devolve (entrada, precisa_revalidar).
+    def consultar(self, url: str, accept: Optional[str]) -> Tuple[Optional[EntradaCache], bool]:
+        if self.ttl_para(url) is None:
+            return None, False
+        entrada = self.obter(url, accept)
+        if entrada is not None and not entrada.expirada:
+            self.registrar_hit()
+            return entrada, False
+        self.registrar_miss()
+        return entrada, entrada is not None
+
+# Monta uma Response do requests a partir de uma entrada do cache
+def resposta_do_cache(entrada: EntradaCache, request: requests.PreparedRequest) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response._content = entrada.conteudo
+    response.headers = CaseInsensitiveDict(entrada.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.from_cache = True
+    return response
+
+# Adaptador do requests que consulta o CacheHttp antes de ir à rede.
+# Requisições com stream=True (downloads grandes) e endpoints sem TTL passam direto.
+# Respostas servidas pelo cache não consomem vaga do orçamento HTTP; só as que vão à rede.
+class AdaptadorComCache(AdaptadorComOrcamento):
+    def __init__(self, cache: CacheHttp, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        ttl = self.cache.ttl_para(request.url)
+        if request.method != 'GET' or stream or ttl is None:
+            return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        accept = request.headers.get('Accept')
+        entrada, revalidar = self.cache.consultar(request.url, accept)
+        if entrada is not None and not revalidar:
+            return resposta_do_cache(entrada, request)
+
+        if revalidar:
+            request.headers.update(entrada.headers_revalidacao())
+
+        response = super().send(request, stream=False, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        if response.status_code == 304 and entrada is not None:
+            self.cache.renovar(entrada, ttl)
+            return resposta_do_cache(entrada, request)
+        if response.status_code == 200:
+            self.cache.guardar(request.url, accept, response.content, response.headers, ttl)
+        return response
@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+from typing import Iterator, List, Optional
+from sqlmodel import Session, select
+from ..models.checkpoint_etapa import CheckpointEtapa
+
+STATUS_PENDENTE = "pendente"
+STATUS_EM_ANDAMENTO = "em_andamento"
+STATUS_CONCLUIDA = "concluida"
+STATUS_FALHOU = "falhou"
+
+# Quantidade de sessões buscadas e gravadas por bloco nas etapas com checkpoint por lote.
+# Em caso de falha, no máximo um bloco precisa ser refeito.
+TAMANHO_BLOCO_CHECKPOINT = int(os.getenv("ETL_TAMANHO_BLOCO_CHECKPOINT", "500"))
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+# Retorna o checkpoint de uma etapa (um novo, ainda não salvo, se a etapa nunca rodou neste banco)
+def obter_checkpoint(session: Session, etapa: str) -> CheckpointEtapa:
+    checkpoint = session.exec(select(CheckpointEtapa).where(CheckpointEtapa.etapa == etapa)).first()
+    return checkpoint or CheckpointEtapa(etapa=etapa)
+
+# A etapa começou a rodar mas não terminou (falhou ou o processo foi interrompido)
+def etapa_interrompida(session: Session, etapa: str) -> bool:
+    return obter_checkpoint(session, etapa).status in (STATUS_EM_ANDAMENTO, STATUS_FALHOU)
+
+def etapa_concluida(session: Session, etapa: str) -> bool:
+    return obter_checkpoint(session, etapa).status == STATUS_CONCLUIDA
+
+# Marca a etapa como em andamento. Ao retomar uma etapa interrompida, os lotes já concluídos são mantidos.
+def iniciar_etapa(session: Session, etapa: str) -> CheckpointEtapa:
+    checkpoint = obter_checkpoint(session, etapa)
+    if checkpoint.status not in (STATUS_EM_ANDAMENTO, STATUS_FALHOU):
+        checkpoint.lotes_concluidos = 0
+        checkpoint.registros = 0
+        checkpoint.posicao_arquivo = None
+    checkpoint.status = STATUS_EM_ANDAMENTO
+    checkpoint.iniciado_em = _agora()
+    checkpoint.concluido_em = None
+    checkpoint.erro = None
+    session.add(checkpoint)
+    session.commit()
+    return checkpoint
+
+def concluir_etapa(session: Session, etapa: str, duracao_segundos: float):
+    checkpoint = obter_checkpoint(session, etapa)
+    checkpoint.status = STATUS_CONCLUIDA
+    checkpoint.concluido_em = _agora()
+    checkpoint.duracao_segundos = round(duracao_segundos, 2)
+    session.add(checkpoint)
+    session.commit()
+
+# Deve ser chamada depois do rollback: grava apenas o status e a mensagem de erro.
+def falhar_etapa(session: Session, etapa: str, erro: Exception):
+    checkpoint = obter_checkpoint(session, etapa)
+    checkpoint.status = STATUS_FALHOU
+    checkpoint.erro = f"{type(erro).__name__}: {erro}"
+    session.add(checkpoint)
+    session.commit()
+
+# Registra um lote concluído. Não faz commit: deve entrar na mesma transação dos dados do lote.
+def registrar_lote(session: Session, etapa: str, registros: int = 0, posicao_arquivo: Optional[int] = None):
+    checkpoint = obter_checkpoint(session, etapa)
+    checkpoint.lotes_concluidos += 1
+    checkpoint.registros += registros
+    if posicao_arquivo is not None:
+        checkpoint.posicao_arquivo = posicao_arquivo
+    session.add(checkpoint)
+
+def dividir_em_blocos(itens: List, tamanho: int = TAMANHO_BLOCO_CHECKPOINT) -> Iterator[List]:
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
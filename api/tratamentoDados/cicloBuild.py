@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import stat
+import time
+from typing import List
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+from ..models.despesa import Despesa
+from ..models.voto_individual import VotoIndividual
+from ..models.votacao_proposicao import VotacaoProposicao
+from .agregados import construir_agregados
+from .checkpoint import concluir_etapa, etapa_concluida, iniciar_etapa
+from .database import PRAGMAS_ESCRITA, get_db_filepath
+from .matrizVotos import construir_matriz_votos
+
+# Etapa registrada no checkpoint quando o banco do ano foi finalizado (índices, ANALYZE, VACUUM, somente leitura)
+ETAPA_FINALIZACAO = "finalizacao"
+
+# VACUUM ao finalizar o primeiro build do ano (as atualizações incrementais só refazem índices e estatísticas)
+VACUUM_AO_FINALIZAR = os.getenv("ETL_VACUUM", "1") == "1"
+# Deixa o arquivo finalizado sem permissão de escrita; o próximo ETL do ano devolve a permissão ao abrir
+MARCAR_SOMENTE_LEITURA = os.getenv("ETL_SOMENTE_LEITURA", "1") == "1"
+
+# Pragmas da carga de um banco ainda não finalizado. Sem fsync a cada commit: se a máquina cair no meio,
+# o build do ano é refeito; se só o processo morrer, o WAL continua íntegro e o checkpoint retoma a carga.
+PRAGMAS_CARGA = {
+    **PRAGMAS_ESCRITA,
+    "synchronous": "OFF",
+    "cache_size": -256000,      # ~256 MB: a carga e a criação dos índices ordenam bastante coisa em memória
+}
+
+# Tabelas grandes, carregadas em massa: os índices secundários delas só são criados depois da carga
+TABELAS_CARGA = [Despesa, VotoIndividual, VotacaoProposicao]
+
+# Índices que não garantem unicidade nas tabelas de carga (os únicos continuam valendo durante a carga)
+def indices_adiados() -> List:
+    return [indice for modelo in TABELAS_CARGA for indice in modelo.__table__.indexes if not indice.unique]
+
+# Lido direto do arquivo, antes de criar a engine, para escolher os pragmas da execução
+def banco_finalizado(year: int) -> bool:
+    caminho = get_db_filepath(year)
+    if not os.path.exists(caminho):
+        return False
+    try:
+        conexao = sqlite3.connect(f"file:{os.path.abspath(caminho)}?mode=ro", uri=True)
+        try:
+            linha = conexao.execute("SELECT status FROM checkpointetapa WHERE etapa = ?", (ETAPA_FINALIZACAO,)).fetchone()
+        finally:
+            conexao.close()
+    except sqlite3.Error:
+        return False
+    return linha is not None and linha[0] == "concluida"
+
+# Devolve a permissão de escrita a um banco finalizado antes de o ETL (ou a migração) gravar nele
+def liberar_escrita(year: int) -> bool:
+    caminho = get_db_filepath(year)
+    if not os.path.exists(caminho) or os.stat(caminho).st_mode & stat.S_IWUSR:
+        return False
+    os.chmod(caminho, stat.S_IMODE(os.stat(caminho).st_mode) | stat.S_IWUSR)
+    return True
+
+def marcar_somente_leitura(year: int):
+    caminho = get_db_filepath(year)
+    modo = stat.S_IMODE(os.stat(caminho).st_mode)
+    os.chmod(caminho, modo & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+# Num banco que ainda não foi finalizado, remove os índices secundários das tabelas de carga: cada lote
+# gravado só atualiza a tabela, e os índices são montados uma vez, já com todas as linhas, em finalizar_build.
+# Um build retomado depois de uma falha continua sem eles; um banco já finalizado (modo incremental,
+# reprocessamento de falhas) mantém os índices, porque grava poucas linhas.
+def preparar_carga(engine: Engine, progress_callback):
+    with Session(engine) as session:
+        if etapa_concluida(session, ETAPA_FINALIZACAO):
+            return
+    with engine.begin() as conexao:
+        for indice in indices_adiados():
+            conexao.exec_driver_sql(f'DROP INDEX IF EXISTS "{indice.name}"')
+    progress_callback('log', f"-> Carga em massa: {len(indices_adiados())} índice(s) secundário(s) serão criados ao final.")
+
+# Fecha o build do ano: cria os índices que faltam (os adiados e os compostos usados pelas rotas), refaz as
+# tabelas agregadas lidas pelos rankings, atualiza as estatísticas do planejador (ANALYZE), volta o journal
+# para DELETE (um único arquivo, sem -wal/-shm), compacta com VACUUM e deixa o arquivo somente leitura.
+# Por último gera a matriz de votos (.npy), que guarda a assinatura do arquivo já compactado. A API detecta o
+# arquivo novo pela assinatura.
+# A engine da carga é descartada: mudar o journal e o VACUUM exigem que nenhuma outra conexão esteja aberta.
+# Se outro processo (ex: a API) estiver lendo o banco, essa parte é pulada com um aviso: os dados e os índices
+# já estão completos, o arquivo continua gravável (um banco em WAL precisa do -shm para ser lido) e o journal
+# volta a ser ajustado na próxima finalização do ano.
+# Retorna True quando o banco ficou em modo DELETE (e somente leitura, se ETL_SOMENTE_LEITURA estiver ativo).
+def finalizar_build(engine: Engine, year: int, progress_callback) -> bool:
+    inicio = time.perf_counter()
+    with Session(engine) as session:
+        primeira_vez = not etapa_concluida(session, ETAPA_FINALIZACAO)
+        iniciar_etapa(session, ETAPA_FINALIZACAO)
+
+    progress_callback('log', "-> Finalizando o banco: índices, agregados, estatísticas e compactação...")
+    inicio_indices = time.perf_counter()
+    with engine.begin() as conexao:
+        for tabela in SQLModel.metadata.sorted_tables:
+            for indice in tabela.indexes:
+                indice.create(conexao, checkfirst=True)
+        progress_callback('log', f"   - Índices: {time.perf_counter() - inicio_indices:.2f}s.")
+        construir_agregados(conexao, progress_callback)
+        inicio_analyze = time.perf_counter()
+        conexao.exec_driver_sql("ANALYZE")
+    progress_callback('log', f"   - ANALYZE: {time.perf_counter() - inicio_analyze:.2f}s.")
+
+    with Session(engine) as session:
+        concluir_etapa(session, ETAPA_FINALIZACAO, time.perf_counter() - inicio)
+    engine.dispose()
+
+    caminho = get_db_filepath(year)
+    conexao = sqlite3.connect(caminho, isolation_level=None, timeout=5)
+    journal_delete = False
+    try:
+        conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        modo = conexao.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+        journal_delete = modo == "delete"
+        if not journal_delete:
+            progress_callback('log', f"   - Aviso: o banco continua em modo '{modo}' (outra conexão aberta).")
+        if VACUUM_AO_FINALIZAR and primeira_vez:
+            inicio_vacuum = time.perf_counter()
+            conexao.execute("VACUUM")
+            progress_callback('log', f"   - VACUUM: {time.perf_counter() - inicio_vacuum:.2f}s.")
+    except sqlite3.OperationalError as e:
+        progress_callback('log', f"   - Aviso: compactação do banco adiada ({e}).")
+    finally:
+        conexao.close()
+
+    somente_leitura = MARCAR_SOMENTE_LEITURA and journal_delete
+    if somente_leitura:
+        marcar_somente_leitura(year)
+    construir_matriz_votos(year, progress_callback)
+    progress_callback('log', f"-> Banco finalizado em {time.perf_counter() - inicio:.2f}s "
+                             f"({os.path.getsize(caminho) / 1024 / 1024:.1f} MB"
+                             + (", somente leitura)." if somente_leitura else ")."))
+    return journal_delete
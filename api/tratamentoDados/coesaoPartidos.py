@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlmodel import Session, func, select
+from ..models.deputado import Deputado
+from ..models.partido import Partido
+from ..models.proposicao import Proposicao
+from ..models.sessao_votacao import SessaoVotacao
+from ..models.votacao_proposicao import VotacaoProposicao
+from ..models.voto_individual import VotoIndividual
+from .database import registro_engines
+from .matrizVotos import INDEFINIDO, matriz_do_ano
+
+# Combinações de (ano, filtros) guardadas por worker; a chave inclui a assinatura do banco, então um banco
+# refeito nunca devolve o resultado antigo (e a recarga da engine ainda libera as entradas do ano)
+MAX_RESULTADOS_EM_CACHE = 64
+
+_cache: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+_lock_cache = threading.Lock()
+
+# Contagem de um partido numa sessão: (id_votacao, votos 'Sim', votos 'Não', votantes, votos no tipo mais votado)
+ContagemSessao = Tuple[int, int, int, int, int]
+
+# Sessões do ano, na ordem dos ids, filtradas pelo órgão e/ou pelo tipo das proposições votadas
+def consulta_sessoes(ano: int, sigla_orgao: Optional[str] = None, sigla_tipo: Optional[str] = None):
+    stmt = select(SessaoVotacao.id).where(SessaoVotacao.ano == ano)
+    if sigla_orgao:
+        stmt = stmt.where(SessaoVotacao.sigla_orgao == sigla_orgao.upper())
+    if sigla_tipo:
+        com_tipo = (select(VotacaoProposicao.id_votacao)
+                    .join(Proposicao, Proposicao.id == VotacaoProposicao.id_proposicao)
+                    .where(Proposicao.sigla_tipo == sigla_tipo.upper()))
+        stmt = stmt.where(SessaoVotacao.id.in_(com_tipo))
+    return stmt.order_by(SessaoVotacao.id)
+
+# Uma passada pela matriz de votos: para cada tipo de voto, votos por partido x sessão (produto da matriz
+# "deputado pertence ao partido" pela matriz "deputado votou esse tipo")
+def _contagens_matriz(matriz, ids_sessao: List[int]) -> Dict[int, List[ContagemSessao]]:
+    if not matriz.tipos:
+        return {}
+    colunas = np.isin(matriz.ids_sessao, ids_sessao)
+    com_partido = matriz.partido != INDEFINIDO
+    votos = matriz.votos[np.ix_(com_partido, colunas)]
+    pertence = (matriz.partido[com_partido][None, :] == np.arange(len(matriz.partidos))[:, None]).astype(np.float32)
+    por_tipo = np.zeros((len(matriz.tipos), len(matriz.partidos), votos.shape[1]), dtype=np.float32)
+    for codigo in range(1, len(matriz.tipos) + 1):
+        por_tipo[codigo - 1] = pertence @ (votos == codigo).astype(np.float32)
+
+    zeros = np.zeros(por_tipo.shape[1:], dtype=np.float32)
+    sim = por_tipo[matriz.codigo_tipo("Sim") - 1] if matriz.codigo_tipo("Sim") else zeros
+    nao = por_tipo[matriz.codigo_tipo("Não") - 1] if matriz.codigo_tipo("Não") else zeros
+    votantes, maioria = por_tipo.sum(axis=0), por_tipo.max(axis=0)
+
+    ids_colunas = matriz.ids_sessao[colunas]
+    contagens = defaultdict(list)
+    for p, s in zip(*np.nonzero(votantes)):
+        contagens[matriz.partidos[p]].append((int(ids_colunas[s]), int(sim[p, s]), int(nao[p, s]), int(votantes[p, s]), int(maioria[p, s])))
+    return contagens
+
+# Sem a matriz: uma única consulta agrupada sobre VotoIndividual (partido x sessão x tipo de voto)
+def _contagens_sql(session: Session, sessoes) -> Dict[int, List[ContagemSessao]]:
+    stmt = (
+        select(Deputado.id_partido, VotoIndividual.id_votacao, VotoIndividual.tipo_voto, func.count(VotoIndividual.id))
+        .join(Deputado, Deputado.id == VotoIndividual.id_deputado)
+        .where(Deputado.id_partido.is_not(None))
+        .where(VotoIndividual.id_votacao.in_(sessoes))
+        .group_by(Deputado.id_partido, VotoIndividual.id_votacao, VotoIndividual.tipo_voto)
+    )
+    por_tipo = defaultdict(dict)
+    for id_partido, id_votacao, tipo_voto, total in session.exec(stmt).all():
+        por_tipo[(id_partido, id_votacao)][tipo_voto] = total
+
+    contagens = defaultdict(list)
+    for (id_partido, id_votacao), totais in sorted(por_tipo.items()):
+        contagens[id_partido].append((id_votacao, totais.get("Sim", 0), totais.get("Não", 0), sum(totais.values()), max(totais.values())))
+    return contagens
+
+# Índice de Rice da bancada na sessão: |Sim - Não| / (Sim + Não), de 0 (dividida ao meio) a 1 (unânime).
+# None quando nenhum deputado do partido votou Sim ou Não.
+def indice_rice(sim: int, nao: int) -> Optional[float]:
+    return abs(sim - nao) / (sim + nao) if sim + nao > 0 else None
+
+def _media(valores: List[float]) -> Optional[float]:
+    return sum(valores) / len(valores) if valores else None
+
+def _resumo_partido(partido: Partido, contagens: List[ContagemSessao]) -> Dict:
+    votacoes = [
+        {
+            "id_votacao": id_votacao,
+            "votantes": votantes,
+            "indice_rice": None if indice_rice(sim, nao) is None else round(indice_rice(sim, nao), 4),
+            "percentual_maioria": round(maioria / votantes * 100, 2),
+        }
+        for id_votacao, sim, nao, votantes, maioria in sorted(contagens)
+    ]
+    rice_medio = _media([indice_rice(sim, nao) for _, sim, nao, _, _ in contagens if indice_rice(sim, nao) is not None])
+    maioria_media = _media([maioria / votantes * 100 for _, _, _, votantes, maioria in contagens])
+    return {
+        "sigla_partido": partido.sigla,
+        "nome_partido": partido.nome_completo,
+        "votacoes_analisadas": len(votacoes),
+        "indice_rice_medio": None if rice_medio is None else round(rice_medio, 4),
+        "percentual_maioria_medio": None if maioria_media is None else round(maioria_media, 2),
+        "votacoes": votacoes,
+    }
+
+# Coesão de todos os partidos em todas as sessões (filtradas) do ano, do partido mais coeso para o menos coeso.
+# Usa a matriz de votos quando o ETL a gerou; o resultado fica em cache para o banco que a API está servindo.
+def coesao_partidos(session: Session, ano: int, sigla_orgao: Optional[str] = None, sigla_tipo: Optional[str] = None) -> List[Dict]:
+    chave = (ano, registro_engines.assinatura(ano), (sigla_orgao or "").upper(), (sigla_tipo or "").upper())
+    with _lock_cache:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+
+    sessoes = consulta_sessoes(ano, sigla_orgao, sigla_tipo)
+    matriz = matriz_do_ano(ano)
+    if matriz is not None:
+        contagens = _contagens_matriz(matriz, session.exec(sessoes).all())
+    else:
+        contagens = _contagens_sql(session, sessoes)
+    partidos = session.exec(select(Partido).where(Partido.id.in_(list(contagens)))).all()
+    resultado = sorted(
+        (_resumo_partido(partido, contagens[partido.id]) for partido in partidos),
+        key=lambda r: (r["indice_rice_medio"] is None, -(r["indice_rice_medio"] or 0), r["sigla_partido"])
+    )
+
+    with _lock_cache:
+        _cache[chave] = resultado
+        while len(_cache) > MAX_RESULTADOS_EM_CACHE:
+            _cache.popitem(last=False)
+    return resultado
+
+def _descartar_cache(ano: int):
+    with _lock_cache:
+        for chave in [chave for chave in _cache if chave[0] == ano]:
+            del _cache[chave]
+
+registro_engines.ao_recarregar(_descartar_cache)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Controla quantas requisições podem estar em andamento ao mesmo tempo (AIMD).
+# A cada "rodada" de sucessos rápidos o limite sobe em `incremento` (aumento aditivo);
+# em 429/5xx, timeouts ou latência muito alta o limite é multiplicado por `fator_reducao` (redução multiplicativa).
+class ControladorAIMD:
+    def __init__(self, nome: str, inicial: int = 10, minimo: int = 2, maximo: int = 50, incremento: int = 1,
+                 fator_reducao: float = 0.5, latencia_alvo: float = 2.0, intervalo_reducao: float = 2.0,
+                 ao_mudar: Optional[Callable[["ControladorAIMD"], None]] = None):
+        self.nome = nome
+        self.minimo = minimo
+        self.maximo = maximo
+        self.incremento = incremento
+        self.fator_reducao = fator_reducao
+        self.latencia_alvo = latencia_alvo
+        self.intervalo_reducao = intervalo_reducao
+        self.ao_mudar = ao_mudar
+
+        self.limite = max(minimo, min(inicial, maximo))
+        self.historico = deque(maxlen=500)
+        self.total_sucessos = 0
+        self.total_falhas = 0
+
+        self._lock = threading.Lock()
+        self._inicio = time.monotonic()
+        self._ultima_reducao = 0.0
+        self._sucessos_rodada = 0
+        self._soma_latencia_rodada = 0.0
+        self._registrar_historico("inicial")
+
+    def registrar_sucesso(self, latencia: float):
+        with self._lock:
+            self.total_sucessos += 1
+            self._sucessos_rodada += 1
+            self._soma_latencia_rodada += latencia
+
+            # Uma rodada equivale a `limite` respostas, ou seja, mais ou menos um "RTT" de todas as requisições em voo
+            if self._sucessos_rodada < self.limite:
+                return
+            media = self._soma_latencia_rodada / self._sucessos_rodada
+            self._sucessos_rodada, self._soma_latencia_rodada = 0, 0.0
+
+            if media <= self.latencia_alvo:
+                novo_limite, motivo = min(self.maximo, self.limite + self.incremento), "aumento"
+            elif media > 2 * self.latencia_alvo:
+                novo_limite, motivo = self._limite_reduzido(), f"latencia {media:.2f}s"
+            else:
+                return
+        self._aplicar(novo_limite, motivo)
+
+    # status: código HTTP (429, 5xx) ou None para timeouts/erros de conexão
+    def registrar_falha(self, status: Optional[int] = None):
+        with self._lock:
+            self.total_falhas += 1
+            agora = time.monotonic()
+            # Várias falhas da mesma rajada contam como um único sinal de congestionamento
+            if agora - self._ultima_reducao < self.intervalo_reducao:
+                return
+            self._ultima_reducao = agora
+            self._sucessos_rodada, self._soma_latencia_rodada = 0, 0.0
+            novo_limite = self._limite_reduzido()
+        self._aplicar(novo_limite, f"HTTP {status}" if status else "timeout/conexao")
+
+    def _limite_reduzido(self) -> int:
+        return max(self.minimo, int(self.limite * self.fator_reducao))
+
+    def _aplicar(self, novo_limite: int, motivo: str):
+        with self._lock:
+            if novo_limite == self.limite:
+                return
+            self.limite = novo_limite
+            self._registrar_historico(motivo)
+        if self.ao_mudar:
+            self.ao_mudar(self)
+
+    def _registrar_historico(self, motivo: str):
+        self.historico.append({"t": round(time.monotonic() - self._inicio, 2), "limite": self.limite, "motivo": motivo})
+
+    def resumo(self) -> Dict:
+        with self._lock:
+            limites = [h["limite"] for h in self.historico]
+            return {
+                "etapa": self.nome,
+                "limite": self.limite,
+                "limite_minimo": min(limites),
+                "limite_maximo": max(limites),
+                "sucessos": self.total_sucessos,
+                "falhas": self.total_falhas,
+                "historico": list(self.historico),
+            }
+
+# Semáforo assíncrono cujo tamanho acompanha o limite atual do controlador.
+class PortaoAdaptativo:
+    def __init__(self, controlador: ControladorAIMD):
+        self.controlador = controlador
+        self._em_andamento = 0
+        self._condicao = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condicao:
+            await self._condicao.wait_for(lambda: self._em_andamento < self.controlador.limite)
+            self._em_andamento += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condicao:
+            self._em_andamento -= 1
+            self._condicao.notify_all()
+        return False
@@ -1,42 +1,210 @@
 import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
 import requests
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlmodel import SQLModel, create_engine, Session
-from urllib3 import Retry
 from requests.adapters import HTTPAdapter
+from .cacheHttp import AdaptadorComCache, CacheHttp
+from .orcamentoHttp import AdaptadorComOrcamento, OrcamentoHttp, RetryComOrcamento
 
 DB_DIRECTORY = "dbs"
 
+# Quantidade máxima de engines (e arquivos .db abertos) mantidas pelo processo da API.
+MAX_ENGINES_ABERTAS = int(os.getenv("MAX_ENGINES_ABERTAS", "8"))
+# De quanto em quanto tempo (segundos) a API confere se o arquivo de um ano foi refeito pelo ETL
+INTERVALO_VERIFICACAO_BANCO = float(os.getenv("INTERVALO_VERIFICACAO_BANCO", "2"))
+
+# Pragmas usados pelo ETL, que escreve no banco.
+PRAGMAS_ESCRITA = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,       # ~64 MB de cache de páginas
+    "mmap_size": 268435456,     # 256 MB mapeados em memória
+    "temp_store": "MEMORY",
+    "busy_timeout": 30000,      # etapas paralelas disputam a escrita; espera a vez em vez de falhar com "database is locked"
+}
+
+# Pragmas usados pela API, que apenas lê o banco.
+PRAGMAS_LEITURA = {
+    "query_only": "ON",
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# Monta o caminho do arquivo do banco de um ano, dentro da pasta 'dbs'.
+def get_db_filepath(year: int) -> str:
+    return os.path.join(DB_DIRECTORY, f"camara_{year}.db")
+
+# Identifica a versão do arquivo do banco: muda quando o ETL o recria (novo inode) ou grava nele (tamanho/mtime).
+# None quando o arquivo não existe.
+def assinatura_banco(year: int) -> Optional[Tuple[int, int, int]]:
+    try:
+        info = os.stat(get_db_filepath(year))
+    except FileNotFoundError:
+        return None
+    return (info.st_ino, info.st_size, info.st_mtime_ns)
+
+# Registra um listener que aplica os pragmas em toda conexão nova da engine.
+def aplicar_pragmas(engine: Engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def _aplicar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+        cursor.close()
+
 # Cria e retorna uma engine do SQLModel para um ano específico.
 # O banco de dados será salvo em uma pasta 'dbs'.
-def get_engine_for_year(year: int):
+def get_engine_for_year(year: int, pragmas: dict = PRAGMAS_ESCRITA):
     # Garante que o diretório 'dbs' exista. Se não existir, ele será criado.
     os.makedirs(DB_DIRECTORY, exist_ok=True)
-    db_filename = f"camara_{year}.db"
-    db_filepath = os.path.join(DB_DIRECTORY, db_filename)
-    
+    db_filepath = get_db_filepath(year)
+
     # Cria a URL de conexão para o arquivo SQLite
     database_url = f"sqlite:///{db_filepath}"
-    engine = create_engine(database_url)
+    engine = create_engine(database_url, connect_args={"check_same_thread": False})
+    aplicar_pragmas(engine, pragmas)
 
     return engine
 
+@dataclass
+class _EngineAberta:
+    engine: Engine
+    assinatura: Optional[Tuple[int, int, int]]
+    verificada_em: float
+
+# Mantém uma engine por ano durante toda a vida do processo da API (cada worker do uvicorn tem o seu registro).
+# Quando o limite é ultrapassado, as engines ociosas usadas há mais tempo são descartadas (LRU).
+# Se o arquivo do ano muda (o ETL refez ou atualizou o banco), a próxima requisição depois de
+# `intervalo_verificacao` troca a engine por uma nova; as consultas em andamento terminam na conexão antiga,
+# que é fechada quando volta ao pool descartado. Os ouvintes de recarga limpam os caches ligados àquele ano.
+class RegistroEngines:
+    def __init__(self, max_engines: int = MAX_ENGINES_ABERTAS, pragmas: dict = PRAGMAS_LEITURA,
+                 intervalo_verificacao: float = INTERVALO_VERIFICACAO_BANCO):
+        self.max_engines = max_engines
+        self.pragmas = pragmas
+        self.intervalo_verificacao = intervalo_verificacao
+        self._engines: "OrderedDict[int, _EngineAberta]" = OrderedDict()
+        self._ouvintes_recarga: List[Callable[[int], None]] = []
+        self._lock = threading.Lock()
+
+    def obter(self, year: int) -> Engine:
+        recarregado = False
+        with self._lock:
+            aberta = self._engines.get(year)
+            agora = time.monotonic()
+            if aberta is not None:
+                self._engines.move_to_end(year)
+                if agora - aberta.verificada_em < self.intervalo_verificacao:
+                    return aberta.engine
+                assinatura = assinatura_banco(year)
+                if assinatura == aberta.assinatura:
+                    aberta.verificada_em = agora
+                    return aberta.engine
+                del self._engines[year]
+                aberta.engine.dispose()
+                recarregado = True
+
+            engine = get_engine_for_year(year, self.pragmas)
+            self._engines[year] = _EngineAberta(engine, assinatura_banco(year), agora)
+            self._despejar_ociosas()
+
+        if recarregado:
+            self._avisar_recarga(year)
+        return engine
+
+    # Assinatura do arquivo que a engine aberta do ano está servindo (chave para caches por banco)
+    def assinatura(self, year: int) -> Optional[Tuple[int, int, int]]:
+        self.obter(year)
+        with self._lock:
+            aberta = self._engines.get(year)
+            return aberta.assinatura if aberta is not None else None
+
+    # Registra uma função chamada com o ano sempre que a engine dele é trocada por causa de um banco refeito
+    def ao_recarregar(self, ouvinte: Callable[[int], None]):
+        with self._lock:
+            self._ouvintes_recarga.append(ouvinte)
+
+    def _avisar_recarga(self, year: int):
+        with self._lock:
+            ouvintes = list(self._ouvintes_recarga)
+        for ouvinte in ouvintes:
+            ouvinte(year)
+
+    # Abre as engines dos anos e faz uma leitura em cada tabela, para que o pool de conexões, o esquema
+    # e as primeiras páginas já estejam carregados quando a primeira requisição do worker chegar.
+    def aquecer(self, anos: List[int]) -> List[int]:
+        aquecidos = []
+        for ano in anos[-self.max_engines:]:
+            if assinatura_banco(ano) is None:
+                continue
+            with self.obter(ano).connect() as conexao:
+                tabelas = conexao.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars().all()
+                for tabela in tabelas:
+                    conexao.exec_driver_sql(f'SELECT 1 FROM "{tabela}" LIMIT 1').all()
+            aquecidos.append(ano)
+        return aquecidos
+
+    # Descarta a engine de um ano (ou todas), fechando as conexões do pool.
+    def descartar(self, year: int = None):
+        with self._lock:
+            anos = list(self._engines) if year is None else [year]
+            for ano in anos:
+                aberta = self._engines.pop(ano, None)
+                if aberta is not None:
+                    aberta.engine.dispose()
+
+    def anos_abertos(self) -> list:
+        with self._lock:
+            return list(self._engines)
+
+    # Percorre da menos para a mais recente, removendo só engines sem conexões em uso.
+    def _despejar_ociosas(self):
+        excedente = len(self._engines) - self.max_engines
+        for ano in list(self._engines):
+            if excedente <= 0:
+                break
+            engine = self._engines[ano].engine
+            checkedout = getattr(engine.pool, "checkedout", lambda: 0)
+            if checkedout() == 0:
+                del self._engines[ano]
+                engine.dispose()
+                excedente -= 1
+
+registro_engines = RegistroEngines()
+
 # Cria todas as tabelas definidas nos modelos para uma engine específica.
 def create_db_and_tables(engine):
     SQLModel.metadata.create_all(engine)
 
 # Cria uma sessão de requests configurada com timeouts e tentativas automáticas.
-def create_session_with_retries() -> requests.Session:
+# Com um CacheHttp, as respostas passam pelo cache em disco antes de ir à rede.
+# orcamento: limite global de requisições simultâneas (compartilhado entre processos no backfill)
+def create_session_with_retries(cache: CacheHttp = None, orcamento: OrcamentoHttp = None) -> requests.Session:
     session = requests.Session()
-    
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])    
-    session.mount('http://', HTTPAdapter(max_retries=retries))
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    
+
+    retries = RetryComOrcamento(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], orcamento=orcamento)
+    if cache is not None:
+        adapter = AdaptadorComCache(cache, max_retries=retries, orcamento=orcamento)
+    elif orcamento is not None:
+        adapter = AdaptadorComOrcamento(max_retries=retries, orcamento=orcamento)
+    else:
+        adapter = HTTPAdapter(max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
     return session
 
 def get_session(year: int):
 
-    engine = get_engine_for_year(year)
-    
+    engine = registro_engines.obter(year)
+
     with Session(engine) as session:
         yield session
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+# Converte as datas da API ("2024-05-10T12:00:00", às vezes só "2024-05-10" ou com frações/fuso) em datetime.
+# Retorna None quando o texto está vazio ou não é uma data.
+def converter_data_hora(texto: Optional[str]) -> Optional[datetime]:
+    if not texto:
+        return None
+    try:
+        valor = datetime.fromisoformat(str(texto).strip())
+    except ValueError:
+        return None
+    return valor.replace(tzinfo=None)
+
+# Colunas tipadas derivadas de 'data_hora_registro', gravadas junto com cada sessão e cada voto:
+# data_hora (DATETIME) e ano/mes (INTEGER), que os filtros por ano usam pelos índices.
+def campos_data(texto: Optional[str]) -> Dict:
+    valor = converter_data_hora(texto)
+    if valor is None:
+        return {"data_hora": None, "ano": None, "mes": None}
+    return {"data_hora": valor, "ano": valor.year, "mes": valor.month}
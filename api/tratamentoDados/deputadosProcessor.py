@@ -1,56 +1,107 @@
 from functools import partial
 import requests
-import xml.etree.ElementTree as ET
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update
 from sqlmodel import Session, select
 from ..models.deputado import Deputado
 from ..models.partido import Partido
+from .escritorLote import EscritorLote
+from .buscadorAsync import BuscadorAsync
+from .dimensoes import RepositorioDimensoes
+from .analiseXml import ERROS_XML, analisar_xml, xml_fromstring
+from .registroFalhas import RegistroFalhas
+
+# Extrai os detalhes do deputado e do gabinete do XML da API
+def extrair_detalhes_deputado_xml(conteudo: bytes) -> Optional[Dict]:
+    root = xml_fromstring(conteudo)
+    dados = root.find('.//dados')
+    if not dados:
+        return None
+
+    # Coleta os detalhes do deputado e do gabinete
+    return {
+        "nome_civil": dados.findtext('nomeCivil'),
+        "nome_eleitoral": dados.findtext('ultimoStatus/nomeEleitoral'),
+        "sexo": dados.findtext('sexo'),
+        "sigla_partido": dados.findtext('ultimoStatus/siglaPartido'),
+        "gabinete": {
+            "nome": dados.findtext('ultimoStatus/gabinete/nome'),
+            "predio": dados.findtext('ultimoStatus/gabinete/predio'),
+            "sala": dados.findtext('ultimoStatus/gabinete/sala'),
+            "andar": dados.findtext('ultimoStatus/gabinete/andar'),
+            "telefone": dados.findtext('ultimoStatus/gabinete/telefone'),
+            "email": dados.findtext('ultimoStatus/gabinete/email')
+        }
+    }
 
 # Busca os detalhes do deputado via xml
-def buscar_detalhes_deputado_xml(uri: str,  http_session: requests.Session) -> Optional[Dict]:
+def buscar_detalhes_deputado_xml(uri: str,  http_session: requests.Session, falhas: Optional[RegistroFalhas] = None) -> Optional[Dict]:
     try:
         headers = {'accept': 'application/xml'}
         response = http_session.get(uri, headers=headers, timeout=(5, 30))
         response.raise_for_status()
-
-        root = ET.fromstring(response.content)
-        dados = root.find('.//dados')
-        if not dados:
-            return None
-
-        # Coleta os detalhes do deputado e do gabinete
-        detalhes = {
-            "nome_civil": dados.findtext('nomeCivil'),
-            "nome_eleitoral": dados.findtext('ultimoStatus/nomeEleitoral'),
-            "sexo": dados.findtext('sexo'),
-            "sigla_partido": dados.findtext('ultimoStatus/siglaPartido'),
-            "gabinete": {
-                "nome": dados.findtext('ultimoStatus/gabinete/nome'),
-                "predio": dados.findtext('ultimoStatus/gabinete/predio'),
-                "sala": dados.findtext('ultimoStatus/gabinete/sala'),
-                "andar": dados.findtext('ultimoStatus/gabinete/andar'),
-                "telefone": dados.findtext('ultimoStatus/gabinete/telefone'),
-                "email": dados.findtext('ultimoStatus/gabinete/email')
-            }
-        }
-        return detalhes
+        return analisar_xml(extrair_detalhes_deputado_xml, response.content)
             
-    except (requests.exceptions.RequestException, ET.ParseError) as e:
-        print(f"  - Falha ao buscar ou analisar detalhes da URI {uri}: {e}")
+    except (requests.exceptions.RequestException, *ERROS_XML) as e:
+        if falhas:
+            falhas.registrar('deputados', uri, e)
         return None
 
+# Linha do banco anual a partir da linha do banco de dimensões: liga ao partido local e à legislatura consultada
+def montar_linha_deputado(linha_dimensao: Dict, id_legislatura: int, mapa_partidos: Dict[str, int]) -> Dict:
+    return {**linha_dimensao, "id_partido": mapa_partidos.get(linha_dimensao.get("sigla_partido")), "id_legislativo": id_legislatura}
+
+# Atualiza o partido dos deputados já gravados que trocaram de legenda, segundo a lista da API
+def atualizar_partidos_deputados(session: Session, deputados_base: List[Dict], mapa_partidos: Dict[str, int], progress_callback):
+    siglas_db = {id_da: sigla for id_da, sigla in session.exec(select(Deputado.id_dados_abertos, Deputado.sigla_partido)).all()}
+    alterados = [d for d in deputados_base
+                 if d.get('id') in siglas_db and d.get('siglaPartido') and d.get('siglaPartido') != siglas_db[d.get('id')]]
+
+    for deputado_info in alterados:
+        sigla_partido = deputado_info.get('siglaPartido')
+        session.execute(
+            update(Deputado)
+            .where(Deputado.id_dados_abertos == deputado_info.get('id'))
+            .values(sigla_partido=sigla_partido, id_partido=mapa_partidos.get(sigla_partido))
+        )
+    if alterados:
+        session.commit()
+        progress_callback("log", f"   - {len(alterados)} deputados mudaram de partido e foram atualizados.")
+
 # Realiza as requições de todos os deputados de uma legislatura (4 anos) e salva os dados
-def fetch_and_save_deputados(session: Session, http_session: requests.Session, id_legislatura: int, progress_callback):
+# incremental: não pula a etapa quando já há deputados; grava os novos e atualiza quem mudou de partido
+# retomar: a etapa foi interrompida numa execução anterior; grava apenas os deputados que faltaram
+# dimensoes: banco compartilhado entre os anos; deputados já guardados lá são copiados sem novas requisições
+# falhas: deputados cujos detalhes não puderam ser buscados vão para o livro de falhas do banco
+def fetch_and_save_deputados(session: Session, http_session: requests.Session, id_legislatura: int, progress_callback, buscador: Optional[BuscadorAsync] = None,
+                             incremental: bool = False, retomar: bool = False, dimensoes: Optional[RepositorioDimensoes] = None,
+                             falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
     progress_callback('log', f"-> Iniciando busca de deputados para a Legislatura nº {id_legislatura}...")
 
     stmt_verificacao = select(Deputado)
     deputados_existente = session.exec(stmt_verificacao).first()
 
-    if deputados_existente:
+    if deputados_existente and not (incremental or retomar):
         progress_callback('log', f"-> Deputado para a legislatura {id_legislatura} já constam no banco. Etapa concluída.")
         return 
 
+    stmt_partidos = select(Partido.id, Partido.sigla)
+    mapa_partidos = {sigla: id for id, sigla in session.exec(stmt_partidos).all()}
+
+    # --- Outro ano da legislatura já carregou a lista completa: copia do banco de dimensões, sem requisições ---
+    chave_carga = f"deputados:{id_legislatura}"
+    if dimensoes and not incremental and dimensoes.carga_concluida(chave_carga):
+        ids_deputados_existentes = set(session.exec(select(Deputado.id_dados_abertos)).all())
+        deputados_copiados = [linha for linha in dimensoes.deputados_da_legislatura(id_legislatura)
+                              if linha['id_dados_abertos'] not in ids_deputados_existentes]
+        with EscritorLote(session, Deputado, progress_callback, nome="Deputados") as escritor:
+            for linha in deputados_copiados:
+                escritor.adicionar(montar_linha_deputado(linha, id_legislatura, mapa_partidos))
+        progress_callback("log", f"-> {len(deputados_copiados)} deputados copiados do banco de dimensões compartilhado.")
+        return
+
     # --- 1. Busca a lista base de deputados da API (com paginação) ---
     deputados_base = []
     url = f"https://dadosabertos.camara.leg.br/api/v2/deputados?idLegislatura={id_legislatura}&itens=100&ordem=ASC&ordenarPor=nome"
@@ -63,8 +114,7 @@ def fetch_and_save_deputados(session: Session, http_session: requests.Session, i
             deputados_base.extend(dados.get('dados', []))
             url = next((link['href'] for link in dados['links'] if link['rel'] == 'next'), None)
         except requests.exceptions.RequestException as e:
-            progress_callback('log', "ERRO CRÍTICO: Não foi possível buscar a lista de deputados. {e}")
-            return
+            raise Exception(f"Não foi possível buscar a lista de deputados da legislatura {id_legislatura}: {e}")
 
     progress_callback("log",f"   - Encontrados {len(deputados_base)} registros de deputados na legislatura.")
 
@@ -74,51 +124,69 @@ def fetch_and_save_deputados(session: Session, http_session: requests.Session, i
     # Convertemos os valores do dicionário de volta para uma lista.
     deputados_base_unicos = list(deputados_unicos_dict.values())
     progress_callback("log", f"   - Total de {len(deputados_base_unicos)} deputados únicos para processar.")
+    if dimensoes:
+        dimensoes.vincular_legislatura(id_legislatura, deputados_unicos_dict)
 
     # --- Otimizações pré-loop ---
     stmt_existentes = select(Deputado.id_dados_abertos)
     ids_deputados_existentes = set(session.exec(stmt_existentes).all())
     progress_callback("log",f"   - Encontrados {len(ids_deputados_existentes)} deputados já existentes no banco.")
 
-    stmt_partidos = select(Partido.id, Partido.sigla)
-    mapa_partidos = {sigla: id for id, sigla in session.exec(stmt_partidos).all()}
+    if incremental:
+        atualizar_partidos_deputados(session, deputados_base_unicos, mapa_partidos, progress_callback)
+        if dimensoes:
+            dimensoes.atualizar_sigla_partido({d['id']: d['siglaPartido'] for d in deputados_base_unicos if d.get('siglaPartido')})
 
     # --- 2. Busca todos os detalhes de forma concorrente ---
     deputados_a_processar = [p for p in deputados_base_unicos if p.get('id') not in ids_deputados_existentes]
-    uris_para_buscar = [p.get('uri') for p in deputados_a_processar if p.get('uri')]
+
+    # Deputados já guardados no banco de dimensões (ex: outro ano da legislatura) não precisam de novas requisições
+    deputados_guardados = dimensoes.obter('deputado', [p.get('id') for p in deputados_a_processar]) if dimensoes else {}
+    if deputados_guardados:
+        progress_callback("log", f"   - {len(deputados_guardados)} deputados reaproveitados do banco de dimensões.")
+    deputados_a_buscar = [p for p in deputados_a_processar if p.get('id') not in deputados_guardados and p.get('uri')]
+    uris_para_buscar = [p.get('uri') for p in deputados_a_buscar]
     
-    if not uris_para_buscar:
-        print("Nenhum deputado novo para processar.")
-        print("Processamento de deputados concluído.")
+    if not deputados_a_processar:
+        if dimensoes:
+            dimensoes.registrar_carga_se_completa(chave_carga, 'deputado', deputados_unicos_dict)
+        progress_callback("log", "   - Nenhum deputado novo para processar.")
+        progress_callback("log", "-> Processamento de deputados concluído.")
         return
 
     progress_callback("log", f"   - Buscando detalhes para {len(uris_para_buscar)} novos deputados simultaneamente...")
 
     # --- Detalhes sendo buscados de forma paralela
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        buscar_com_sessao = partial(buscar_detalhes_deputado_xml, http_session=http_session)
-        detalhes_dos_deputados =  list(executor.map(buscar_com_sessao, uris_para_buscar))
-
-    # --- 3. Itera sobre os resultados combinados e cria os objetos do modelo ---
+    if buscador:
+        detalhes_dos_deputados = buscador.buscar_todos(uris_para_buscar, extrair_detalhes_deputado_xml, headers={'accept': 'application/xml'}, em_erro=falhas.em_erro('deputados'), etapa='deputados', parse_xml=True)
+    else:
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            buscar_com_sessao = partial(buscar_detalhes_deputado_xml, http_session=http_session, falhas=falhas)
+            detalhes_dos_deputados =  list(executor.map(buscar_com_sessao, uris_para_buscar))
+
+    # --- 3. Itera sobre os resultados combinados e guarda no banco de dimensões ---
     progress_callback("log", "   - Combinando dados e preparando para salvar...")
-    for deputado_info, detalhes_deputado in zip(deputados_a_processar, detalhes_dos_deputados):
+    linhas_buscadas = []
+    for deputado_info, detalhes_deputado in zip(deputados_a_buscar, detalhes_dos_deputados):
         if detalhes_deputado:
-            sigla_partido = detalhes_deputado.get("sigla_partido")
-            id_partido_fk = mapa_partidos.get(sigla_partido)
-
-            deputado_obj = Deputado(
-                id_dados_abertos=deputado_info.get('id'),
-                nome_civil=detalhes_deputado.get('nome_civil'),
-                nome_eleitoral=detalhes_deputado.get('nome_eleitoral'),
-                sigla_partido=sigla_partido,
-                id_partido=id_partido_fk,
-                sigla_uf=deputado_info.get('siglaUf'),
-                sexo=detalhes_deputado.get('sexo'),
-                id_legislativo=deputado_info.get('idLegislatura'),
-                url_foto=deputado_info.get('urlFoto')
-            )
-            session.add(deputado_obj)
+            linhas_buscadas.append({
+                "id_dados_abertos": deputado_info.get('id'),
+                "nome_civil": detalhes_deputado.get('nome_civil'),
+                "nome_eleitoral": detalhes_deputado.get('nome_eleitoral'),
+                "sigla_partido": detalhes_deputado.get("sigla_partido"),
+                "sigla_uf": deputado_info.get('siglaUf'),
+                "sexo": detalhes_deputado.get('sexo'),
+                "url_foto": deputado_info.get('urlFoto')
+            })
         else:
             progress_callback("log", f"  - Falha ao obter detalhes para o deputado {deputado_info.get('nome')}. Pulando.")
+    if dimensoes:
+        dimensoes.gravar('deputado', linhas_buscadas)
+        dimensoes.registrar_carga_se_completa(chave_carga, 'deputado', deputados_unicos_dict)
+
+    falhas.gravar(session, 'deputados', uris_para_buscar)
+    with EscritorLote(session, Deputado, progress_callback, nome="Deputados") as escritor:
+        for linha in list(deputados_guardados.values()) + linhas_buscadas:
+            escritor.adicionar(montar_linha_deputado(linha, id_legislatura, mapa_partidos))
     
     progress_callback("log", "-> Processamento de deputados concluído.")
\ No newline at end of file
@@ -2,38 +2,42 @@ import requests
 import zipfile
 import json
 import os
-from typing import Optional
+from typing import Dict, Optional
+from sqlalchemy import delete, func
 from sqlmodel import Session, select
 from ..models.despesa import Despesa
 from ..models.deputado import Deputado
-import os
-import requests
+from .arquivoStream import baixar_arquivo_em_partes, iterar_array_json_no_zip
+from .escritorLote import EscritorLote
+from .pipelineEtl import GravadorEmThread
+from .checkpoint import obter_checkpoint, registrar_lote
+from .eventosProgresso import MedidorProgresso
+from .sincronizacao import conteudo_mudou, obter_marca, registrar_marca, verificar_arquivo_remoto
 
-# Faz o download do arquivo de despesas de um ano, descompacta e salva em data
-def download_and_unzip_local_despesas(ano: int, http_session: requests.Session, progress_callback) -> Optional[str]:
-    DATA_DIR = "data"
+# Quantidade de despesas enviadas ao banco por vez no modo streaming
+TAMANHO_LOTE_DESPESAS = 5000
+
+DATA_DIR = "data"
+
+URL_ARQUIVO_DESPESAS = "http://www.camara.leg.br/cotas/Ano-{ano}.json.zip"
+
+# Faz o download do ZIP de despesas de um ano em blocos, direto para a pasta data
+def download_local_despesas_zip(ano: int, http_session: requests.Session, progress_callback) -> Optional[str]:
     os.makedirs(DATA_DIR, exist_ok=True)
 
     zip_filename = f"despesas_{ano}.json.zip"
     zip_filepath = os.path.join(DATA_DIR, zip_filename)
-    json_filename = f"despesas_{ano}.json"
-    json_filepath = os.path.join(DATA_DIR, json_filename)
 
-    # 1. Baixa o ZIP se não existir
     if not os.path.exists(zip_filepath):
         progress_callback('log', f"   - Baixando arquivo ZIP de despesas para o ano {ano}...")
         
-        url = f"http://www.camara.leg.br/cotas/Ano-{ano}.json.zip"
+        url = URL_ARQUIVO_DESPESAS.format(ano=ano)
 
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         try:
-            response = http_session.get(url, headers=headers, timeout=300, stream=True)
-            response.raise_for_status()
-
-            with open(zip_filepath, 'wb') as f:
-                f.write(response.content)
+            baixar_arquivo_em_partes(url, zip_filepath, http_session, headers=headers, timeout=300)
             progress_callback('log', f"   - ZIP salvo em '{zip_filepath}'")
         except requests.exceptions.RequestException as e:
             progress_callback('log', f"   - ERRO: Falha no download do ZIP para o ano {ano}. Detalhes: {e}")
@@ -43,6 +47,17 @@ def download_and_unzip_local_despesas(ano: int, http_session: requests.Session,
     else:
         progress_callback('log', f"   - Arquivo '{zip_filepath}' já existe localmente.")
 
+    return zip_filepath
+
+# Faz o download do arquivo de despesas de um ano, descompacta e salva em data
+def download_and_unzip_local_despesas(ano: int, http_session: requests.Session, progress_callback) -> Optional[str]:
+    json_filepath = os.path.join(DATA_DIR, f"despesas_{ano}.json")
+
+    # 1. Baixa o ZIP se não existir
+    zip_filepath = download_local_despesas_zip(ano, http_session, progress_callback)
+    if not zip_filepath:
+        return None
+
     # 2. Descompacta o ZIP para JSON se ainda não existir
     if not os.path.exists(json_filepath):
         progress_callback('log', f"   - Descompactando ZIP para '{json_filepath}'...")
@@ -63,70 +78,179 @@ def download_and_unzip_local_despesas(ano: int, http_session: requests.Session,
     return json_filepath
 
 
+# Converte uma despesa do arquivo em uma linha da tabela, ou None se ela deve ser ignorada
+def montar_linha_despesa(despesa: Dict, mapa_deputados: Dict[int, int]) -> Optional[Dict]:
+    # Validação de dados essenciais
+    valor_liquido = despesa.get('valorLiquido')
+    id_deputado_api = despesa.get('idDeputado')
+    if not valor_liquido or not id_deputado_api:
+        return None
+
+    id_deputado_fk = mapa_deputados.get(id_deputado_api)
+    if id_deputado_fk is None:
+        return None
+
+    return {
+        "id_deputado": id_deputado_fk,
+        "ano": despesa.get('ano'),
+        "mes": despesa.get('mes'),
+        "tipo_despesa": despesa.get('tipoDespesa'),
+        "valor_liquido": valor_liquido,
+        "tipo_documento": despesa.get('tipoDocumento'),
+        "url_documento": despesa.get('urlDocumento'),
+        "nome_fornecedor": despesa.get('nomeFornecedor'),
+    }
+
+# Lê as despesas direto de dentro do ZIP e as envia ao banco em lotes de tamanho fixo.
+# A leitura/montagem (esta thread) e a gravação (GravadorEmThread, com Session própria) acontecem ao mesmo tempo;
+# o pico de memória fica limitado à fila entre as duas, independente do tamanho do arquivo.
+# mes_minimo: grava apenas as despesas a partir desse mês (usado pela sincronização incremental).
+# checkpoint: cada lote grava, na mesma transação, quantos itens do arquivo já foram consumidos;
+# posicao_inicial pula esses itens ao retomar uma execução interrompida.
+def salvar_despesas_streaming(session: Session, caminho_zip: str, mapa_deputados: Dict[int, int], progress_callback,
+                              mes_minimo: Optional[int] = None, checkpoint: Optional[str] = None, posicao_inicial: int = 0) -> int:
+    progress_callback('log', f"   - Lendo '{caminho_zip}' em modo streaming (lotes de {TAMANHO_LOTE_DESPESAS})...")
+    if posicao_inicial:
+        progress_callback('log', f"   - Retomando a partir do item {posicao_inicial} do arquivo.")
+
+    # O marcador de cada linha é a posição dela no arquivo; o checkpoint guarda a da última linha gravada
+    def registrar_checkpoint(sessao_escrita: Session, linhas: int, posicao: int):
+        registrar_lote(sessao_escrita, checkpoint, registros=linhas, posicao_arquivo=posicao)
+
+    with GravadorEmThread(session.get_bind(), Despesa, progress_callback, tamanho_lote=TAMANHO_LOTE_DESPESAS, nome="Despesas",
+                          ao_confirmar=registrar_checkpoint if checkpoint else None) as gravador:
+        medidor = MedidorProgresso(progress_callback, 'despesas', "Lendo despesas do ZIP")
+        for posicao_item, despesa in enumerate(iterar_array_json_no_zip(caminho_zip, chave='dados'), start=1):
+            medidor.avancar()
+            if posicao_item <= posicao_inicial:
+                continue
+            linha = montar_linha_despesa(despesa, mapa_deputados)
+            if linha is None:
+                continue
+            if mes_minimo is not None and (linha["mes"] or 0) < mes_minimo:
+                continue
+            gravador.adicionar(linha, marcador=posicao_item)
+        medidor.concluir()
+
+    return gravador.total_gravado
+
+# Sincronização incremental das despesas: só baixa o ZIP de novo se o arquivo remoto mudou e só regrava
+# a partir do último mês sincronizado. Meses anteriores são considerados fechados; o último é regravado
+# por inteiro, pois pode ter sido gravado pela metade.
+def sincronizar_despesas(session: Session, http_session: requests.Session, ano: int, progress_callback):
+    zip_filepath = os.path.join(DATA_DIR, f"despesas_{ano}.json.zip")
+    mudou, versao_remota = verificar_arquivo_remoto(session, http_session, 'despesas', URL_ARQUIVO_DESPESAS.format(ano=ano), zip_filepath, progress_callback)
+    if not mudou:
+        progress_callback('log', "-> Despesas já estão atualizadas.")
+        return
+
+    caminho_zip = download_local_despesas_zip(ano, http_session, progress_callback)
+    if not caminho_zip:
+        raise Exception(f"Não foi possível obter o arquivo de despesas para o ano {ano}.")
+
+    mudou, hash_arquivo = conteudo_mudou(session, 'despesas', caminho_zip, progress_callback)
+    if not mudou:
+        registrar_marca(session, 'despesas', etag=versao_remota)
+        progress_callback('log', "-> Despesas já estão atualizadas.")
+        return
+
+    # Banco montado antes da marca d'água existir: parte do último mês já gravado
+    mes_inicial = obter_marca(session, 'despesas').ultimo_mes_despesa
+    if mes_inicial is None:
+        mes_inicial = session.exec(select(func.max(Despesa.mes)).where(Despesa.ano == ano)).one()
+
+    if mes_inicial is not None:
+        progress_callback('log', f"   - Regravando despesas a partir do mês {mes_inicial}...")
+        session.execute(delete(Despesa).where(Despesa.ano == ano, Despesa.mes >= mes_inicial))
+        session.commit()
+
+    stmt_deputados = select(Deputado.id, Deputado.id_dados_abertos)
+    mapa_deputados = {id_dados_abertos: id_db for id_db, id_dados_abertos in session.exec(stmt_deputados).all()}
+
+    total_salvas = salvar_despesas_streaming(session, caminho_zip, mapa_deputados, progress_callback, mes_minimo=mes_inicial)
+    ultimo_mes = session.exec(select(func.max(Despesa.mes)).where(Despesa.ano == ano)).one()
+    registrar_marca(session, 'despesas', etag=versao_remota, hash_arquivo=hash_arquivo, ultimo_mes_despesa=ultimo_mes)
+    progress_callback('log', f"   - {total_salvas} despesas enviadas ao banco.")
+    progress_callback('log', "-> Processamento de despesas concluído.")
+
 #  Verifica se já existem despesas para o ano. Se não, baixa o arquivo, processa e salva todas as despesas daquele ano.
-def fetch_and_save_despesas(session: Session, http_session: requests.Session, ano: int, progress_callback):
+# incremental: em vez de pular a etapa quando já há despesas, sincroniza apenas o que mudou (ver sincronizar_despesas).
+# retomar: a etapa foi interrompida; no modo streaming continua do último lote registrado no checkpoint.
+def fetch_and_save_despesas(session: Session, http_session: requests.Session, ano: int, progress_callback, streaming: bool = True,
+                            incremental: bool = False, retomar: bool = False):
     progress_callback('log', f"-> Iniciando processamento de despesas para o ano {ano}...")
 
+    if incremental:
+        sincronizar_despesas(session, http_session, ano, progress_callback)
+        return
+
     stmt_verificacao = select(Despesa)
     despesa_existente = session.exec(stmt_verificacao).first()
 
-    if despesa_existente:
+    if despesa_existente and not retomar:
         progress_callback('log', f"-> Despesas para o ano {ano} já constam no banco. Etapa concluída.")
         return 
     
     # Se o código continuar, significa que não há despesas para este ano e o processamento é necessário.
     progress_callback('log', f"   - Nenhuma despesa para {ano} encontrada. Iniciando coleta...")
 
+    # --- Otimizações pré-loop ---
+    progress_callback('log', "   - Criando mapa de deputados para chaves estrangeiras...")
+    stmt_deputados = select(Deputado.id, Deputado.id_dados_abertos)
+    mapa_deputados = {id_dados_abertos: id_db for id_db, id_dados_abertos in session.exec(stmt_deputados).all()}
+
+    # --- Modo streaming: lê o ZIP sem descompactar e salva em lotes ---
+    if streaming:
+        caminho_zip = download_local_despesas_zip(ano, http_session, progress_callback)
+        if not caminho_zip:
+            raise Exception(f"Não foi possível obter o arquivo de despesas para o ano {ano}.")
+
+        posicao_inicial = (obter_checkpoint(session, 'despesas').posicao_arquivo or 0) if retomar else 0
+        total_salvas = salvar_despesas_streaming(session, caminho_zip, mapa_deputados, progress_callback,
+                                                 checkpoint='despesas', posicao_inicial=posicao_inicial)
+        progress_callback('log', f"   - {total_salvas} despesas enviadas ao banco.")
+        progress_callback('log', "-> Processamento de despesas concluído.")
+        return
+
+    # O modo não-streaming não tem checkpoint por lote: ao retomar, a etapa recomeça do zero
+    if retomar:
+        session.execute(delete(Despesa).where(Despesa.ano == ano))
+        session.commit()
+
     # --- 1. Garante que o arquivo de dados exista localmente ---
     caminho_arquivo_json = download_and_unzip_local_despesas(ano, http_session, progress_callback)
     if not caminho_arquivo_json:
         raise Exception(f"Não foi possível obter o arquivo de despesas para o ano {ano}.")
 
-    # --- Otimizações pré-loop ---
-    progress_callback('log', "   - Criando mapa de deputados para chaves estrangeiras...")
-    stmt_deputados = select(Deputado.id, Deputado.id_dados_abertos)
-    mapa_deputados = {id_dados_abertos: id_db for id_db, id_dados_abertos in session.exec(stmt_deputados).all()}
-    
     # --- Carrega e processa o arquivo JSON ---
     progress_callback('log', f"   - Lendo arquivo local '{caminho_arquivo_json}'...")
     with open(caminho_arquivo_json, 'r', encoding='utf-8-sig') as f: # Usando utf-8-sig por segurança
         dados = json.load(f)
     
     despesas_do_arquivo = dados.get('dados', [])
-    total_despesas = len(despesas_do_arquivo)
-    
-    # --- Prepara uma lista para inserção em massa ---
-    objetos_despesa_para_salvar = []
     
-    for i, despesa in enumerate(despesas_do_arquivo):
-        # Validação de dados essenciais
-        valor_liquido = despesa.get('valorLiquido')
-        id_deputado_api = despesa.get('idDeputado')
-        if not valor_liquido or not id_deputado_api:
-            continue
-            
-        id_deputado_fk = mapa_deputados.get(id_deputado_api)
-        if id_deputado_fk is None:
-            continue
-
-        despesa_obj = Despesa(
-            id_deputado=id_deputado_fk,
-            ano=despesa.get('ano'),
-            mes=despesa.get('mes'),
-            tipo_despesa=despesa.get('tipoDespesa'), 
-            valor_liquido=valor_liquido,
-            tipo_documento=despesa.get('tipoDocumento'),
-            url_documento=despesa.get('urlDocumento'),
-            nome_fornecedor=despesa.get('nomeFornecedor') 
-        )
-        objetos_despesa_para_salvar.append(despesa_obj)
-        
-        if (i + 1) % 50000 == 0: 
-            print(f"\r     {i + 1}/{total_despesas} registros verificados.", end="", flush=True)
-        print()
+    # --- Grava as despesas em lotes ---
+    with EscritorLote(session, Despesa, progress_callback, nome="Despesas") as escritor, \
+            MedidorProgresso(progress_callback, 'despesas', "Registros de despesas verificados", total=len(despesas_do_arquivo)) as medidor:
+        for despesa in despesas_do_arquivo:
+            linha = montar_linha_despesa(despesa, mapa_deputados)
+            if linha is not None:
+                escritor.adicionar(linha)
+            medidor.avancar()
 
-    if objetos_despesa_para_salvar:
-        progress_callback('log', f"   - Adicionando {len(objetos_despesa_para_salvar)} novas despesas à sessão...")
-        session.add_all(objetos_despesa_para_salvar)
+    progress_callback('log', "-> Processamento de despesas concluído.")
 
-    progress_callback('log', "-> Processamento de despesas concluído.")
\ No newline at end of file
+# Modo de reprocessamento: deputados recuperados do livro de falhas não tinham linha no banco quando as despesas
+# foram gravadas, então nenhuma despesa deles existe. Relê o ZIP local (sem requisição, se já baixado)
+# gravando só as despesas desses deputados.
+def salvar_despesas_dos_deputados(session: Session, http_session: requests.Session, ano: int, ids_deputados: set, progress_callback) -> int:
+    stmt_deputados = select(Deputado.id, Deputado.id_dados_abertos).where(Deputado.id_dados_abertos.in_(list(ids_deputados)))
+    mapa_deputados = {id_dados_abertos: id_db for id_db, id_dados_abertos in session.exec(stmt_deputados).all()}
+    if not mapa_deputados:
+        return 0
+    caminho_zip = download_local_despesas_zip(ano, http_session, progress_callback)
+    if not caminho_zip:
+        raise Exception(f"Não foi possível obter o arquivo de despesas para o ano {ano}.")
+    total_salvas = salvar_despesas_streaming(session, caminho_zip, mapa_deputados, progress_callback)
+    progress_callback('log', f"   - {total_salvas} despesas de {len(mapa_deputados)} deputados recuperados enviadas ao banco.")
+    return total_salvas
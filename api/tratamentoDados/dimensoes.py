@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List
+from .database import DB_DIRECTORY
+
+CAMINHO_DIMENSOES = os.getenv("ETL_DIMENSOES_DB", os.path.join(DB_DIRECTORY, "dimensions.db"))
+
+# Quantidade de ids por consulta IN (abaixo do limite de variáveis do sqlite)
+TAMANHO_CONSULTA = 500
+
+# Colunas guardadas de cada dimensão: os mesmos nomes dos modelos dos bancos anuais, sem as chaves locais
+# (id, id_partido) nem o que depende do ano (id_legislativo do deputado vem da legislatura consultada).
+COLUNAS_DIMENSOES = {
+    "partido": ["id_dados_abertos", "sigla", "nome_completo", "uri_logo", "id_legislativo", "situacao",
+                "total_membros", "total_posse_legislatura"],
+    "deputado": ["id_dados_abertos", "nome_civil", "nome_eleitoral", "sigla_partido", "sigla_uf", "url_foto", "sexo"],
+    "proposicao": ["id_dados_abertos", "sigla_tipo", "ano", "ementa", "data_apresentacao", "status", "url_inteiro_teor"],
+}
+TIPO_CHAVE = {"partido": "INTEGER", "deputado": "INTEGER", "proposicao": "TEXT"}
+
+# Banco de referência compartilhado por todos os anos ('dbs/dimensions.db') com partidos, deputados e proposições.
+# Cada entidade é buscada na API uma única vez e gravada aqui (upsert por id_dados_abertos); os bancos anuais
+# copiam as linhas daqui em vez de chamar a API de novo. A tabela 'carga' registra quais listas já estão
+# completas (ex: 'deputados:57'), permitindo pular até as listagens quando outro ano da legislatura já rodou.
+class RepositorioDimensoes:
+    def __init__(self, caminho: str = CAMINHO_DIMENSOES):
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.row_factory = sqlite3.Row
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        for tabela, colunas in COLUNAS_DIMENSOES.items():
+            definicoes = ", ".join(colunas[1:])
+            self._conexao.execute(
+                f"CREATE TABLE IF NOT EXISTS {tabela} (id_dados_abertos {TIPO_CHAVE[tabela]} PRIMARY KEY, {definicoes}, atualizado_em REAL)")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS deputado_legislatura (
+                id_deputado INTEGER NOT NULL,
+                id_legislatura INTEGER NOT NULL,
+                PRIMARY KEY (id_deputado, id_legislatura)
+            )""")
+        self._conexao.execute("CREATE TABLE IF NOT EXISTS carga (chave TEXT PRIMARY KEY, atualizado_em REAL NOT NULL)")
+        self._conexao.commit()
+
+        self.reaproveitados = 0
+        self.gravados = 0
+
+    # Insere ou atualiza as linhas (dicionários com as colunas de COLUNAS_DIMENSOES) pela chave id_dados_abertos.
+    def gravar(self, tabela: str, linhas: Iterable[Dict]):
+        colunas = COLUNAS_DIMENSOES[tabela]
+        atualizacoes = ", ".join(f"{c} = excluded.{c}" for c in colunas[1:])
+        sql = (f"INSERT INTO {tabela} ({', '.join(colunas)}, atualizado_em) VALUES ({', '.join('?' * (len(colunas) + 1))}) "
+               f"ON CONFLICT(id_dados_abertos) DO UPDATE SET {atualizacoes}, atualizado_em = excluded.atualizado_em")
+        agora = time.time()
+        valores = [tuple(linha.get(c) for c in colunas) + (agora,) for linha in linhas]
+        if not valores:
+            return
+        with self._lock:
+            self._conexao.executemany(sql, valores)
+            self._conexao.commit()
+            self.gravados += len(valores)
+
+    # Devolve {id_dados_abertos: linha} para os ids já guardados
+    def obter(self, tabela: str, ids: Iterable) -> Dict:
+        ids = list(ids)
+        encontrados = {}
+        with self._lock:
+            for i in range(0, len(ids), TAMANHO_CONSULTA):
+                parte = ids[i:i + TAMANHO_CONSULTA]
+                for linha in self._conexao.execute(
+                        f"SELECT {', '.join(COLUNAS_DIMENSOES[tabela])} FROM {tabela} "
+                        f"WHERE id_dados_abertos IN ({', '.join('?' * len(parte))})", parte):
+                    encontrados[linha["id_dados_abertos"]] = dict(linha)
+            self.reaproveitados += len(encontrados)
+        return encontrados
+
+    def todos(self, tabela: str) -> List[Dict]:
+        with self._lock:
+            linhas = [dict(l) for l in self._conexao.execute(f"SELECT {', '.join(COLUNAS_DIMENSOES[tabela])} FROM {tabela}")]
+            self.reaproveitados += len(linhas)
+        return linhas
+
+    def vincular_legislatura(self, id_legislatura: int, ids_deputados: Iterable[int]):
+        with self._lock:
+            self._conexao.executemany("INSERT OR IGNORE INTO deputado_legislatura VALUES (?, ?)",
+                                      [(id_deputado, id_legislatura) for id_deputado in ids_deputados])
+            self._conexao.commit()
+
+    def deputados_da_legislatura(self, id_legislatura: int) -> List[Dict]:
+        colunas = ", ".join(f"d.{c}" for c in COLUNAS_DIMENSOES["deputado"])
+        with self._lock:
+            linhas = [dict(l) for l in self._conexao.execute(
+                f"SELECT {colunas} FROM deputado d JOIN deputado_legislatura dl ON dl.id_deputado = d.id_dados_abertos "
+                f"WHERE dl.id_legislatura = ?", (id_legislatura,))]
+            self.reaproveitados += len(linhas)
+        return linhas
+
+    # Deputados que trocaram de partido (modo incremental): {id_dados_abertos: nova sigla}
+    def atualizar_sigla_partido(self, siglas: Dict[int, str]):
+        with self._lock:
+            self._conexao.executemany(
+                "UPDATE deputado SET sigla_partido = ?, atualizado_em = ? WHERE id_dados_abertos = ? AND sigla_partido IS NOT ?",
+                [(sigla, time.time(), id_deputado, sigla) for id_deputado, sigla in siglas.items()])
+            self._conexao.commit()
+
+    def carga_concluida(self, chave: str) -> bool:
+        with self._lock:
+            return self._conexao.execute("SELECT 1 FROM carga WHERE chave = ?", (chave,)).fetchone() is not None
+
+    # Registra que a lista 'chave' está completa, desde que todos os ids dela estejam guardados em 'tabela'.
+    def registrar_carga_se_completa(self, chave: str, tabela: str, ids: Iterable) -> bool:
+        ids = set(ids)
+        with self._lock:
+            guardados = 0
+            lista = list(ids)
+            for i in range(0, len(lista), TAMANHO_CONSULTA):
+                parte = lista[i:i + TAMANHO_CONSULTA]
+                guardados += self._conexao.execute(
+                    f"SELECT COUNT(*) FROM {tabela} WHERE id_dados_abertos IN ({', '.join('?' * len(parte))})", parte).fetchone()[0]
+            if guardados < len(ids):
+                return False
+            self._conexao.execute("INSERT OR REPLACE INTO carga VALUES (?, ?)", (chave, time.time()))
+            self._conexao.commit()
+        return True
+
+    def resumo(self) -> str:
+        return (f"Dimensões compartilhadas ({self.caminho}): {self.reaproveitados} registros reaproveitados, "
+                f"{self.gravados} gravados a partir da API.")
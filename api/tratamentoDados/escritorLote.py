@@ -0,0 +1,83 @@
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel
+from .alocadorChaves import AlocadorChaves
+
+# Quantidade padrão de linhas enviadas ao banco em cada executemany
+TAMANHO_LOTE_PADRAO = int(os.getenv("ETL_TAMANHO_LOTE", "5000"))
+
+# Grava linhas (dicionários) direto na tabela de um modelo, sem passar pelo unit-of-work do ORM.
+# As linhas são acumuladas e enviadas em lotes com um único INSERT executemany, com commit por lote.
+# ao_descarregar(escritor, linhas) roda depois do INSERT e antes do commit, na mesma transação (ex: checkpoint do lote).
+# alocador: preenche o 'id' de cada linha ao ser adicionada, de forma que quem chamou já conhece a chave antes do INSERT.
+class EscritorLote:
+    def __init__(self, session: Session, modelo: type[SQLModel], progress_callback=None,
+                 tamanho_lote: int = TAMANHO_LOTE_PADRAO, commit_por_lote: bool = True, nome: Optional[str] = None,
+                 ao_descarregar: Optional[Callable[["EscritorLote", int], None]] = None, alocador: Optional[AlocadorChaves] = None):
+        self.session = session
+        self.tabela = modelo.__table__
+        self.progress_callback = progress_callback
+        self.tamanho_lote = tamanho_lote
+        self.commit_por_lote = commit_por_lote
+        self.nome = nome or self.tabela.name
+        self.ao_descarregar = ao_descarregar
+        self.alocador = alocador
+
+        self._lote: List[Dict] = []
+        self.total_gravado = 0
+        self.lotes_gravados = 0
+        self._tempo_gravando = 0.0
+        self._inicio = time.perf_counter()
+
+    def adicionar(self, linha: Dict):
+        if self.alocador is not None and linha.get("id") is None:
+            linha["id"] = self.alocador.proximo()
+        self._lote.append(linha)
+        if len(self._lote) >= self.tamanho_lote:
+            self.descarregar()
+
+    def adicionar_varios(self, linhas: Iterable[Dict]):
+        for linha in linhas:
+            self.adicionar(linha)
+
+    # Envia o lote pendente ao banco.
+    def descarregar(self):
+        if not self._lote:
+            return
+        inicio = time.perf_counter()
+        self.session.execute(insert(self.tabela), self._lote)
+        if self.ao_descarregar:
+            self.ao_descarregar(self, len(self._lote))
+        if self.commit_por_lote:
+            self.session.commit()
+        self._tempo_gravando += time.perf_counter() - inicio
+
+        self.total_gravado += len(self._lote)
+        self.lotes_gravados += 1
+        self._lote = []
+
+    @property
+    def linhas_por_segundo(self) -> float:
+        decorrido = time.perf_counter() - self._inicio
+        return self.total_gravado / decorrido if decorrido > 0 else 0.0
+
+    # Grava o que restou e informa a vazão pelo progress_callback.
+    def finalizar(self) -> int:
+        self.descarregar()
+        if self.progress_callback and self.total_gravado:
+            decorrido = time.perf_counter() - self._inicio
+            self.progress_callback('log', (
+                f"   - {self.nome}: {self.total_gravado} linhas gravadas em {self.lotes_gravados} lote(s), "
+                f"{decorrido:.2f}s ({self.linhas_por_segundo:.0f} linhas/s, {self._tempo_gravando:.2f}s no banco)."
+            ))
+        return self.total_gravado
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finalizar()
+        return False
@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Intervalo mínimo (segundos) entre dois eventos de progresso de um mesmo laço
+INTERVALO_EVENTOS = float(os.getenv("ETL_INTERVALO_EVENTOS", "0.5"))
+# Arquivo JSON-lines que recebe todas as mensagens do ETL (vazio = desligado)
+CAMINHO_LOG_EVENTOS = os.getenv("ETL_LOG_EVENTOS", "")
+
+# Mede o avanço de um laço longo (linhas lidas, respostas recebidas...) e publica pelo progress_callback,
+# no tipo de mensagem 'evento', um dicionário com etapa, contadores, taxa e tempo restante estimado.
+# avancar() é barato: só consulta o relógio e só publica quando passou `intervalo` desde o último evento,
+# então pode ser chamado a cada item sem que o laço faça I/O. concluir() publica sempre o evento final.
+class MedidorProgresso:
+    def __init__(self, progress_callback, etapa: str, descricao: str, total: Optional[int] = None,
+                 intervalo: float = INTERVALO_EVENTOS):
+        self.progress_callback = progress_callback
+        self.etapa = etapa
+        self.descricao = descricao
+        self.total = total
+        self.intervalo = intervalo
+        self.feitos = 0
+        self.contadores: Dict[str, int] = {}
+        self._inicio = time.monotonic()
+        self._ultimo_evento = self._inicio
+
+    def avancar(self, quantidade: int = 1, **contadores: int):
+        self.feitos += quantidade
+        for nome, valor in contadores.items():
+            self.contadores[nome] = self.contadores.get(nome, 0) + valor
+        agora = time.monotonic()
+        if agora - self._ultimo_evento >= self.intervalo:
+            self._ultimo_evento = agora
+            self._publicar(agora, concluido=False)
+
+    def concluir(self):
+        self._publicar(time.monotonic(), concluido=True)
+
+    def _publicar(self, agora: float, concluido: bool):
+        if not self.progress_callback:
+            return
+        decorrido = agora - self._inicio
+        por_segundo = self.feitos / decorrido if decorrido > 0 else 0.0
+        eta = None
+        if self.total is not None and por_segundo > 0 and not concluido:
+            eta = max(self.total - self.feitos, 0) / por_segundo
+        self.progress_callback('evento', {
+            "etapa": self.etapa,
+            "descricao": self.descricao,
+            "feitos": self.feitos,
+            "total": self.total,
+            "por_segundo": round(por_segundo, 1),
+            "eta_segundos": round(eta, 1) if eta is not None else None,
+            "decorrido_segundos": round(decorrido, 2),
+            "concluido": concluido,
+            **self.contadores,
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.concluir()
+        return False
+
+# Texto de uma linha para um evento (usado pelo terminal e pela interface)
+def formatar_evento(evento: Dict) -> str:
+    prefixo = f"[{evento['ano']}] " if evento.get("ano") else ""
+    feitos = f"{evento['feitos']}/{evento['total']}" if evento.get("total") is not None else f"{evento['feitos']}"
+    texto = f"{prefixo}{evento['descricao']}: {feitos} ({evento['por_segundo']:.0f}/s"
+    if evento.get("eta_segundos") is not None:
+        texto += f", faltam ~{evento['eta_segundos']:.0f}s"
+    return texto + ")"
+
+# Distribui cada mensagem do progress_callback (log, progress, evento, concorrencia...) para vários assinantes.
+# O próprio barramento é um progress_callback: basta passá-lo para run_data_processing ou run_backfill.
+# Um assinante que falha é removido, para não derrubar o ETL por causa de uma saída de log.
+class BarramentoEventos:
+    def __init__(self, *assinantes: Callable[[str, object], None]):
+        self._assinantes: List[Callable[[str, object], None]] = list(assinantes)
+        self._lock = threading.Lock()
+
+    def inscrever(self, assinante: Callable[[str, object], None]):
+        with self._lock:
+            self._assinantes.append(assinante)
+
+    def __call__(self, msg_type: str, data):
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for assinante in assinantes:
+            try:
+                assinante(msg_type, data)
+            except Exception:
+                with self._lock:
+                    if assinante in self._assinantes:
+                        self._assinantes.remove(assinante)
+
+    def fechar(self):
+        with self._lock:
+            assinantes, self._assinantes = self._assinantes, []
+        for assinante in assinantes:
+            fechar = getattr(assinante, "fechar", None)
+            if fechar:
+                fechar()
+
+# Assinante para linha de comando: logs em linhas normais e o evento mais recente numa única linha reescrita (\r)
+class RenderizadorTerminal:
+    def __init__(self, saida=None):
+        self.saida = saida or sys.stdout
+        self._linha_aberta = False
+        self._lock = threading.Lock()
+
+    def __call__(self, msg_type: str, data):
+        with self._lock:
+            if msg_type == 'evento':
+                self.saida.write("\r" + formatar_evento(data).ljust(79))
+                self._linha_aberta = not data.get("concluido")
+                if data.get("concluido"):
+                    self.saida.write("\n")
+            elif msg_type == 'log':
+                self._quebrar_linha()
+                self.saida.write(f"[LOG] {data}\n")
+            elif msg_type == 'progress':
+                self._quebrar_linha()
+                self.saida.write(f"[PROGRESS] {data}%\n")
+            elif msg_type == 'concorrencia':
+                self._quebrar_linha()
+                self.saida.write(f"[CONCORRENCIA] {data['etapa']}: limite {data['limite']} (min {data['limite_minimo']}, max {data['limite_maximo']})\n")
+            self.saida.flush()
+
+    def _quebrar_linha(self):
+        if self._linha_aberta:
+            self.saida.write("\n")
+            self._linha_aberta = False
+
+# Assinante que grava cada mensagem como uma linha JSON ({"ts", "tipo", "dados"}), para análise posterior
+class GravadorJsonl:
+    def __init__(self, caminho: str):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.caminho = caminho
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __call__(self, msg_type: str, data):
+        linha = json.dumps({"ts": datetime.now().isoformat(timespec="milliseconds"), "tipo": msg_type, "dados": data},
+                           ensure_ascii=False, default=str)
+        with self._lock:
+            self._arquivo.write(linha + "\n")
+            self._arquivo.flush()
+
+    def fechar(self):
+        with self._lock:
+            self._arquivo.close()
+
+# Barramento com os assinantes dados e, se configurado (ETL_LOG_EVENTOS ou caminho_jsonl), o arquivo JSON-lines
+def criar_barramento(*assinantes: Callable[[str, object], None], caminho_jsonl: str = CAMINHO_LOG_EVENTOS) -> BarramentoEventos:
+    barramento = BarramentoEventos(*assinantes)
+    if caminho_jsonl:
+        barramento.inscrever(GravadorJsonl(caminho_jsonl))
+    return barramento
@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .database import assinatura_banco, get_db_filepath, registro_engines
+
+# Código gravado na matriz quando o deputado não tem voto registrado na sessão (os tipos começam em 1)
+SEM_VOTO = 0
+# Código das sessões com 'aprovacao' diferente de '1'/'0' e dos votos sem ano/partido/UF nos vetores
+INDEFINIDO = -1
+
+# Arquivos .npy da matriz, abertos com mmap pela API. Ficam numa pasta ao lado do banco, ex: dbs/camara_2024_matriz/
+ARQUIVOS_MATRIZ = ["votos", "partido", "uf", "aprovacao", "ano", "ids_deputado", "ids_sessao"]
+
+def get_matriz_dirpath(year: int) -> str:
+    return os.path.splitext(get_db_filepath(year))[0] + "_matriz"
+
+# Representação compilada dos votos de um banco anual:
+#   votos[d, s]   -> tipo_voto do deputado d na sessão s, codificado em int8 (tipos[codigo - 1]; 0 = sem voto)
+#   partido[d]    -> posição em 'partidos' (ids de Deputado.id_partido), uf[d] -> posição em 'ufs'
+#   aprovacao[s]  -> 1/0 para SessaoVotacao.aprovacao '1'/'0', ano[s] -> ano dos votos da sessão
+# Deputados e sessões seguem a ordem dos ids, guardados em ids_deputado/ids_sessao.
+@dataclass
+class MatrizVotos:
+    votos: "np.ndarray"
+    partido: "np.ndarray"
+    uf: "np.ndarray"
+    aprovacao: "np.ndarray"
+    ano: "np.ndarray"
+    ids_deputado: "np.ndarray"
+    ids_sessao: "np.ndarray"
+    tipos: List[Optional[str]]
+    partidos: List[int]
+    ufs: List[str]
+    assinatura: Tuple[int, int, int]
+
+    def codigo_tipo(self, tipo_voto: Optional[str]) -> Optional[int]:
+        return self.tipos.index(tipo_voto) + 1 if tipo_voto in self.tipos else None
+
+    def coluna_sessao(self, id_votacao: int) -> Optional[int]:
+        posicao = int(np.searchsorted(self.ids_sessao, id_votacao))
+        if posicao < len(self.ids_sessao) and self.ids_sessao[posicao] == id_votacao:
+            return posicao
+        return None
+
+    def posicao_partido(self, id_partido: int) -> Optional[int]:
+        return self.partidos.index(id_partido) if id_partido in self.partidos else None
+
+def _posicoes(valores: List, vocabulario: List) -> List[int]:
+    indice = {valor: posicao for posicao, valor in enumerate(vocabulario)}
+    return [indice.get(valor, INDEFINIDO) for valor in valores]
+
+# Lê o banco (somente leitura) e monta os arrays. Retorna None, com o motivo, quando a matriz não representaria
+# os votos exatamente como o SQL: o mesmo deputado com dois votos numa sessão, ou votos de uma sessão em anos diferentes.
+def _ler_arrays(caminho: str):
+    conexao = sqlite3.connect(f"file:{os.path.abspath(caminho)}?mode=ro", uri=True)
+    try:
+        deputados = conexao.execute("SELECT id, id_partido, sigla_uf FROM deputado ORDER BY id").fetchall()
+        sessoes = conexao.execute("SELECT id, aprovacao FROM sessaovotacao ORDER BY id").fetchall()
+        tipos = [tipo for (tipo,) in conexao.execute("SELECT DISTINCT tipo_voto FROM votoindividual ORDER BY tipo_voto")]
+        anos_misturados = conexao.execute(
+            "SELECT COUNT(*) FROM (SELECT id_votacao FROM votoindividual GROUP BY id_votacao "
+            "HAVING COUNT(DISTINCT COALESCE(ano, -1)) > 1)").fetchone()[0]
+        anos_sessao = dict(conexao.execute("SELECT id_votacao, MAX(ano) FROM votoindividual GROUP BY id_votacao"))
+        votos = conexao.execute("SELECT id_deputado, id_votacao, tipo_voto FROM votoindividual").fetchall()
+    finally:
+        conexao.close()
+
+    if anos_misturados:
+        return None, f"{anos_misturados} sessão(ões) com votos em anos diferentes"
+    if len(tipos) > np.iinfo(np.int8).max:
+        return None, f"{len(tipos)} tipos de voto distintos (o limite do int8 é {np.iinfo(np.int8).max})"
+
+    ids_deputado = np.array([d[0] for d in deputados], dtype=np.int64)
+    ids_sessao = np.array([s[0] for s in sessoes], dtype=np.int64)
+    partidos = sorted({d[1] for d in deputados if d[1] is not None})
+    ufs = sorted({d[2] for d in deputados if d[2] is not None})
+    arrays = {
+        "partido": np.array(_posicoes([d[1] for d in deputados], partidos), dtype=np.int16),
+        "uf": np.array(_posicoes([d[2] for d in deputados], ufs), dtype=np.int16),
+        "aprovacao": np.array([1 if s[1] == "1" else 0 if s[1] == "0" else INDEFINIDO for s in sessoes], dtype=np.int8),
+        "ano": np.array([anos_sessao.get(s[0]) or INDEFINIDO for s in sessoes], dtype=np.int16),
+        "ids_deputado": ids_deputado,
+        "ids_sessao": ids_sessao,
+    }
+
+    matriz = np.zeros((len(deputados), len(sessoes)), dtype=np.int8)
+    if votos and len(deputados) and len(sessoes):
+        codigos = {tipo: codigo for codigo, tipo in enumerate(tipos, start=1)}
+        id_dep = np.array([v[0] for v in votos], dtype=np.int64)
+        id_ses = np.array([v[1] for v in votos], dtype=np.int64)
+        codigo = np.array([codigos[v[2]] for v in votos], dtype=np.int8)
+        # Votos de deputados ou sessões ausentes das tabelas ficam de fora, como nos joins das rotas
+        linha = np.clip(np.searchsorted(ids_deputado, id_dep), 0, len(ids_deputado) - 1)
+        coluna = np.clip(np.searchsorted(ids_sessao, id_ses), 0, len(ids_sessao) - 1)
+        validos = (ids_deputado[linha] == id_dep) & (ids_sessao[coluna] == id_ses)
+        linha, coluna, codigo = linha[validos], coluna[validos], codigo[validos]
+        celulas = linha * len(sessoes) + coluna
+        if len(np.unique(celulas)) != len(celulas):
+            return None, f"{len(celulas) - len(np.unique(celulas))} voto(s) repetido(s) do mesmo deputado na mesma sessão"
+        matriz[linha, coluna] = codigo
+    arrays["votos"] = matriz
+    return (arrays, {"tipos": tipos, "partidos": partidos, "ufs": ufs}), None
+
+# Gera a matriz do ano a partir do banco já finalizado e grava os .npy numa pasta temporária, trocada pela
+# definitiva no final (a API nunca vê uma matriz pela metade). O meta.json guarda a assinatura do banco:
+# se o arquivo do banco mudar depois, a matriz deixa de ser usada até ser gerada de novo.
+def construir_matriz_votos(year: int, progress_callback) -> bool:
+    inicio = time.perf_counter()
+    try:
+        resultado, motivo = _ler_arrays(get_db_filepath(year))
+        if resultado is None:
+            progress_callback('log', f"   - Aviso: matriz de votos não gerada ({motivo}); as rotas usam o SQL.")
+            return False
+        arrays, meta = resultado
+
+        destino = get_matriz_dirpath(year)
+        temporaria, antiga = destino + ".tmp", destino + ".old"
+        shutil.rmtree(temporaria, ignore_errors=True)
+        os.makedirs(temporaria)
+        for nome in ARQUIVOS_MATRIZ:
+            np.save(os.path.join(temporaria, f"{nome}.npy"), arrays[nome])
+        with open(os.path.join(temporaria, "meta.json"), "w", encoding="utf-8") as arquivo:
+            json.dump({**meta, "assinatura": list(assinatura_banco(year))}, arquivo, ensure_ascii=False)
+
+        shutil.rmtree(antiga, ignore_errors=True)
+        if os.path.exists(destino):
+            os.rename(destino, antiga)
+        os.rename(temporaria, destino)
+        shutil.rmtree(antiga, ignore_errors=True)
+    except (OSError, sqlite3.Error) as e:
+        progress_callback('log', f"   - Aviso: matriz de votos não gerada ({e}); as rotas usam o SQL.")
+        return False
+
+    forma = arrays["votos"].shape
+    progress_callback('log', f"   - Matriz de votos: {forma[0]} deputados x {forma[1]} sessões em {time.perf_counter() - inicio:.2f}s.")
+    return True
+
+# Abre os .npy do ano com mmap (as páginas são compartilhadas entre os workers pelo cache do sistema).
+# Retorna None se a matriz não existe ou foi gerada a partir de outra versão do banco.
+def carregar_matriz_votos(year: int, assinatura) -> Optional[MatrizVotos]:
+    if assinatura is None:
+        return None
+    pasta = get_matriz_dirpath(year)
+    try:
+        with open(os.path.join(pasta, "meta.json"), encoding="utf-8") as arquivo:
+            meta = json.load(arquivo)
+        if tuple(meta["assinatura"]) != tuple(assinatura):
+            return None
+        arrays = {nome: np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode="r") for nome in ARQUIVOS_MATRIZ}
+    except (OSError, ValueError, KeyError):
+        return None
+    return MatrizVotos(**arrays, tipos=meta["tipos"], partidos=meta["partidos"], ufs=meta["ufs"], assinatura=tuple(assinatura))
+
+_matrizes: Dict[int, Optional[MatrizVotos]] = {}
+_assinaturas: Dict[int, Tuple[int, int, int]] = {}
+_lock_matrizes = threading.Lock()
+
+# Matriz do banco que a API está servindo para o ano, ou None (as rotas então consultam o SQL).
+# Fica em cache por ano, junto com a assinatura do banco; a recarga da engine (banco refeito) limpa o cache.
+def matriz_do_ano(year: int) -> Optional[MatrizVotos]:
+    assinatura = registro_engines.assinatura(year)
+    with _lock_matrizes:
+        if year in _matrizes and _assinaturas.get(year) == assinatura:
+            return _matrizes[year]
+    matriz = carregar_matriz_votos(year, assinatura)
+    with _lock_matrizes:
+        _matrizes[year], _assinaturas[year] = matriz, assinatura
+    return matriz
+
+def _descartar_matriz(year: int):
+    with _lock_matrizes:
+        _matrizes.pop(year, None)
+        _assinaturas.pop(year, None)
+
+registro_engines.ao_recarregar(_descartar_matriz)
+
+# Contagem de votos por tipo (tipo_voto -> total) dos deputados de um partido numa sessão
+def distribuicao_partido_sessao(matriz: MatrizVotos, id_partido: int, id_votacao: int) -> Dict[Optional[str], int]:
+    coluna, partido = matriz.coluna_sessao(id_votacao), matriz.posicao_partido(id_partido)
+    if coluna is None or partido is None:
+        return {}
+    contagem = np.bincount(matriz.votos[matriz.partido == partido, coluna], minlength=len(matriz.tipos) + 1)
+    return {matriz.tipos[codigo - 1]: int(total) for codigo, total in enumerate(contagem) if codigo != SEM_VOTO and total}
+
+# Votos 'Sim'/'Não' de cada partido nas sessões do ano com resultado ('1'/'0') e quantos seguiram o resultado:
+# id_partido -> (votos_alinhados, votos_totais_decisivos), só para partidos com algum voto decisivo
+def alinhamento_por_partido(matriz: MatrizVotos, ano: int) -> Dict[int, Tuple[int, int]]:
+    sim, nao = matriz.codigo_tipo("Sim"), matriz.codigo_tipo("Não")
+    colunas = (matriz.aprovacao != INDEFINIDO) & (matriz.ano == ano)
+    com_partido = matriz.partido != INDEFINIDO
+    votos = matriz.votos[np.ix_(com_partido, colunas)]
+    aprovada = matriz.aprovacao[colunas] == 1
+    votou_sim, votou_nao = votos == (sim or -1), votos == (nao or -1)
+    decisivos = (votou_sim | votou_nao).sum(axis=1)
+    alinhados = ((votou_sim & aprovada) | (votou_nao & ~aprovada)).sum(axis=1)
+
+    partido = matriz.partido[com_partido]
+    total_por_partido = np.bincount(partido, weights=decisivos, minlength=len(matriz.partidos))
+    alinhados_por_partido = np.bincount(partido, weights=alinhados, minlength=len(matriz.partidos))
+    return {matriz.partidos[p]: (int(alinhados_por_partido[p]), int(total_por_partido[p]))
+            for p in range(len(matriz.partidos)) if total_por_partido[p] > 0}
@@ -0,0 +1,158 @@
+import argparse
+from typing import Dict, List
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+from ..models.sessao_votacao import SessaoVotacao
+from ..models.voto_individual import VotoIndividual
+from .datasRegistro import campos_data
+
+# Linhas lidas e convertidas por lote ao preencher as colunas de data de um banco antigo. Os lotes só limitam a
+# memória: rodam todos na transação única de migrar_banco, que assim é aplicada por inteiro ou não é aplicada.
+TAMANHO_LOTE_MIGRACAO = 50000
+
+# Tabelas cujas colunas data_hora/ano/mes são derivadas de data_hora_registro
+MODELOS_COM_DATA = [SessaoVotacao, VotoIndividual]
+
+def _colunas_existentes(conexao: Connection, tabela: str) -> set:
+    return {linha[1] for linha in conexao.exec_driver_sql(f'PRAGMA table_info("{tabela}")')}
+
+# O create_all só cria tabelas novas: colunas acrescentadas depois aos modelos entram por ALTER TABLE (ficam NULL)
+def _adicionar_colunas_faltantes(conexao: Connection) -> List[str]:
+    tabelas_no_banco = set(conexao.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    adicionadas = []
+    for tabela in SQLModel.metadata.sorted_tables:
+        if tabela.name not in tabelas_no_banco:
+            continue
+        existentes = _colunas_existentes(conexao, tabela.name)
+        for coluna in tabela.columns:
+            if coluna.name not in existentes:
+                tipo = coluna.type.compile(dialect=conexao.dialect)
+                conexao.exec_driver_sql(f'ALTER TABLE "{tabela.name}" ADD COLUMN "{coluna.name}" {tipo}')
+                adicionadas.append(f"{tabela.name}.{coluna.name}")
+    return adicionadas
+
+# Há linha gravada antes das colunas de data com uma data que _preencher_datas consegue converter?
+def _datas_a_preencher(conexao: Connection, modelo) -> bool:
+    tabela = modelo.__table__
+    linhas = conexao.execute(select(tabela.c.data_hora_registro)
+                             .where(tabela.c.ano.is_(None), tabela.c.data_hora_registro.is_not(None)))
+    return any(campos_data(texto)["ano"] is not None for (texto,) in linhas)
+
+# Preenche data_hora/ano/mes das linhas gravadas antes dessas colunas existirem, em lotes por id.
+# Linhas cuja data não é reconhecida continuam com ano NULL (e não voltam a ser lidas nesta chamada).
+def _preencher_datas(conexao: Connection, modelo) -> int:
+    tabela = modelo.__table__
+    atualizar = (update(tabela).where(tabela.c.id == bindparam("b_id"))
+                 .values(data_hora=bindparam("b_data_hora"), ano=bindparam("b_ano"), mes=bindparam("b_mes")))
+    preenchidas, ultimo_id = 0, 0
+    while True:
+        linhas = conexao.execute(
+            select(tabela.c.id, tabela.c.data_hora_registro)
+            .where(tabela.c.id > ultimo_id, tabela.c.ano.is_(None), tabela.c.data_hora_registro.is_not(None))
+            .order_by(tabela.c.id).limit(TAMANHO_LOTE_MIGRACAO)
+        ).all()
+        if not linhas:
+            return preenchidas
+        ultimo_id = linhas[-1].id
+        valores = []
+        for id_linha, texto in linhas:
+            campos = campos_data(texto)
+            if campos["ano"] is not None:
+                valores.append({"b_id": id_linha, "b_data_hora": campos["data_hora"], "b_ano": campos["ano"], "b_mes": campos["mes"]})
+        if valores:
+            conexao.execute(atualizar, valores)
+            preenchidas += len(valores)
+
+# Leva um banco anual (de qualquer versão anterior) ao esquema atual dos modelos: acrescenta as colunas novas,
+# preenche as colunas de data e cria as tabelas e os índices que faltam. Pode ser chamada em todo banco, toda vez:
+# num banco já migrado ela não altera nada.
+# adiar_indices: o banco ainda está em carga; os índices adiados (cicloBuild.indices_adiados) ficam para finalizar_build
+def migrar_banco(engine: Engine, progress_callback=None, adiar_indices: bool = False) -> Dict:
+    from .cicloBuild import indices_adiados
+
+    ignorados = {indice.name for indice in indices_adiados()} if adiar_indices else set()
+    with engine.begin() as conexao:
+        SQLModel.metadata.create_all(conexao)
+        adicionadas = _adicionar_colunas_faltantes(conexao)
+        preenchidas = {modelo.__tablename__: _preencher_datas(conexao, modelo) for modelo in MODELOS_COM_DATA}
+        for tabela in SQLModel.metadata.sorted_tables:
+            for indice in tabela.indexes:
+                if indice.name not in ignorados:
+                    indice.create(conexao, checkfirst=True)
+
+    if progress_callback and (adicionadas or any(preenchidas.values())):
+        progress_callback('log', f"-> Banco migrado: {len(adicionadas)} coluna(s) nova(s), "
+                                 + ", ".join(f"{quantidade} linha(s) de {tabela}" for tabela, quantidade in preenchidas.items())
+                                 + " com data preenchida.")
+    return {"colunas_adicionadas": adicionadas, "linhas_preenchidas": preenchidas}
+
+# Diz, só lendo o banco, se migrar_banco mudaria alguma coisa nele: tabela, coluna ou índice faltando,
+# ou datas ainda por preencher. Serve para não reabrir para escrita um banco finalizado que já está em dia.
+def migracao_pendente(engine: Engine) -> bool:
+    with engine.connect() as conexao:
+        tabelas_no_banco = set(conexao.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+        indices_no_banco = set(conexao.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+        for tabela in SQLModel.metadata.sorted_tables:
+            if tabela.name not in tabelas_no_banco:
+                return True
+            if {coluna.name for coluna in tabela.columns} - _colunas_existentes(conexao, tabela.name):
+                return True
+            if any(indice.name not in indices_no_banco for indice in tabela.indexes):
+                return True
+        return any(_datas_a_preencher(conexao, modelo) for modelo in MODELOS_COM_DATA)
+
+# Migra os bancos já existentes em 'dbs' (todos ou os anos dados), sem criar bancos novos:
+#   python -m api.tratamentoDados.migracoes [ano ...]
+# Um banco finalizado (somente leitura) que já está no esquema atual não é tocado; se falta algo, ele é reaberto
+# para escrita e finalizado de novo depois da migração, o que também refaz as tabelas agregadas e a matriz de
+# votos. Num banco não finalizado (de versões anteriores) elas são montadas aqui.
+def migrar_bancos(anos: List[int], progress_callback) -> Dict[int, Dict]:
+    from .agregados import construir_agregados
+    from .cicloBuild import banco_finalizado, finalizar_build, liberar_escrita
+    from .database import PRAGMAS_LEITURA, get_engine_for_year
+    from .matrizVotos import construir_matriz_votos
+    from .statusBancos import anos_com_banco
+
+    resultados = {}
+    for ano in anos or anos_com_banco():
+        if ano not in anos_com_banco():
+            progress_callback('log', f"[{ano}] Banco não encontrado, nada a migrar.")
+            continue
+        finalizado = banco_finalizado(ano)
+        if finalizado:
+            engine_leitura = get_engine_for_year(ano, PRAGMAS_LEITURA)
+            try:
+                pendente = migracao_pendente(engine_leitura)
+            finally:
+                engine_leitura.dispose()
+            if not pendente:
+                progress_callback('log', f"[{ano}] Banco já está no esquema atual, nada a migrar.")
+                resultados[ano] = {"colunas_adicionadas": [],
+                                  "linhas_preenchidas": {modelo.__tablename__: 0 for modelo in MODELOS_COM_DATA}}
+                continue
+        liberar_escrita(ano)
+        engine = get_engine_for_year(ano)
+        callback_do_ano = lambda msg_type, data: progress_callback(msg_type, f"[{ano}] {data}")
+        try:
+            progress_callback('log', f"[{ano}] Migrando...")
+            resultados[ano] = migrar_banco(engine, callback_do_ano)
+            if finalizado:
+                finalizar_build(engine, ano, callback_do_ano)
+            else:
+                with engine.begin() as conexao:
+                    construir_agregados(conexao, callback_do_ano)
+        finally:
+            engine.dispose()
+        # Depois do dispose: a matriz guarda a assinatura do arquivo, que muda quando o WAL volta para o banco
+        if not finalizado:
+            construir_matriz_votos(ano, callback_do_ano)
+    return resultados
+
+if __name__ == "__main__":
+    from .processador import mock_progress_callback
+
+    parser = argparse.ArgumentParser(description="Atualiza o esquema dos bancos anuais já existentes em 'dbs'.")
+    parser.add_argument("anos", type=int, nargs="*", help="anos a migrar (padrão: todos)")
+    args = parser.parse_args()
+    migrar_bancos(args.anos, mock_progress_callback)
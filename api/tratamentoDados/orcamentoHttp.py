@@ -0,0 +1,69 @@
+import asyncio
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+# Intervalo máximo entre tentativas de pegar uma vaga no modo assíncrono
+ESPERA_MAXIMA_ASYNC = 0.05
+
+# Limite global de requisições HTTP simultâneas, compartilhado entre processos.
+# Envolve um semáforo de multiprocessing.Manager (ou qualquer objeto com acquire/release),
+# de forma que vários workers do backfill somados não passem do mesmo teto.
+class OrcamentoHttp:
+    def __init__(self, semaforo):
+        self.semaforo = semaforo
+
+    def __enter__(self):
+        self.semaforo.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.semaforo.release()
+        return False
+
+    # O acquire do Manager é bloqueante (uma chamada entre processos); no event loop
+    # tenta sem bloquear e espera um pouco entre as tentativas, para não travar as outras corrotinas.
+    async def __aenter__(self):
+        espera = 0.001
+        while not self.semaforo.acquire(False):
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, ESPERA_MAXIMA_ASYNC)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaforo.release()
+        return False
+
+# Retry do urllib3 que devolve a vaga do orçamento durante a espera entre tentativas: as novas tentativas
+# acontecem dentro do send do adaptador (que segura a vaga), e sem isso uma thread em backoff ocuparia
+# a vaga sem fazer requisição nenhuma. Cada tentativa volta a disputar a vaga com as outras threads.
+class RetryComOrcamento(Retry):
+    def __init__(self, *args, orcamento: OrcamentoHttp = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.orcamento = orcamento
+
+    # O urllib3 cria um Retry novo a cada tentativa; o orçamento vai junto
+    def new(self, **kw):
+        kw.setdefault('orcamento', self.orcamento)
+        return super().new(**kw)
+
+    def sleep(self, response=None):
+        if self.orcamento is None:
+            return super().sleep(response)
+        self.orcamento.semaforo.release()
+        try:
+            super().sleep(response)
+        finally:
+            self.orcamento.semaforo.acquire()
+
+# Adaptador do requests que só envia a requisição depois de conseguir uma vaga no OrcamentoHttp.
+# Com um RetryComOrcamento em max_retries, a vaga fica livre durante o backoff das novas tentativas.
+class AdaptadorComOrcamento(HTTPAdapter):
+    def __init__(self, *args, orcamento: OrcamentoHttp = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.orcamento = orcamento
+
+    def send(self, request, **kwargs):
+        if self.orcamento is None:
+            return super().send(request, **kwargs)
+        with self.orcamento:
+            return super().send(request, **kwargs)
@@ -1,13 +1,17 @@
 from collections import defaultdict
 from functools import partial
 import requests
-import xml.etree.ElementTree as ET
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from sqlalchemy import select
 from sqlmodel import Session
 from ..models.partido import Partido
 from collections import defaultdict 
 from concurrent.futures import ThreadPoolExecutor
+from .escritorLote import EscritorLote
+from .buscadorAsync import BuscadorAsync
+from .dimensoes import RepositorioDimensoes
+from .analiseXml import ERROS_XML, analisar_xml, xml_fromstring
+from .registroFalhas import RegistroFalhas
 
 #Converte para inteiro
 def to_int(value: Optional[str]) -> Optional[int]:
@@ -15,50 +19,74 @@ def to_int(value: Optional[str]) -> Optional[int]:
         return None
     return int(value)
 
+#Extrai os detalhes de um partido do XML da API
+def extrair_detalhes_partido_xml(conteudo: bytes) -> Optional[Dict]:
+    root = xml_fromstring(conteudo)
+    dados = root.find('.//dados')
+    
+    if dados is None:
+        return None
+
+    return {
+        "uri_logo": dados.findtext('urlLogo'),
+        "id_legislativo": to_int(dados.findtext('status/idLegislatura')),
+        "situacao": dados.findtext('status/situacao'),
+        "total_membros": to_int(dados.findtext('status/totalMembros')),
+        "total_posse_legislatura": to_int(dados.findtext('status/totalPosse')),
+    }
+
 #Dado uma uri busca os detalhes de um partido em xml
-def buscar_detalhes_partido_xml(uri: str, http_session: requests.Session) -> Optional[Dict]:
+def buscar_detalhes_partido_xml(uri: str, http_session: requests.Session, falhas: Optional[RegistroFalhas] = None) -> Optional[Dict]:
     try:
         headers = {'accept': 'application/xml'}
         response = http_session.get(uri, headers=headers, timeout=(5, 30))
         response.raise_for_status() 
-
-        root = ET.fromstring(response.content)
-        dados = root.find('.//dados')
-        
-        if dados is None:
-            return None
-
-        detalhes = {
-            "uri_logo": dados.findtext('urlLogo'),
-            "id_legislativo": to_int(dados.findtext('status/idLegislatura')),
-            "situacao": dados.findtext('status/situacao'),
-            "total_membros": to_int(dados.findtext('status/totalMembros')),
-            "total_posse_legislatura": to_int(dados.findtext('status/totalPosse')),
-        }
-        return detalhes
+        return analisar_xml(extrair_detalhes_partido_xml, response.content)
             
-    except requests.exceptions.RequestException as e:
-        print(f"  - Erro de conexão ao acessar {uri}: {e}")
-        return None
-    except ET.ParseError:
-        print(f"  - Falha ao analisar o XML da URI {uri}.")
+    except (requests.exceptions.RequestException, *ERROS_XML) as e:
+        if falhas:
+            falhas.registrar('partidos', uri, e)
         return None
 
+# Uma lista de legislatura que falhou deixa a etapa incompleta: os partidos obtidos já foram gravados,
+# mas a etapa termina como falha para ser refeita (a retomada busca só os que faltaram)
+def verificar_listas_partidos(legislaturas_com_falha: List[int]):
+    if legislaturas_com_falha:
+        raise Exception(f"Falha ao buscar a lista de partidos das legislaturas {legislaturas_com_falha}.")
+
 # Realiza as requisicoes de todos os partidos (2011-2027) e salva os dados
-def fetch_and_save_partidos(session: Session, http_session: requests.Session, progress_callback):
+# incremental: não pula a etapa quando já há partidos; consulta as listas e grava só os partidos novos
+# retomar: a etapa foi interrompida numa execução anterior; grava apenas os partidos que faltaram
+# dimensoes: banco compartilhado entre os anos; partidos já guardados lá são copiados sem novas requisições
+# falhas: partidos cujos detalhes não puderam ser buscados vão para o livro de falhas do banco
+def fetch_and_save_partidos(session: Session, http_session: requests.Session, progress_callback, buscador: Optional[BuscadorAsync] = None,
+                            incremental: bool = False, retomar: bool = False, dimensoes: Optional[RepositorioDimensoes] = None,
+                            falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
     progress_callback('log', "-> Iniciando busca de partidos para as legislaturas de 2011 em diante...")
 
     stmt_verificacao = select(Partido)
     partidos_existente = session.exec(stmt_verificacao).first()
 
-    if partidos_existente:
+    if partidos_existente and not (incremental or retomar):
         progress_callback('log', f"-> Partidos já constam no banco. Etapa concluída.")
         return 
 
-    
+    stmt_existentes = select(Partido.id_dados_abertos)
+    ids_partidos_existentes = {id_tuple[0] for id_tuple in session.exec(stmt_existentes).all()}
+
+    # --- Outro ano já carregou a lista completa: copia do banco de dimensões, sem requisições ---
+    if dimensoes and not incremental and dimensoes.carga_concluida('partidos'):
+        partidos_copiados = [p for p in dimensoes.todos('partido') if p['id_dados_abertos'] not in ids_partidos_existentes]
+        with EscritorLote(session, Partido, progress_callback, nome="Partidos") as escritor:
+            escritor.adicionar_varios(partidos_copiados)
+        progress_callback('log', f"-> {len(partidos_copiados)} partidos copiados do banco de dimensões compartilhado.")
+        return
+
     # --- 1. legislaturas de interesse
     legislaturas_alvo = [54, 55, 56, 57]
     partidos_brutos_agregados = []
+    legislaturas_com_falha = []
     
     for leg in legislaturas_alvo:
         progress_callback('log', f"   - Buscando partidos da {leg}ª Legislatura...")
@@ -70,7 +98,7 @@ def fetch_and_save_partidos(session: Session, http_session: requests.Session, pr
             partidos_brutos_agregados.extend(partidos_da_legislatura)
         except requests.exceptions.RequestException as e:
             progress_callback('log', f"   - AVISO: Falha ao buscar partidos da legislatura {leg}. Continuando... Erro: {e}")
-            continue
+            legislaturas_com_falha.append(leg)
 
     progress_callback('log', f"   - Coleta inicial concluída. Total de {len(partidos_brutos_agregados)} registros de partidos encontrados.")
 
@@ -80,37 +108,59 @@ def fetch_and_save_partidos(session: Session, http_session: requests.Session, pr
     progress_callback('log', f"   - {len(partidos_base)} partidos únicos identificados no período.")
 
     # --- Verifica quais partidos únicos já existem no banco
-    stmt_existentes = select(Partido.id_dados_abertos)
-    ids_partidos_existentes = {id_tuple[0] for id_tuple in session.exec(stmt_existentes).all()}
     partidos_novos = [p for p in partidos_base if p.get('id') not in ids_partidos_existentes]
     
     if not partidos_novos:
+        if dimensoes and not legislaturas_com_falha:
+            dimensoes.registrar_carga_se_completa('partidos', 'partido', partidos_unicos_dict)
+        verificar_listas_partidos(legislaturas_com_falha)
         progress_callback('log', "-> Nenhum partido novo para adicionar. Tabela já está atualizada.")
         progress_callback('log', "-> Processamento de partidos concluído.")
         return
 
+    # --- Partidos já guardados no banco de dimensões não precisam de novas requisições ---
+    partidos_guardados = dimensoes.obter('partido', [p.get('id') for p in partidos_novos]) if dimensoes else {}
+    if partidos_guardados:
+        progress_callback('log', f"   - {len(partidos_guardados)} partidos reaproveitados do banco de dimensões.")
+    partidos_a_buscar = [p for p in partidos_novos if p.get('id') not in partidos_guardados and p.get('uri')]
+
     # --- Busca detalhes de forma concorrente apenas para os novos ---
-    uris_para_buscar = [p.get('uri') for p in partidos_novos if p.get('uri')]
+    uris_para_buscar = [p.get('uri') for p in partidos_a_buscar]
     progress_callback('log', f"   - Buscando detalhes para {len(uris_para_buscar)} novos partidos simultaneamente...")
 
-    # --- Utiliza ate 25 treads para fazer as requisições de detalhes ---
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        buscar_com_sessao = partial(buscar_detalhes_partido_xml, http_session=http_session)
-        detalhes_dos_partidos = list(executor.map(buscar_com_sessao, uris_para_buscar))
+    # --- Utiliza ate 10 threads (ou o BuscadorAsync) para fazer as requisições de detalhes ---
+    if buscador:
+        detalhes_dos_partidos = buscador.buscar_todos(uris_para_buscar, extrair_detalhes_partido_xml, headers={'accept': 'application/xml'}, em_erro=falhas.em_erro('partidos'), etapa='partidos', parse_xml=True)
+    else:
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            buscar_com_sessao = partial(buscar_detalhes_partido_xml, http_session=http_session, falhas=falhas)
+            detalhes_dos_partidos = list(executor.map(buscar_com_sessao, uris_para_buscar))
 
-    # --- Itera e cria os objetos do modelo para os novos partidos ---
-    for partido_info, detalhes_partido in zip(partidos_novos, detalhes_dos_partidos):
+    # --- Monta as linhas dos partidos buscados e guarda no banco de dimensões ---
+    linhas_buscadas = []
+    for partido_info, detalhes_partido in zip(partidos_a_buscar, detalhes_dos_partidos):
         if detalhes_partido:
-            partido_obj = Partido(
-                id_dados_abertos=partido_info.get('id'),
-                sigla=partido_info.get("sigla"),
-                nome_completo=partido_info.get("nome"),
-                uri_logo=detalhes_partido.get('uri_logo'),
-                id_legislativo=detalhes_partido.get('id_legislativo'),
-                situacao=detalhes_partido.get('situacao'),
-                total_membros=detalhes_partido.get('total_membros'),
-                total_posse_legislatura=detalhes_partido.get('total_posse_legislatura'),
-            )
-            session.add(partido_obj)
+            linhas_buscadas.append({
+                "id_dados_abertos": partido_info.get('id'),
+                "sigla": partido_info.get("sigla"),
+                "nome_completo": partido_info.get("nome"),
+                "uri_logo": detalhes_partido.get('uri_logo'),
+                "id_legislativo": detalhes_partido.get('id_legislativo'),
+                "situacao": detalhes_partido.get('situacao'),
+                "total_membros": detalhes_partido.get('total_membros'),
+                "total_posse_legislatura": detalhes_partido.get('total_posse_legislatura'),
+            })
+    if dimensoes:
+        dimensoes.gravar('partido', linhas_buscadas)
+        # Com uma lista de legislatura faltando, a lista de partidos está incompleta e não pode ser copiada por outros anos
+        if not legislaturas_com_falha:
+            dimensoes.registrar_carga_se_completa('partidos', 'partido', partidos_unicos_dict)
+
+    # --- Grava em lote as linhas dos novos partidos (as falhas entram no mesmo commit) ---
+    falhas.gravar(session, 'partidos', uris_para_buscar)
+    with EscritorLote(session, Partido, progress_callback, nome="Partidos") as escritor:
+        escritor.adicionar_varios(partidos_guardados.values())
+        escritor.adicionar_varios(linhas_buscadas)
 
+    verificar_listas_partidos(legislaturas_com_falha)
     progress_callback('log', "-> Processamento de partidos concluído.")
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel
+from .alocadorChaves import AlocadorChaves
+from .escritorLote import EscritorLote, TAMANHO_LOTE_PADRAO
+
+# Quantidade de itens (grupos de linhas ou respostas) que podem esperar em cada fila do pipeline.
+# É o que limita a memória: quem produz mais rápido do que o próximo estágio consome fica bloqueado.
+TAMANHO_FILA_PIPELINE = int(os.getenv("ETL_TAMANHO_FILA", "16"))
+# Linhas soltas (GravadorEmThread.adicionar) são enviadas ao gravador em grupos desse tamanho
+TAMANHO_GRUPO_PIPELINE = 1000
+
+FIM_PIPELINE = object()
+
+# Estágio final do pipeline: grava, numa thread dedicada e com a sua própria Session, os grupos de linhas
+# que chegam por uma fila limitada, enquanto a thread da etapa continua buscando e montando as próximas.
+# Cada grupo enviado com enviar() é atômico: os commits só acontecem entre grupos (depois de pelo menos
+# `tamanho_lote` linhas) e ao_confirmar(sessao_escrita, linhas, marcador) roda antes de cada commit,
+# na mesma transação (ex: checkpoint com o marcador do último grupo gravado).
+class GravadorEmThread:
+    def __init__(self, engine: Engine, modelo: type[SQLModel], progress_callback=None, nome: Optional[str] = None,
+                 tamanho_lote: int = TAMANHO_LOTE_PADRAO, tamanho_fila: int = TAMANHO_FILA_PIPELINE,
+                 tamanho_grupo: int = TAMANHO_GRUPO_PIPELINE, alocador: Optional[AlocadorChaves] = None,
+                 ao_confirmar: Optional[Callable[[Session, int, Any], None]] = None):
+        self.engine = engine
+        self.modelo = modelo
+        self.progress_callback = progress_callback
+        self.nome = nome or modelo.__table__.name
+        self.tamanho_lote = tamanho_lote
+        self.tamanho_grupo = tamanho_grupo
+        self.alocador = alocador
+        self.ao_confirmar = ao_confirmar
+
+        self.fila: "queue.Queue" = queue.Queue(maxsize=tamanho_fila)
+        self.erro: Optional[BaseException] = None
+        self.total_gravado = 0
+        self.commits = 0
+        self._grupo: List[Dict] = []
+        self._marcador_grupo = None
+        self._thread = threading.Thread(target=self._rodar, name=f"gravador-{self.nome}", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    # Coloca um item na fila, esperando vaga; desiste se o gravador já falhou
+    def _colocar(self, item):
+        while self.erro is None:
+            try:
+                self.fila.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        if item is not FIM_PIPELINE:
+            raise self.erro
+
+    # Envia um grupo de linhas que deve ser gravado por inteiro na mesma transação
+    def enviar(self, linhas: List[Dict], marcador: Any = None):
+        self._enviar_grupo()
+        if linhas:
+            self._colocar((linhas, marcador))
+
+    # Acumula uma linha solta; o grupo segue para o gravador ao atingir `tamanho_grupo` linhas
+    def adicionar(self, linha: Dict, marcador: Any = None):
+        self._grupo.append(linha)
+        self._marcador_grupo = marcador
+        if len(self._grupo) >= self.tamanho_grupo:
+            self._enviar_grupo()
+
+    def _enviar_grupo(self):
+        if self._grupo:
+            grupo, self._grupo = self._grupo, []
+            self._colocar((grupo, self._marcador_grupo))
+
+    def _confirmar(self, sessao_escrita: Session, escritor: EscritorLote, linhas: int, marcador: Any):
+        escritor.descarregar()
+        if self.ao_confirmar:
+            self.ao_confirmar(sessao_escrita, linhas, marcador)
+        sessao_escrita.commit()
+        self.commits += 1
+
+    def _rodar(self):
+        try:
+            with Session(self.engine) as sessao_escrita:
+                with EscritorLote(sessao_escrita, self.modelo, self.progress_callback, tamanho_lote=self.tamanho_lote,
+                                  commit_por_lote=False, nome=self.nome, alocador=self.alocador) as escritor:
+                    pendentes, marcador = 0, None
+                    while True:
+                        item = self.fila.get()
+                        if item is FIM_PIPELINE:
+                            break
+                        linhas, marcador = item
+                        escritor.adicionar_varios(linhas)
+                        pendentes += len(linhas)
+                        if pendentes >= self.tamanho_lote:
+                            self._confirmar(sessao_escrita, escritor, pendentes, marcador)
+                            pendentes = 0
+                    if pendentes:
+                        self._confirmar(sessao_escrita, escritor, pendentes, marcador)
+                self.total_gravado = escritor.total_gravado
+        except BaseException as e:
+            self.erro = e
+
+    # Envia o que restou, espera o gravador terminar e repassa o erro dele, se houver.
+    def finalizar(self) -> int:
+        if self.erro is None:
+            self._enviar_grupo()
+        self._colocar(FIM_PIPELINE)
+        self._thread.join()
+        if self.erro is not None:
+            raise self.erro
+        return self.total_gravado
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    # Mesmo se a etapa falhar, os grupos já enviados são gravados: cada commit é consistente com o seu checkpoint.
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.finalizar()
+        except Exception:
+            if exc_type is None:
+                raise
+        return False
+
+# Alternativa ao BuscadorAsync.buscar_em_fluxo com threads: aplica `funcao` a cada item e gera (indice, resultado)
+# à medida que os resultados ficam prontos (fora de ordem). No máximo `tamanho_janela` itens ficam em andamento
+# ou esperando consumo, em vez de submeter tudo de uma vez.
+def buscar_em_fluxo_threads(itens: Iterable, funcao: Callable[[Any], Any], max_workers: int = 10,
+                            tamanho_janela: int = TAMANHO_FILA_PIPELINE) -> Iterator[Tuple[int, Any]]:
+    itens_numerados = iter(enumerate(itens))
+    tamanho_janela = max(tamanho_janela, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        em_andamento = {}
+
+        def completar_janela():
+            while len(em_andamento) < tamanho_janela:
+                proximo = next(itens_numerados, None)
+                if proximo is None:
+                    return
+                indice, item = proximo
+                em_andamento[executor.submit(funcao, item)] = indice
+
+        completar_janela()
+        while em_andamento:
+            prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                yield em_andamento.pop(futuro), futuro.result()
+            completar_janela()
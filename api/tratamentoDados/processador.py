@@ -1,13 +1,35 @@
 import time
 from sqlmodel import Session 
-from .database import create_db_and_tables, get_engine_for_year, create_session_with_retries
+from .database import PRAGMAS_ESCRITA, create_db_and_tables, get_engine_for_year, create_session_with_retries
 from .despesaProcessor import fetch_and_save_despesas
 from .partidoProcessor import fetch_and_save_partidos
 from .deputadosProcessor import fetch_and_save_deputados
 from .sessaoProposicaoProcessor import fetch_and_save_votacoes
 from .votoProcessor import fetch_and_save_votos
+from .buscadorAsync import BuscadorAsync
+from .cacheHttp import CacheHttp
+from .orcamentoHttp import OrcamentoHttp
+from .dimensoes import RepositorioDimensoes
+from .analiseXml import PROCESSOS_PARSE, configurar_processos_parse, encerrar_processos_parse
+from .agendadorEtapas import AgendadorEtapas, EtapaETL, MAX_ETAPAS_PARALELAS
+from .registroFalhas import RegistroFalhas
+from .eventosProgresso import formatar_evento
+from .reprocessamentoFalhas import reprocessar_falhas as reprocessar_falhas_registradas
+from .migracoes import migrar_banco
+from .cicloBuild import PRAGMAS_CARGA, banco_finalizado, finalizar_build, liberar_escrita, preparar_carga
+from .checkpoint import etapa_concluida
 
-def run_data_processing(year: int, progress_callback):
+# usar_async: as requisições de detalhes são feitas pelo BuscadorAsync (asyncio) em vez de ThreadPoolExecutor
+# usar_cache: respostas da API ficam em 'cache_http' e são reaproveitadas entre anos e execuções
+# incremental: em vez de pular etapas que já têm dados, busca e grava apenas o que é novo ou mudou
+# max_etapas_paralelas: etapas independentes rodam ao mesmo tempo (1 = uma de cada vez, na ordem de dependência)
+# usar_dimensoes: partidos, deputados e proposições vêm de 'dbs/dimensions.db' quando outro ano já os buscou
+# processos_parse: processos que leem os XMLs de deputados, partidos e sessões fora das threads de I/O (0 = desligado)
+# orcamento: limite global de requisições HTTP simultâneas, usado quando vários anos rodam em paralelo (backfill)
+# reprocessar_falhas: modo 'retry-failed'; busca de novo só as URIs do livro de falhas do banco, sem rodar as etapas
+def run_data_processing(year: int, progress_callback, usar_async: bool = True, usar_cache: bool = True, incremental: bool = False,
+                        max_etapas_paralelas: int = MAX_ETAPAS_PARALELAS, orcamento: OrcamentoHttp = None,
+                        usar_dimensoes: bool = True, processos_parse: int = PROCESSOS_PARSE, reprocessar_falhas: bool = False):
     # --- MEDIÇÃO DE TEMPO INÍCIO TOTAL ---
     inicio_total = time.perf_counter()
     progress_callback('log', "="*50)
@@ -26,60 +48,82 @@ def run_data_processing(year: int, progress_callback):
     # --- 2. Configura o Banco de Dados e a SESSÃO DE REQUISIÇÕES ---
     try:
         
-        engine = get_engine_for_year(year)
+        # Um banco já finalizado volta a aceitar escrita e é atualizado com os pragmas normais;
+        # um build novo (ou interrompido) usa os pragmas de carga e deixa os índices secundários para o final
+        finalizado = banco_finalizado(year)
+        if liberar_escrita(year):
+            progress_callback('log', f"Banco de dados 'dbs/camara_{year}.db' estava somente leitura; reaberto para escrita.")
+        engine = get_engine_for_year(year, PRAGMAS_ESCRITA if finalizado else PRAGMAS_CARGA)
         create_db_and_tables(engine)
+        # Bancos criados por versões anteriores ganham as colunas e índices novos antes das etapas
+        migrar_banco(engine, progress_callback, adiar_indices=not finalizado)
+        preparar_carga(engine, progress_callback)
         progress_callback('log', f"Banco de dados 'dbs/camara_{year}.db' está pronto.")
-        http_session = create_session_with_retries()
+        cache_http = CacheHttp() if usar_cache else None
+        dimensoes = RepositorioDimensoes() if usar_dimensoes else None
+        http_session = create_session_with_retries(cache_http, orcamento)
+        buscador = BuscadorAsync(progress_callback=progress_callback, cache=cache_http, orcamento=orcamento) if usar_async else None
         progress_callback('progress', 10)
     except Exception as e:
         progress_callback('log', f"ERRO CRÍTICO ao configurar o ambiente: {e}")
         return False
         
     # --- 3. Executa a Coleta e Salva os Dados ---
-    with Session(engine) as session:
-        try:
-            # --- PROCESSANDO PARTIDOS ---
-            inicio_partidos = time.perf_counter()
-            fetch_and_save_partidos(session, http_session, progress_callback)
-            duracao_partidos = time.perf_counter() - inicio_partidos
-            progress_callback('log', f"⏱️ Tempo de processamento dos partidos: {duracao_partidos:.2f} segundos.\n")
-            progress_callback('progress', 25)
-            
-            # --- PROCESSANDO DEPUTADOS ---
-            inicio_deputados = time.perf_counter()
-            fetch_and_save_deputados(session, http_session, legislatura, progress_callback)
-            duracao_deputados = time.perf_counter() - inicio_deputados
-            progress_callback('log', f"⏱️ Tempo de processamento dos deputados: {duracao_deputados:.2f} segundos.\n")
-            progress_callback('progress', 40)
-
-            # --- PROCESSANDO DESPESAS ---
-            inicio_despesas = time.perf_counter()
-            fetch_and_save_despesas(session, http_session, year, progress_callback)
-            duracao_despesas = time.perf_counter() - inicio_despesas
-            progress_callback('log', f"⏱️ Tempo de processamento das despesas: {duracao_despesas:.2f} segundos.\n")
-            progress_callback('progress', 60)
+    # As requisições que falham (depois das novas tentativas) vão para o livro de falhas do banco
+    falhas = RegistroFalhas()
+    # Cada etapa declara de quais outras depende e roda com a sua própria Session assim que elas terminam:
+    # despesas (após deputados) corre em paralelo com sessões/proposições, que não dependem de ninguém.
+    etapas = [
+        EtapaETL("partidos", "dos partidos",
+                 lambda session, retomar: fetch_and_save_partidos(session, http_session, progress_callback, buscador, incremental=incremental, retomar=retomar, dimensoes=dimensoes, falhas=falhas)),
+        EtapaETL("deputados", "dos deputados",
+                 lambda session, retomar: fetch_and_save_deputados(session, http_session, legislatura, progress_callback, buscador, incremental=incremental, retomar=retomar, dimensoes=dimensoes, falhas=falhas),
+                 dependencias=["partidos"]),
+        EtapaETL("despesas", "das despesas",
+                 lambda session, retomar: fetch_and_save_despesas(session, http_session, year, progress_callback, incremental=incremental, retomar=retomar),
+                 dependencias=["deputados"], peso=2),
+        EtapaETL("votacoes", "das sessoes de votacao",
+                 lambda session, retomar: fetch_and_save_votacoes(session, http_session, year, progress_callback, buscador, incremental=incremental, retomar=retomar, dimensoes=dimensoes, falhas=falhas),
+                 peso=2),
+        EtapaETL("votos", "dos votos individuais",
+                 lambda session, retomar: fetch_and_save_votos(session, http_session, year, progress_callback, buscador, incremental=incremental, retomar=retomar, falhas=falhas),
+                 dependencias=["deputados", "votacoes"], peso=3),
+    ]
+    agendador = AgendadorEtapas(engine, etapas, progress_callback, incremental=incremental, max_paralelas=max_etapas_paralelas)
+    if processos_parse > 0:
+        configurar_processos_parse(processos_parse)
+        progress_callback('log', f"Leitura de XML em {processos_parse} processo(s) dedicado(s).")
+    try:
+        if reprocessar_falhas:
+            sucesso = reprocessar_falhas_registradas(engine, http_session, year, legislatura, progress_callback, buscador, dimensoes)
+        else:
+            sucesso = agendador.executar()
+    finally:
+        if processos_parse > 0:
+            encerrar_processos_parse()
+        if cache_http:
+            cache_http.gravar_acessos()
+    if not sucesso:
+        return False
 
-            # --- PROCESSANDO SESSAO ---
-            inicio_sessoes = time.perf_counter()
-            fetch_and_save_votacoes(session, http_session, year, progress_callback)
-            duracao_sessoes = time.perf_counter() - inicio_sessoes
-            progress_callback('log', f"⏱️ Tempo de processamento das sessoes de votacao: {duracao_sessoes:.2f} segundos.\n")
-            progress_callback('progress', 80)
-            
-            # --- PROCESSANDO VOTO ---
-            inicio_votos = time.perf_counter()
-            fetch_and_save_votos(session, http_session, year, progress_callback)
-            duracao_votos = time.perf_counter() - inicio_votos
-            progress_callback('log', f"⏱️ Tempo de processamento das sessoes de votacao: {duracao_votos:.2f} segundos.\n")
-            progress_callback('progress', 95)
-            progress_callback('log', "Coleta finalizada. Salvando dados no banco...")
-            session.commit()
-            progress_callback('log', "Dados salvos com sucesso!")
-            
-        except Exception as e:
-            progress_callback('log', f"ERRO durante a coleta de dados: {e}")
-            session.rollback()
-            return False
+    progress_callback('log', "Coleta finalizada. Dados salvos com sucesso!")
+    # O reprocessamento de falhas não passa pelas etapas: num build interrompido, o banco continua em carga
+    # (sem finalizar) até que todas as etapas tenham sido concluídas
+    with Session(engine) as session:
+        pendentes = [etapa.nome for etapa in etapas if not etapa_concluida(session, etapa.nome)]
+    if pendentes:
+        progress_callback('log', f"-> Build do ano ainda incompleto (etapas não concluídas: {', '.join(pendentes)}); "
+                                 "o banco será finalizado quando o ETL do ano terminar todas as etapas.")
+        return True
+    try:
+        finalizar_build(engine, year, progress_callback)
+    except Exception as e:
+        progress_callback('log', f"ERRO ao finalizar o banco: {e}")
+        return False
+    if cache_http:
+        progress_callback('log', cache_http.resumo())
+    if dimensoes:
+        progress_callback('log', dimensoes.resumo())
 
     # --- MEDIÇÃO DE TEMPO: FIM TOTAL ---
     fim_total = time.perf_counter()
@@ -97,3 +141,7 @@ def mock_progress_callback(msg_type, data):
         print(f"[LOG] {data}")
     elif msg_type == 'progress':
         print(f"[PROGRESS] {data}%")
+    elif msg_type == 'evento':
+        print(f"[EVENTO] {formatar_evento(data)}")
+    elif msg_type == 'concorrencia':
+        print(f"[CONCORRENCIA] {data['etapa']}: limite {data['limite']} (min {data['limite_minimo']}, max {data['limite_maximo']})")
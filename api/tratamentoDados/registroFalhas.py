@@ -0,0 +1,86 @@
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List
+from sqlmodel import Session, select
+from ..models.requisicao_falha import RequisicaoFalha
+from .checkpoint import dividir_em_blocos
+
+# Quantidade de URIs por consulta IN (abaixo do limite de variáveis do sqlite)
+TAMANHO_CONSULTA = 500
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+# Junta, durante a execução, as requisições que falharam depois de esgotadas as tentativas (em threads de I/O
+# ou no event loop do BuscadorAsync) e grava no livro de falhas do banco do ano ('requisicaofalha').
+# As etapas gravam no mesmo ponto em que confirmam os dados, então uma sessão gravada sem votos ou sem links
+# sempre tem a sua URI registrada, e o modo de reprocessamento busca de novo apenas essas URIs.
+class RegistroFalhas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes: Dict[str, Dict[str, Dict]] = {}  # {etapa: {uri: {"erro": str, "contexto": set}}}
+
+    def registrar(self, etapa: str, uri: str, erro: Exception):
+        with self._lock:
+            falha = self._pendentes.setdefault(etapa, {}).setdefault(uri, {"erro": None, "contexto": set()})
+            falha["erro"] = f"{type(erro).__name__}: {erro}"
+
+    # Callback para o em_erro do BuscadorAsync: registra a falha e devolve `padrao` como resultado da URI
+    def em_erro(self, etapa: str, padrao: Any = None) -> Callable[[str, Exception], Any]:
+        def _em_erro(uri: str, erro: Exception):
+            self.registrar(etapa, uri, erro)
+            return padrao() if callable(padrao) else padrao
+        return _em_erro
+
+    # Anota o que deixou de ser gravado por causa de uma URI que falhou nesta execução (ex: sessão sem o link)
+    def referenciar(self, etapa: str, uri: str, referencia: str):
+        with self._lock:
+            falha = self._pendentes.get(etapa, {}).get(uri)
+            if falha is not None:
+                falha["contexto"].add(str(referencia))
+
+    # Grava as falhas da etapa acumuladas até aqui (somando uma tentativa às URIs que já estavam no livro) e
+    # remove as URIs de `tentadas` que agora deram certo. Não faz commit: entra na transação de quem chamou.
+    def gravar(self, session: Session, etapa: str, tentadas: Iterable[str] = ()):
+        with self._lock:
+            pendentes = self._pendentes.pop(etapa, {})
+        resolvidas = [uri for uri in set(tentadas) if uri not in pendentes]
+
+        existentes = {}
+        for parte in dividir_em_blocos(list(pendentes) + resolvidas, TAMANHO_CONSULTA):
+            for registro in session.exec(select(RequisicaoFalha).where(RequisicaoFalha.uri.in_(parte))).all():
+                existentes[registro.uri] = registro
+
+        agora = _agora()
+        for uri, falha in pendentes.items():
+            registro = existentes.get(uri)
+            if registro is None:
+                registro = RequisicaoFalha(uri=uri, etapa=etapa, tentativas=0, primeira_falha=agora)
+            contexto = set(json.loads(registro.contexto)) if registro.contexto else set()
+            contexto |= falha["contexto"]
+            registro.erro = falha["erro"]
+            registro.tentativas += 1
+            registro.contexto = json.dumps(sorted(contexto)) if contexto else None
+            registro.ultima_falha = agora
+            session.add(registro)
+
+        for uri in resolvidas:
+            if uri in existentes:
+                session.delete(existentes[uri])
+        session.flush()
+
+# Falhas ainda não resolvidas de uma etapa (ou de todas), na ordem em que apareceram
+def falhas_registradas(session: Session, etapa: str = None) -> List[RequisicaoFalha]:
+    stmt = select(RequisicaoFalha).order_by(RequisicaoFalha.id)
+    if etapa is not None:
+        stmt = stmt.where(RequisicaoFalha.etapa == etapa)
+    return list(session.exec(stmt).all())
+
+# Ids (último trecho da URI) das entidades com falha registrada numa etapa, ex: deputados sem detalhes
+def ids_com_falha(session: Session, etapa: str) -> set:
+    return {registro.uri.rsplit('/', 1)[-1] for registro in falhas_registradas(session, etapa)}
+
+# Referências guardadas no contexto de uma falha (ex: ids das sessões que citam uma proposição)
+def referencias_da_falha(registro: RequisicaoFalha) -> List[str]:
+    return json.loads(registro.contexto) if registro.contexto else []
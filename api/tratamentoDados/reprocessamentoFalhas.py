@@ -0,0 +1,72 @@
+from typing import Optional
+import requests
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from ..models.deputado import Deputado
+from ..models.partido import Partido
+from ..models.requisicao_falha import RequisicaoFalha
+from .buscadorAsync import BuscadorAsync
+from .dimensoes import RepositorioDimensoes
+from .checkpoint import etapa_concluida
+from .despesaProcessor import salvar_despesas_dos_deputados
+from .partidoProcessor import fetch_and_save_partidos
+from .deputadosProcessor import fetch_and_save_deputados
+from .sessaoProposicaoProcessor import reprocessar_falhas_votacoes
+from .votoProcessor import reprocessar_falhas_votos
+from .registroFalhas import RegistroFalhas, falhas_registradas, ids_com_falha
+
+# Quantidade de falhas ainda registradas, por etapa
+def contar_falhas(session: Session) -> dict:
+    return dict(session.exec(select(RequisicaoFalha.etapa, func.count()).group_by(RequisicaoFalha.etapa)).all())
+
+# Remove do livro as falhas de partidos/deputados cujo registro já está no banco (ex: copiado do banco de dimensões)
+def _resolver_presentes(session: Session, falhas: RegistroFalhas, etapa: str, modelo):
+    ids_presentes = {str(id_da) for id_da in session.exec(select(modelo.id_dados_abertos)).all()}
+    resolvidas = [registro.uri for registro in falhas_registradas(session, etapa) if registro.uri.rsplit('/', 1)[-1] in ids_presentes]
+    falhas.gravar(session, etapa, resolvidas)
+    session.commit()
+
+# Modo 'retry-failed': em vez de refazer o ano, busca de novo apenas as URIs do livro de falhas do banco
+# e grava as linhas que tinham ficado de fora. As etapas seguem a ordem de dependência (deputados antes dos
+# votos, proposições depois das sessões) e cada URI que volta a falhar continua no livro com mais uma tentativa.
+# Deputados recuperados também recebem as linhas que dependiam deles: as despesas vêm do ZIP local e as sessões
+# em que votaram já foram registradas na etapa 'votos' quando o voto deles foi descartado.
+def reprocessar_falhas(engine: Engine, http_session: requests.Session, ano: int, id_legislatura: int, progress_callback,
+                       buscador: Optional[BuscadorAsync] = None, dimensoes: Optional[RepositorioDimensoes] = None) -> bool:
+    falhas = RegistroFalhas()
+    with Session(engine) as session:
+        antes = contar_falhas(session)
+        if not antes:
+            progress_callback('log', "-> Nenhuma requisição com falha registrada neste banco.")
+            return True
+        progress_callback('log', "-> Reprocessando requisições que falharam: " +
+                          ", ".join(f"{etapa} ({quantidade})" for etapa, quantidade in sorted(antes.items())))
+
+        try:
+            if antes.get('partidos'):
+                fetch_and_save_partidos(session, http_session, progress_callback, buscador, retomar=True, dimensoes=dimensoes, falhas=falhas)
+                _resolver_presentes(session, falhas, 'partidos', Partido)
+            if antes.get('deputados'):
+                deputados_com_falha = ids_com_falha(session, 'deputados')
+                fetch_and_save_deputados(session, http_session, id_legislatura, progress_callback, buscador, retomar=True, dimensoes=dimensoes, falhas=falhas)
+                _resolver_presentes(session, falhas, 'deputados', Deputado)
+                recuperados = {int(id_da) for id_da in deputados_com_falha - ids_com_falha(session, 'deputados') if id_da.isdigit()}
+                # Com a etapa de despesas ainda por concluir, a próxima execução normal grava as despesas deles
+                if recuperados and etapa_concluida(session, 'despesas'):
+                    salvar_despesas_dos_deputados(session, http_session, ano, recuperados, progress_callback)
+            progress_callback('progress', 40)
+            if antes.get('sessoes') or antes.get('proposicoes'):
+                reprocessar_falhas_votacoes(session, http_session, progress_callback, buscador, dimensoes, falhas)
+            progress_callback('progress', 60)
+            if antes.get('votos'):
+                reprocessar_falhas_votos(session, http_session, progress_callback, buscador, falhas)
+        except Exception as e:
+            progress_callback('log', f"ERRO durante o reprocessamento das falhas: {e}")
+            session.rollback()
+            return False
+
+        depois = contar_falhas(session)
+    progress_callback('log', f"-> Reprocessamento concluído: {sum(antes.values()) - sum(depois.values())} de {sum(antes.values())} "
+                             f"requisições resolvidas, {sum(depois.values())} ainda com falha.")
+    return True
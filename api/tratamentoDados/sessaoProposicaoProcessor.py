@@ -1,4 +1,3 @@
-import xml.etree.ElementTree as ET
 import requests
 import json
 import os
@@ -9,6 +8,19 @@ from sqlmodel import Session, select
 from ..models.proposicao import Proposicao
 from ..models.sessao_votacao import SessaoVotacao
 from ..models.votacao_proposicao import VotacaoProposicao
+from .arquivoStream import baixar_arquivo_em_partes, iterar_array_json_no_arquivo
+from .escritorLote import EscritorLote
+from .buscadorAsync import BuscadorAsync
+from .checkpoint import dividir_em_blocos, registrar_lote
+from .dimensoes import RepositorioDimensoes
+from .alocadorChaves import AlocadorChaves
+from .analiseXml import ERROS_XML, analisar_xml, xml_fromstring
+from .registroFalhas import RegistroFalhas, falhas_registradas, referencias_da_falha
+from .eventosProgresso import MedidorProgresso
+from .sincronizacao import conteudo_mudou, obter_marca, registrar_marca, verificar_arquivo_remoto
+from .datasRegistro import campos_data
+
+URL_ARQUIVO_VOTACOES = "https://dadosabertos.camara.leg.br/arquivos/votacoes/json/votacoes-{ano}.json"
 
 # Faz o download do arquivo de sessoes de votação direto da api da camara
 def download_votacoes_file(ano: int, http_session: requests.Session, progress_callback) -> Optional[str]:
@@ -22,7 +34,7 @@ def download_votacoes_file(ano: int, http_session: requests.Session, progress_ca
         return json_filepath
 
     progress_callback('log', f"   - Baixando arquivo de votações para o ano {ano}...")
-    url = f"https://dadosabertos.camara.leg.br/arquivos/votacoes/json/votacoes-{ano}.json"
+    url = URL_ARQUIVO_VOTACOES.format(ano=ano)
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
@@ -38,43 +50,246 @@ def download_votacoes_file(ano: int, http_session: requests.Session, progress_ca
         progress_callback('log', f"   - ERRO: Falha no download do arquivo para {ano}. Detalhes: {e}")
         return None
     
+URL_PROPOSICOES = 'https://dadosabertos.camara.leg.br/api/v2/proposicoes'
+
+URL_ARQUIVO_VOTACOES_PROPOSICOES = "https://dadosabertos.camara.leg.br/arquivos/votacoesProposicoes/json/votacoesProposicoes-{ano}.json"
+
+# Faz o download, em blocos, do arquivo anual que liga cada votação às proposições afetadas
+# atualizar: descarta a cópia local para baixar a versão mais recente (sincronização incremental)
+def download_votacoes_proposicoes_file(ano: int, http_session: requests.Session, progress_callback, atualizar: bool = False) -> Optional[str]:
+    DATA_DIR = "data"
+    os.makedirs(DATA_DIR, exist_ok=True)
+    json_filepath = os.path.join(DATA_DIR, f"votacoesProposicoes_{ano}.json")
+
+    if atualizar and os.path.exists(json_filepath):
+        os.remove(json_filepath)
+
+    if os.path.exists(json_filepath):
+        progress_callback('log', f"   - Arquivo '{json_filepath}' já existe localmente.")
+        return json_filepath
+
+    progress_callback('log', f"   - Baixando arquivo de votações-proposições para o ano {ano}...")
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    try:
+        baixar_arquivo_em_partes(URL_ARQUIVO_VOTACOES_PROPOSICOES.format(ano=ano), json_filepath, http_session, headers=headers, timeout=300)
+        progress_callback('log', f"   - Arquivo salvo em '{json_filepath}'")
+        return json_filepath
+    except requests.exceptions.RequestException as e:
+        progress_callback('log', f"   - AVISO: Falha no download do arquivo de votações-proposições para {ano}, usando os XMLs. Detalhes: {e}")
+        return None
+
+# Id da proposição de uma linha do arquivo anual: objeto 'proposicao_' ou campo plano 'proposicao_id'
+def extrair_id_proposicao(item: Dict) -> Optional[str]:
+    id_proposicao = (item.get('proposicao_') or {}).get('id') or item.get('proposicao_id')
+    return str(id_proposicao) if id_proposicao else None
+
+# Percorre o arquivo anual em streaming e monta {id_da_sessao: [id_prop_1, id_prop_2]} para as sessões pedidas,
+# na mesma forma produzida pela leitura dos XMLs. Sessões sem nenhuma linha no arquivo ficam com lista vazia.
+def montar_mapa_sessao_props_do_arquivo(caminho: str, ids_sessoes: List[str]) -> Dict[str, List[str]]:
+    mapa_sessao_para_props = {id_sessao: [] for id_sessao in ids_sessoes}
+    for item in iterar_array_json_no_arquivo(caminho, chave='dados'):
+        lista = mapa_sessao_para_props.get(str(item.get('idVotacao')))
+        prop_id = extrair_id_proposicao(item)
+        if lista is not None and prop_id:
+            lista.append(prop_id)
+    return mapa_sessao_para_props
+
+# Extrai os detalhes de uma proposição do corpo JSON da API
+def extrair_detalhes_proposicao_json(conteudo: bytes) -> Dict:
+    return json.loads(conteudo).get('dados', {})
+
+# Extrai do XML de uma votação a lista de IDs de proposições afetadas
+def extrair_ids_proposicoes_xml(conteudo: bytes) -> List[str]:
+    root = xml_fromstring(conteudo)
+    return [elem.text for elem in root.findall('.//proposicoesAfetadas/proposicoesAfetadas/id') if elem.text]
+
 # Busca os detalhes de UMA proposição
-def buscar_detalhes_proposicao_api(proposicao_id: str, http_session: requests.Session) -> Optional[Dict]:
+# falhas: registra a URI no livro de falhas quando a requisição não dá certo
+def buscar_detalhes_proposicao_api(proposicao_id: str, http_session: requests.Session, falhas: Optional[RegistroFalhas] = None) -> Optional[Dict]:
+    url = f'{URL_PROPOSICOES}/{proposicao_id}'
     try:
-        url = f'https://dadosabertos.camara.leg.br/api/v2/proposicoes/{proposicao_id}'
         response = http_session.get(url, headers={'accept': 'application/json'}, timeout=15)
         response.raise_for_status()
-        return response.json().get('dados', {})
-    except requests.exceptions.RequestException:
+        return extrair_detalhes_proposicao_json(response.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if falhas:
+            falhas.registrar('proposicoes', url, e)
         return None
 
 # Busca o XML de uma votação e retorna a lista de IDs de proposições afetadas.
-def buscar_ids_proposicoes_em_xml(uri: str, http_session: requests.Session) -> List[str]:
+def buscar_ids_proposicoes_em_xml(uri: str, http_session: requests.Session, falhas: Optional[RegistroFalhas] = None) -> List[str]:
     try:
         response = http_session.get(uri, headers={'accept': 'application/xml'}, timeout=20)
         response.raise_for_status()
-        root = ET.fromstring(response.content)
-        ids = [elem.text for elem in root.findall('.//proposicoesAfetadas/proposicoesAfetadas/id') if elem.text]
-        return ids
-    except (requests.exceptions.RequestException, ET.ParseError):
+        return analisar_xml(extrair_ids_proposicoes_xml, response.content)
+    except (requests.exceptions.RequestException, *ERROS_XML) as e:
+        if falhas:
+            falhas.registrar('sessoes', uri, e)
         return []
 
+# Busca CONCORRENTE, nos XMLs das sessões, os IDs de proposições afetadas. Retorna {id_da_sessao: [id_prop_1, ...]}
+# As sessões cujo XML falhou ficam com lista vazia e são registradas em `falhas` (etapa 'sessoes').
+def buscar_proposicoes_afetadas_xml(sessoes: List[Dict], http_session: requests.Session, buscador: Optional[BuscadorAsync], progress_callback,
+                                    falhas: Optional[RegistroFalhas] = None) -> Dict[str, List[str]]:
+    falhas = falhas if falhas is not None else RegistroFalhas()
+    sessoes_com_uri = [s for s in sessoes if s.get('uri')]
+    uris_sessoes_para_processar = [s.get('uri') for s in sessoes_com_uri]
+    progress_callback('log', f"   - Buscando proposições afetadas para {len(sessoes_com_uri)} novas sessões...")
+
+    mapa_sessao_para_props = {}
+    with ThreadPoolExecutor(max_workers=25) as executor, \
+            MedidorProgresso(progress_callback, 'votacoes', "Lendo XMLs de sessões", total=len(uris_sessoes_para_processar)) as medidor:
+        buscar_com_sessao = partial(buscar_ids_proposicoes_em_xml, http_session=http_session, falhas=falhas)
+
+        if buscador:
+            resultados_ids = buscador.buscar_todos(uris_sessoes_para_processar, extrair_ids_proposicoes_xml, headers={'accept': 'application/xml'}, em_erro=falhas.em_erro('sessoes', list), etapa='sessoes', parse_xml=True)
+        else:
+            resultados_ids = executor.map(buscar_com_sessao, uris_sessoes_para_processar)
+
+        for sessao_dict, lista_de_ids_prop in zip(sessoes_com_uri, resultados_ids):
+            mapa_sessao_para_props[str(sessao_dict['id'])] = lista_de_ids_prop
+            medidor.avancar(proposicoes=len(lista_de_ids_prop))
+    return mapa_sessao_para_props
+
+# Converte os detalhes da API numa linha da tabela de proposições
+def montar_linha_proposicao(prop_detalhes: Dict) -> Dict:
+    return {
+        "id_dados_abertos": str(prop_detalhes.get('id')),
+        "sigla_tipo": prop_detalhes.get('siglaTipo'),
+        "ano": prop_detalhes.get('ano'),
+        "ementa": prop_detalhes.get('ementa'),
+        "data_apresentacao": prop_detalhes.get('dataApresentacao'),
+        "status": (prop_detalhes.get('statusProposicao') or {}).get('descricaoSituacao'),
+        "url_inteiro_teor": prop_detalhes.get('urlInteiroTeor')
+    }
+
+# Busca CONCORRENTE os detalhes das proposições novas, grava e acrescenta os ids gerados em proposicoes_existentes_db
+# dimensoes: proposições já guardadas no banco compartilhado (votadas em outro ano) são copiadas sem requisição
+# alocador: as chaves são definidas antes do INSERT e vão direto para proposicoes_existentes_db
+# falhas: proposições cujos detalhes não puderam ser buscados são registradas (etapa 'proposicoes')
+def salvar_proposicoes_novas(session: Session, ids_proposicoes_a_buscar: set, http_session: requests.Session, buscador: Optional[BuscadorAsync],
+                             proposicoes_existentes_db: Dict[str, int], progress_callback, dimensoes: Optional[RepositorioDimensoes] = None,
+                             alocador: Optional[AlocadorChaves] = None, falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
+    proposicoes_guardadas = dimensoes.obter('proposicao', ids_proposicoes_a_buscar) if dimensoes else {}
+    if proposicoes_guardadas:
+        progress_callback('log', f"   - {len(proposicoes_guardadas)} proposições reaproveitadas do banco de dimensões.")
+        ids_proposicoes_a_buscar = set(ids_proposicoes_a_buscar) - set(proposicoes_guardadas)
+
+    progress_callback('log', f"   - Buscando detalhes para {len(ids_proposicoes_a_buscar)} novas proposições...")
+    detalhes_proposicoes = [] # Inicia a lista vazia para preencher no loop
+    with ThreadPoolExecutor(max_workers=10) as executor, \
+            MedidorProgresso(progress_callback, 'votacoes', "Buscando detalhes de proposições", total=len(ids_proposicoes_a_buscar)) as medidor:
+        buscar_com_sessao = partial(buscar_detalhes_proposicao_api, http_session=http_session, falhas=falhas)
+
+        if buscador:
+            urls_proposicoes = [f'{URL_PROPOSICOES}/{prop_id}' for prop_id in ids_proposicoes_a_buscar]
+            resultados_detalhes = buscador.buscar_todos(urls_proposicoes, extrair_detalhes_proposicao_json, headers={'accept': 'application/json'}, em_erro=falhas.em_erro('proposicoes'), etapa='proposicoes')
+        else:
+            resultados_detalhes = executor.map(buscar_com_sessao, list(ids_proposicoes_a_buscar))
+
+        for detalhe in resultados_detalhes:
+            detalhes_proposicoes.append(detalhe)
+            medidor.avancar()
+
+    linhas_buscadas = [montar_linha_proposicao(d) for d in detalhes_proposicoes if d and d.get('id')]
+    if dimensoes:
+        dimensoes.gravar('proposicao', linhas_buscadas)
+
+    alocador = alocador or AlocadorChaves(session, Proposicao)
+    with EscritorLote(session, Proposicao, progress_callback, nome="Proposições", alocador=alocador) as escritor:
+        for linha in list(proposicoes_guardadas.values()) + linhas_buscadas:
+            if linha["id_dados_abertos"] not in proposicoes_existentes_db:
+                escritor.adicionar(linha)
+                proposicoes_existentes_db[linha["id_dados_abertos"]] = linha["id"]
+
+# Grava as sessões e seus links com as proposições numa única transação, junto com o checkpoint do bloco.
+# Assim uma sessão nunca fica gravada sem os seus links, mesmo se o processo for interrompido.
+# As chaves das sessões vêm do alocador, então os links são montados sem consultar o banco.
+# falhas: links que ficaram de fora (proposição que falhou) são anotados na falha, e as falhas do bloco entram na mesma transação.
+def salvar_sessoes_e_links(session: Session, sessoes: List[Dict], mapa_sessao_para_props: Dict[str, List[str]],
+                           proposicoes_existentes_db: Dict[str, int], progress_callback, alocador: Optional[AlocadorChaves] = None,
+                           falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
+    progress_callback('log', f"   - Adicionando {len(sessoes)} novas sessões e seus links...")
+    alocador = alocador or AlocadorChaves(session, SessaoVotacao)
+    mapa_sessoes_db = {}
+    with EscritorLote(session, SessaoVotacao, progress_callback, commit_por_lote=False, nome="Sessões de votação", alocador=alocador) as escritor:
+        for sessao_dict in sessoes:
+            linha = {
+                "id_dados_abertos": sessao_dict.get('id'),
+                "data_hora_registro": sessao_dict.get('dataHoraRegistro'),
+                **campos_data(sessao_dict.get('dataHoraRegistro')),
+                "descricao": sessao_dict.get('descricao'),
+                "sigla_orgao": sessao_dict.get('siglaOrgao'),
+                "uri": sessao_dict.get('uri'),
+                "aprovacao": str(sessao_dict.get('aprovacao')) if sessao_dict.get('aprovacao') is not None else None,
+                "descricao_ultima_abertura_votacao": (sessao_dict.get('ultimaAberturaVotacao') or {}).get('descricao')
+            }
+            escritor.adicionar(linha)
+            mapa_sessoes_db[sessao_dict.get('id')] = linha["id"]
+
+    with EscritorLote(session, VotacaoProposicao, progress_callback, commit_por_lote=False, nome="Links votação-proposição") as escritor:
+        for sessao_dict in sessoes:
+            id_sessao_db = mapa_sessoes_db.get(sessao_dict.get('id'))
+            if id_sessao_db is None:
+                continue
+            ids_props_desta_sessao = mapa_sessao_para_props.get(str(sessao_dict.get('id')), [])
+            for prop_id_str in ids_props_desta_sessao:
+                id_proposicao_db = proposicoes_existentes_db.get(prop_id_str)
+                if id_proposicao_db:
+                    escritor.adicionar({"id_votacao": id_sessao_db, "id_proposicao": id_proposicao_db})
+                else:
+                    falhas.referenciar('proposicoes', f'{URL_PROPOSICOES}/{prop_id_str}', sessao_dict.get('id'))
+
+    falhas.gravar(session, 'sessoes')
+    falhas.gravar(session, 'proposicoes')
+    registrar_lote(session, 'votacoes', registros=len(sessoes))
+    session.commit()
+
 # Busca as sessoes de votação e as proposiçoes associdas e salva no db
-def fetch_and_save_votacoes(session: Session, http_session: requests.Session, ano: int, progress_callback):
+# usar_arquivo: as proposições afetadas vêm do arquivo anual 'votacoesProposicoes-{ano}.json',
+# sem nenhuma requisição por sessão; os XMLs das sessões ficam como alternativa se o arquivo falhar.
+# incremental: não pula a etapa quando já há sessões; só relê o arquivo anual se ele mudou e processa
+# apenas as sessões que ainda não estão no banco.
+# retomar: a etapa foi interrompida; as sessões de blocos já concluídos (com seus links) são puladas pelo id.
+# dimensoes: banco compartilhado entre os anos, consultado antes de buscar detalhes de proposições na API.
+# falhas: XMLs de sessões e detalhes de proposições que falharam vão para o livro de falhas do banco.
+def fetch_and_save_votacoes(session: Session, http_session: requests.Session, ano: int, progress_callback, buscador: Optional[BuscadorAsync] = None,
+                            usar_arquivo: bool = True, incremental: bool = False, retomar: bool = False,
+                            dimensoes: Optional[RepositorioDimensoes] = None, falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
     
     progress_callback('log', f"-> Iniciando processamento de votações para o ano {ano}...")
 
     stmt_verificacao = select(SessaoVotacao)
     sessoes_existente = session.exec(stmt_verificacao).first()
 
-    if sessoes_existente:
+    if sessoes_existente and not (incremental or retomar):
         progress_callback('log', f"-> Sessões para o ano {ano} já constam no banco. Etapa concluída.")
         return 
 
+    versao_remota = None
+    if incremental:
+        caminho_local = os.path.join("data", f"votacoes_{ano}.json")
+        mudou, versao_remota = verificar_arquivo_remoto(session, http_session, 'votacoes', URL_ARQUIVO_VOTACOES.format(ano=ano), caminho_local, progress_callback)
+        if not mudou:
+            progress_callback('log', "-> Sessões de votação já estão atualizadas.")
+            return
+
     caminho_arquivo = download_votacoes_file(ano, http_session, progress_callback)
     if not caminho_arquivo:
         raise Exception(f"Arquivo de votações para {ano} não pôde ser baixado.")
 
+    if incremental:
+        mudou, hash_arquivo = conteudo_mudou(session, 'votacoes', caminho_arquivo, progress_callback)
+        if not mudou:
+            registrar_marca(session, 'votacoes', etag=versao_remota)
+            progress_callback('log', "-> Sessões de votação já estão atualizadas.")
+            return
+
     try:
         with open(caminho_arquivo, 'r', encoding='utf-8-sig') as f:
             dados_completos = json.load(f)
@@ -87,94 +302,118 @@ def fetch_and_save_votacoes(session: Session, http_session: requests.Session, an
 
     # --- Verificando sessoes e proposicoes que já existem no DB ---
     ids_sessoes_existentes_db = {s for s in session.exec(select(SessaoVotacao.id_dados_abertos)).all()}   #set[id_dados_abertos]
-    proposicoes_existentes_db = {str(p.id_dados_abertos): p for p in session.exec(select(Proposicao)).all()} #dict[id_dados_abertos, Proposicao]
+    proposicoes_existentes_db = {str(id_da): id_db for id_db, id_da in session.exec(select(Proposicao.id, Proposicao.id_dados_abertos)).all()} #dict[id_dados_abertos, id]
 
     # --- Verificando no arquivo de sessoes quais eu vou precisar analisar ---
     sessoes_a_processar = [s for s in sessoes_base if str(s.get('id')) not in ids_sessoes_existentes_db]
+
+    # As sessões novas já foram separadas pelo id; a marca guarda a versão do arquivo e a data mais recente
+    if incremental:
+        datas = [s.get('dataHoraRegistro') for s in sessoes_base if s.get('dataHoraRegistro')]
+        marca_votacoes = {"etag": versao_remota, "hash_arquivo": hash_arquivo,
+                          "ultima_data_sessao": max(datas, default=obter_marca(session, 'votacoes').ultima_data_sessao)}
+
     if not sessoes_a_processar:
+        if incremental:
+            registrar_marca(session, 'votacoes', **marca_votacoes)
         progress_callback('log', "-> Nenhuma nova sessão de votação para adicionar.")
         return
     
-    uris_sessoes_para_processar = [s.get('uri') for s in sessoes_a_processar if s.get('uri')]
+    mapa_sessao_para_props = {}       # {id_da_sessao: [id_prop_1, id_prop_2]}
+    chaves_sessoes = AlocadorChaves(session, SessaoVotacao)
+    chaves_proposicoes = AlocadorChaves(session, Proposicao)
 
+    # --- Proposições afetadas a partir do arquivo anual (sem requisições por sessão) ---
+    caminho_arquivo_props = download_votacoes_proposicoes_file(ano, http_session, progress_callback, atualizar=incremental) if usar_arquivo else None
+    if caminho_arquivo_props:
+        progress_callback('log', f"   - Lendo proposições afetadas de {len(sessoes_a_processar)} novas sessões no arquivo anual...")
+        try:
+            mapa_sessao_para_props = montar_mapa_sessao_props_do_arquivo(caminho_arquivo_props, [str(s.get('id')) for s in sessoes_a_processar])
+        except ValueError as e:
+            # Arquivo corrompido ou truncado: descarta para baixar de novo na próxima execução
+            progress_callback('log', f"   - AVISO: Arquivo de votações-proposições inválido ({e}), usando os XMLs.")
+            os.remove(caminho_arquivo_props)
+            caminho_arquivo_props = None
 
-    # --- Busca CONCORRENTE dos IDs de proposições em todas as novas sessões ---
-    progress_callback('log', f"   - Buscando proposições afetadas para {len(sessoes_a_processar)} novas sessões...")
-    mapa_sessao_para_props = {}       # {id_da_sessao: [id_prop_1, id_prop_2]}
-    ids_proposicoes_a_buscar = set()  # Vai guardar os IDs das proposições que são novas para nós
-    
-    with ThreadPoolExecutor(max_workers=25) as executor:
-        buscar_com_sessao = partial(buscar_ids_proposicoes_em_xml, http_session=http_session)
-        
-        resultados_ids = executor.map(buscar_com_sessao, uris_sessoes_para_processar)
-        
-        total_sessoes = len(uris_sessoes_para_processar)
-        for i, (sessao_dict, lista_de_ids_prop) in enumerate(zip(sessoes_a_processar, resultados_ids)):
-            # Atualiza o progresso no terminal a cada 100 itens
-            if (i + 1) % 100 == 0 or (i + 1) == total_sessoes:
-                print(f"\r      Lendo XMLs de sessões: {i + 1}/{total_sessoes}", end="", flush=True)
-
-            mapa_sessao_para_props[sessao_dict['id']] = lista_de_ids_prop
-            for prop_id in lista_de_ids_prop:
+    # --- Processa as sessões em blocos; cada bloco é gravado e registrado no checkpoint numa única transação ---
+    blocos = list(dividir_em_blocos(sessoes_a_processar))
+    for numero_bloco, bloco in enumerate(blocos, start=1):
+        if len(blocos) > 1:
+            progress_callback('log', f"   - Bloco {numero_bloco}/{len(blocos)} ({len(bloco)} sessões)...")
+
+        # Alternativa ao arquivo: busca CONCORRENTE dos IDs de proposições nos XMLs das sessões do bloco
+        if not caminho_arquivo_props:
+            mapa_sessao_para_props.update(buscar_proposicoes_afetadas_xml(bloco, http_session, buscador, progress_callback, falhas))
+
+        ids_proposicoes_a_buscar = set()  # Vai guardar os IDs das proposições que são novas para nós
+        for sessao_dict in bloco:
+            for prop_id in mapa_sessao_para_props.get(str(sessao_dict.get('id')), []):
                 if prop_id not in proposicoes_existentes_db:
                     ids_proposicoes_a_buscar.add(prop_id)
-        print()
-            
 
-    # --- Busca CONCORRENTE dos detalhes de todas as proposições novas ---
+        if ids_proposicoes_a_buscar:
+            salvar_proposicoes_novas(session, ids_proposicoes_a_buscar, http_session, buscador, proposicoes_existentes_db, progress_callback,
+                                     dimensoes, chaves_proposicoes, falhas)
+
+        salvar_sessoes_e_links(session, bloco, mapa_sessao_para_props, proposicoes_existentes_db, progress_callback, chaves_sessoes, falhas)
+
+    if incremental:
+        registrar_marca(session, 'votacoes', **marca_votacoes)
+    progress_callback('log', "-> Processamento de votações concluído.")
+
+# Modo de reprocessamento: busca de novo só os XMLs de sessões e os detalhes de proposições registrados no livro
+# de falhas e grava os links votação-proposição que tinham ficado de fora.
+def reprocessar_falhas_votacoes(session: Session, http_session: requests.Session, progress_callback, buscador: Optional[BuscadorAsync] = None,
+                                dimensoes: Optional[RepositorioDimensoes] = None, falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
+    uris_sessoes = [registro.uri for registro in falhas_registradas(session, 'sessoes')]
+    registros_proposicoes = falhas_registradas(session, 'proposicoes')
+    if not uris_sessoes and not registros_proposicoes:
+        return
+
+    proposicoes_existentes_db = {str(id_da): id_db for id_db, id_da in session.exec(select(Proposicao.id, Proposicao.id_dados_abertos)).all()}
+    links_a_gravar: Dict[str, set] = {}  # {id_da_sessao: {id_prop_1, id_prop_2}}
+
+    # --- Sessões cujo XML falhou: lê as proposições afetadas de novo ---
+    if uris_sessoes:
+        sessoes = session.exec(select(SessaoVotacao.id_dados_abertos, SessaoVotacao.uri).where(SessaoVotacao.uri.in_(uris_sessoes))).all()
+        mapa_sessao_para_props = buscar_proposicoes_afetadas_xml([{"id": s.id_dados_abertos, "uri": s.uri} for s in sessoes],
+                                                                 http_session, buscador, progress_callback, falhas)
+        for id_sessao, ids_props in mapa_sessao_para_props.items():
+            links_a_gravar.setdefault(id_sessao, set()).update(ids_props)
+
+    # --- Proposições que falharam: o id vem da URI e as sessões que a citam, do contexto da falha ---
+    ids_proposicoes_falhas = set()
+    for registro in registros_proposicoes:
+        prop_id = registro.uri.rsplit('/', 1)[-1]
+        ids_proposicoes_falhas.add(prop_id)
+        for id_sessao in referencias_da_falha(registro):
+            links_a_gravar.setdefault(id_sessao, set()).add(prop_id)
+
+    ids_proposicoes_a_buscar = {prop_id for ids_props in links_a_gravar.values() for prop_id in ids_props} | ids_proposicoes_falhas
+    ids_proposicoes_a_buscar -= set(proposicoes_existentes_db)
     if ids_proposicoes_a_buscar:
-        progress_callback('log', f"   - Buscando detalhes para {len(ids_proposicoes_a_buscar)} novas proposições...")
-        detalhes_proposicoes = [] # Inicia a lista vazia para preencher no loop
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            buscar_com_sessao = partial(buscar_detalhes_proposicao_api, http_session=http_session)
-            
-            resultados_detalhes = executor.map(buscar_com_sessao, list(ids_proposicoes_a_buscar))
-            
-            total_proposicoes = len(ids_proposicoes_a_buscar)
-            for i, detalhe in enumerate(resultados_detalhes):
-                detalhes_proposicoes.append(detalhe)
-                
-                if (i + 1) % 50 == 0 or (i + 1) == total_proposicoes:
-                    print(f"\r      Buscando detalhes de proposições: {i + 1}/{total_proposicoes}", end="", flush=True)
-
-        print() 
-
-        for prop_detalhes in detalhes_proposicoes:
-            if prop_detalhes and prop_detalhes.get('id'):
-                prop_id_str = str(prop_detalhes.get('id'))
-                if prop_id_str not in proposicoes_existentes_db:
-                    nova_proposicao = Proposicao(
-                        id_dados_abertos=prop_id_str,
-                        sigla_tipo=prop_detalhes.get('siglaTipo'),
-                        ano=prop_detalhes.get('ano'),
-                        ementa=prop_detalhes.get('ementa'),
-                        data_apresentacao=prop_detalhes.get('dataApresentacao'),
-                        status=prop_detalhes.get('statusProposicao', {}).get('descricaoSituacao'),
-                        url_inteiro_teor=prop_detalhes.get('urlInteiroTeor')
-                    )
-                    session.add(nova_proposicao)
-                    proposicoes_existentes_db[prop_id_str] = nova_proposicao
-    
-    # --- Adicionar as Sessões e criar os Links ---
-    progress_callback('log', f"   - Adicionando {len(sessoes_a_processar)} novas sessões e seus links...")
-    for sessao_dict in sessoes_a_processar:
-        nova_sessao = SessaoVotacao(
-            id_dados_abertos=sessao_dict.get('id'),
-            data_hora_registro=sessao_dict.get('dataHoraRegistro'),
-            descricao=sessao_dict.get('descricao'),
-            sigla_orgao=sessao_dict.get('siglaOrgao'),
-            uri=sessao_dict.get('uri'),
-            aprovacao=str(sessao_dict.get('aprovacao')) if sessao_dict.get('aprovacao') is not None else None,
-            descricao_ultima_abertura_votacao=sessao_dict.get('ultimaAberturaVotacao', {}).get('descricao')
-        )
-        session.add(nova_sessao)
-        session.flush()
-
-        ids_props_desta_sessao = mapa_sessao_para_props.get(sessao_dict.get('id'), [])
-        for prop_id_str in ids_props_desta_sessao:
-            proposicao_no_db = proposicoes_existentes_db.get(prop_id_str)
-            if proposicao_no_db:
-                link = VotacaoProposicao(id_votacao=nova_sessao.id, id_proposicao=proposicao_no_db.id)
-                session.add(link)
-    
-    progress_callback('log', "-> Processamento de votações concluído.")
\ No newline at end of file
+        salvar_proposicoes_novas(session, ids_proposicoes_a_buscar, http_session, buscador, proposicoes_existentes_db, progress_callback,
+                                 dimensoes, AlocadorChaves(session, Proposicao), falhas)
+
+    # --- Links que faltavam (os que já existem no banco são ignorados) ---
+    mapa_sessoes_db = dict(session.exec(select(SessaoVotacao.id_dados_abertos, SessaoVotacao.id)
+                                        .where(SessaoVotacao.id_dados_abertos.in_(list(links_a_gravar)))).all())
+    links_existentes = set(session.exec(select(VotacaoProposicao.id_votacao, VotacaoProposicao.id_proposicao)
+                                        .where(VotacaoProposicao.id_votacao.in_(list(mapa_sessoes_db.values())))).all())
+    with EscritorLote(session, VotacaoProposicao, progress_callback, commit_por_lote=False, nome="Links votação-proposição") as escritor:
+        for id_sessao, ids_props in links_a_gravar.items():
+            id_sessao_db = mapa_sessoes_db.get(id_sessao)
+            if id_sessao_db is None:
+                continue
+            for prop_id in ids_props:
+                id_proposicao_db = proposicoes_existentes_db.get(prop_id)
+                if id_proposicao_db is None:
+                    falhas.referenciar('proposicoes', f'{URL_PROPOSICOES}/{prop_id}', id_sessao)
+                elif (id_sessao_db, id_proposicao_db) not in links_existentes:
+                    escritor.adicionar({"id_votacao": id_sessao_db, "id_proposicao": id_proposicao_db})
+
+    falhas.gravar(session, 'sessoes', uris_sessoes)
+    falhas.gravar(session, 'proposicoes', [registro.uri for registro in registros_proposicoes] +
+                  [f'{URL_PROPOSICOES}/{prop_id}' for prop_id in ids_proposicoes_a_buscar])
+    session.commit()
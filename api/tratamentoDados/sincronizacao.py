@@ -0,0 +1,93 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+import requests
+from sqlmodel import Session, select
+from ..models.marca_sincronizacao import MarcaSincronizacao
+
+TAMANHO_BLOCO_HASH = 1024 * 1024
+# Bytes finais do arquivo pedidos (Range) para conferir a cópia local quando o servidor não manda ETag
+TAMANHO_CAUDA = 64 * 1024
+
+# Retorna a marca d'água de uma etapa (uma nova, ainda não salva, se a etapa nunca foi sincronizada)
+def obter_marca(session: Session, etapa: str) -> MarcaSincronizacao:
+    marca = session.exec(select(MarcaSincronizacao).where(MarcaSincronizacao.etapa == etapa)).first()
+    return marca or MarcaSincronizacao(etapa=etapa)
+
+# Atualiza os campos da marca d'água de uma etapa e grava no banco
+def registrar_marca(session: Session, etapa: str, **campos) -> MarcaSincronizacao:
+    marca = obter_marca(session, etapa)
+    for nome, valor in campos.items():
+        setattr(marca, nome, valor)
+    marca.atualizado_em = datetime.now().isoformat(timespec='seconds')
+    session.add(marca)
+    session.commit()
+    return marca
+
+# SHA-256 de um arquivo, lido em blocos
+def calcular_hash_arquivo(caminho: str) -> str:
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+# ETag (ou Last-Modified) do arquivo remoto, via HEAD. None se o servidor não informar.
+def consultar_versao_remota(http_session: requests.Session, url: str) -> Optional[str]:
+    try:
+        response = http_session.head(url, timeout=(5, 30), allow_redirects=True)
+        if response.status_code >= 400:
+            return None
+        return response.headers.get('ETag') or response.headers.get('Last-Modified')
+    except requests.exceptions.RequestException:
+        return None
+
+# Confere a cópia local com o arquivo remoto sem baixá-lo: pede só o final (Range) e compara o tamanho total
+# (Content-Range) e os últimos bytes. Os arquivos anuais crescem no fim, então uma versão nova muda os dois.
+# False se não conferem ou se o servidor não atende pedidos parciais (a resposta 200 não é lida).
+def cauda_remota_confere(http_session: requests.Session, url: str, caminho_local: str) -> bool:
+    tamanho_local = os.path.getsize(caminho_local)
+    try:
+        with http_session.get(url, headers={'Range': f"bytes=-{TAMANHO_CAUDA}", 'Accept-Encoding': 'identity'}, timeout=(5, 30), stream=True) as response:
+            if response.status_code != 206:
+                return False
+            tamanho_remoto = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if tamanho_remoto != str(tamanho_local):
+                return False
+            cauda_remota = response.raw.read(TAMANHO_CAUDA + 1)
+    except requests.exceptions.RequestException:
+        return False
+    with open(caminho_local, 'rb') as f:
+        f.seek(max(0, tamanho_local - TAMANHO_CAUDA))
+        return f.read() == cauda_remota
+
+# Verifica se o arquivo anual de uma etapa mudou desde a última sincronização.
+# Retorna (mudou, versao_remota). A cópia local só é apagada (para que a função de download da etapa baixe a
+# versão nova) quando o arquivo remoto é outro: ETag/Last-Modified diferente do guardado ou, se o servidor não
+# informa a versão, tamanho ou final do arquivo diferentes dos da cópia local.
+def verificar_arquivo_remoto(session: Session, http_session: requests.Session, etapa: str, url: str,
+                             caminho_local: str, progress_callback) -> Tuple[bool, Optional[str]]:
+    marca = obter_marca(session, etapa)
+    versao_remota = consultar_versao_remota(http_session, url)
+    if marca.hash_arquivo and os.path.exists(caminho_local):
+        if versao_remota:
+            igual = versao_remota == marca.etag
+        else:
+            igual = cauda_remota_confere(http_session, url, caminho_local)
+        if igual:
+            progress_callback('log', f"   - Arquivo de '{etapa}' não mudou desde {marca.atualizado_em}.")
+            return False, versao_remota
+
+    if os.path.exists(caminho_local):
+        os.remove(caminho_local)
+    return True, versao_remota
+
+# Depois do download: compara o hash com o da última sincronização (para servidores sem ETag).
+# Retorna (mudou, hash_arquivo).
+def conteudo_mudou(session: Session, etapa: str, caminho: str, progress_callback) -> Tuple[bool, str]:
+    hash_arquivo = calcular_hash_arquivo(caminho)
+    if hash_arquivo == obter_marca(session, etapa).hash_arquivo:
+        progress_callback('log', f"   - Conteúdo do arquivo de '{etapa}' é idêntico ao da última sincronização.")
+        return False, hash_arquivo
+    return True, hash_arquivo
@@ -0,0 +1,110 @@
+import glob
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, List
+from .database import DB_DIRECTORY, get_db_filepath
+
+# Tabelas de dados mostradas no status, na ordem em que o ETL as preenche, com o rótulo curto da coluna
+TABELAS_STATUS = {
+    "partido": "partidos",
+    "deputado": "deputados",
+    "despesa": "despesas",
+    "sessaovotacao": "sessoes",
+    "proposicao": "proposicoes",
+    "votacaoproposicao": "links",
+    "votoindividual": "votos",
+}
+
+# Anos que já têm banco na pasta 'dbs', em ordem crescente
+def anos_com_banco(diretorio: str = DB_DIRECTORY) -> List[int]:
+    anos = []
+    for caminho in glob.glob(os.path.join(diretorio, "camara_*.db")):
+        encontrado = re.fullmatch(r"camara_(\d{4})\.db", os.path.basename(caminho))
+        if encontrado:
+            anos.append(int(encontrado.group(1)))
+    return sorted(anos)
+
+# Tamanho em disco do banco, somando os arquivos -wal e -shm que o modo WAL mantém ao lado dele
+def tamanho_em_disco(caminho: str) -> int:
+    return sum(os.path.getsize(caminho + sufixo) for sufixo in ("", "-wal", "-shm") if os.path.exists(caminho + sufixo))
+
+# Abre o banco apenas para leitura, sem criar o arquivo se ele não existir
+def _conectar_leitura(caminho: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{os.path.abspath(caminho)}?mode=ro", uri=True)
+
+# Tempo de relógio do build: do início da primeira etapa ao fim da última (as etapas podem rodar em paralelo,
+# então a soma das durações é maior que o tempo de fato gasto)
+def _duracao_build(etapas: Dict[str, Dict]):
+    inicios = [e["iniciado_em"] for e in etapas.values() if e["iniciado_em"]]
+    fins = [e["concluido_em"] for e in etapas.values() if e["concluido_em"]]
+    if not inicios or not fins or len(fins) < len(etapas):
+        return None
+    return round((datetime.fromisoformat(max(fins)) - datetime.fromisoformat(min(inicios))).total_seconds(), 2)
+
+# Resumo de um banco anual: linhas por tabela, etapas do ETL (status e duração) e falhas ainda registradas.
+# Tabelas ausentes (banco antigo ou build interrompido no começo) aparecem como None.
+def resumo_banco(ano: int) -> Dict:
+    caminho = get_db_filepath(ano)
+    resumo = {"ano": ano, "caminho": caminho, "tamanho_bytes": tamanho_em_disco(caminho),
+              "linhas": {}, "etapas": {}, "duracao_build_segundos": None, "soma_etapas_segundos": None, "falhas": None, "erro": None}
+    if not os.path.exists(caminho):
+        resumo["erro"] = "banco não encontrado"
+        return resumo
+
+    try:
+        conexao = _conectar_leitura(caminho)
+        try:
+            existentes = {nome for (nome,) in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for tabela in TABELAS_STATUS:
+                resumo["linhas"][tabela] = conexao.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0] if tabela in existentes else None
+
+            if "checkpointetapa" in existentes:
+                for etapa, status, duracao, iniciado_em, concluido_em in conexao.execute(
+                        "SELECT etapa, status, duracao_segundos, iniciado_em, concluido_em FROM checkpointetapa ORDER BY id"):
+                    resumo["etapas"][etapa] = {"status": status, "duracao_segundos": duracao,
+                                               "iniciado_em": iniciado_em, "concluido_em": concluido_em}
+                duracoes = [e["duracao_segundos"] for e in resumo["etapas"].values() if e["duracao_segundos"] is not None]
+                resumo["soma_etapas_segundos"] = round(sum(duracoes), 2) if duracoes else None
+                resumo["duracao_build_segundos"] = _duracao_build(resumo["etapas"])
+
+            if "requisicaofalha" in existentes:
+                resumo["falhas"] = conexao.execute("SELECT COUNT(*) FROM requisicaofalha").fetchone()[0]
+        finally:
+            conexao.close()
+    except sqlite3.Error as e:
+        resumo["erro"] = str(e)
+    return resumo
+
+def _formatar_duracao(segundos) -> str:
+    if segundos is None:
+        return "-"
+    return f"{segundos:.1f}s" if segundos < 60 else f"{segundos / 60:.1f} min"
+
+def _formatar_tamanho(tamanho: int) -> str:
+    for unidade in ("B", "KB", "MB"):
+        if tamanho < 1024:
+            return f"{tamanho:.0f} {unidade}" if unidade == "B" else f"{tamanho:.1f} {unidade}"
+        tamanho /= 1024
+    return f"{tamanho:.2f} GB"
+
+# Tabela de texto com um banco por linha e, abaixo de cada um, as etapas do ETL (usada pelo 'status' da linha de comando)
+def formatar_status(resumos: List[Dict]) -> str:
+    if not resumos:
+        return f"Nenhum banco encontrado em '{DB_DIRECTORY}'."
+    cabecalho = (f"{'Ano':<6}{'Tamanho':>9}{'Build':>10}" + "".join(f"{rotulo:>12}" for rotulo in TABELAS_STATUS.values())
+                 + f"{'falhas':>8}")
+    linhas = [cabecalho, "-" * len(cabecalho)]
+    for r in resumos:
+        inicio = f"{r['ano']:<6}{_formatar_tamanho(r['tamanho_bytes']):>9}"
+        if r["erro"]:
+            linhas.append(f"{inicio}  ERRO: {r['erro']}")
+            continue
+        contagens = "".join(f"{('-' if r['linhas'][t] is None else r['linhas'][t]):>12}" for t in TABELAS_STATUS)
+        falhas = "-" if r["falhas"] is None else r["falhas"]
+        linhas.append(f"{inicio}{_formatar_duracao(r['duracao_build_segundos']):>10}{contagens}{falhas:>8}")
+        if r["etapas"]:
+            linhas.append("      etapas: " + ", ".join(
+                f"{etapa} {e['status']} ({_formatar_duracao(e['duracao_segundos'])})" for etapa, e in r["etapas"].items()))
+    return "\n".join(linhas)
@@ -1,42 +1,239 @@
+import json
+import os
 import requests
-from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from functools import partial
+from sqlalchemy import delete, func, or_
 from sqlmodel import Session, select
 from ..models.voto_individual import VotoIndividual
 from ..models.deputado import Deputado
 from ..models.sessao_votacao import SessaoVotacao
+from .arquivoStream import baixar_arquivo_em_partes, iterar_array_json_no_arquivo
+from .buscadorAsync import BuscadorAsync
+from .checkpoint import dividir_em_blocos, registrar_lote
+from .alocadorChaves import AlocadorChaves
+from .pipelineEtl import GravadorEmThread, buscar_em_fluxo_threads
+from .registroFalhas import RegistroFalhas, falhas_registradas, ids_com_falha
+from .eventosProgresso import MedidorProgresso
+from .sincronizacao import calcular_hash_arquivo, obter_marca, registrar_marca, verificar_arquivo_remoto
+from .datasRegistro import campos_data
+
+DATA_DIR = "data"
+
+URL_ARQUIVO_VOTOS = "https://dadosabertos.camara.leg.br/arquivos/votacoesVotos/json/votacoesVotos-{ano}.json"
+
+# Faz o download do arquivo anual de votos individuais (todas as votações do ano) para a pasta data
+def download_votos_file(ano: int, http_session: requests.Session, progress_callback) -> Optional[str]:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    json_filepath = os.path.join(DATA_DIR, f"votacoesVotos_{ano}.json")
+
+    if os.path.exists(json_filepath):
+        progress_callback('log', f"   - Arquivo '{json_filepath}' já existe localmente.")
+        return json_filepath
+
+    progress_callback('log', f"   - Baixando arquivo de votos individuais para o ano {ano}...")
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    try:
+        baixar_arquivo_em_partes(URL_ARQUIVO_VOTOS.format(ano=ano), json_filepath, http_session, headers=headers, timeout=600)
+        progress_callback('log', f"   - Arquivo salvo em '{json_filepath}'")
+        return json_filepath
+    except requests.exceptions.RequestException as e:
+        progress_callback('log', f"   - AVISO: Falha no download do arquivo de votos para {ano}, usando a API. Detalhes: {e}")
+        return None
+
+# Id do deputado de um voto. A API traz o objeto 'deputado_'; algumas versões do arquivo anual trazem 'deputado_id'.
+def extrair_id_deputado(voto: Dict) -> Optional[int]:
+    deputado_info = voto.get('deputado_') or {}
+    id_deputado = deputado_info.get('id') or voto.get('deputado_id')
+    return int(id_deputado) if id_deputado else None
+
+# Voto de um deputado cujos detalhes falharam (livro de falhas): a sessão é registrada como incompleta,
+# para que o reprocessamento busque os votos dela de novo depois de recuperar o deputado.
+def registrar_voto_sem_deputado(voto: Dict, uri_sessao: str, deputados_com_falha: set, falhas: RegistroFalhas):
+    id_deputado_api = extrair_id_deputado(voto)
+    if str(id_deputado_api) in deputados_com_falha:
+        falhas.registrar('votos', f"{uri_sessao}/votos", LookupError(f"Deputado {id_deputado_api} sem detalhes no banco"))
+
+# Monta a linha de VotoIndividual a partir de um voto da API ('tipoVoto'/'dataRegistroVoto')
+# ou do arquivo anual ('voto'/'dataHoraVoto'). Retorna None se o deputado não estiver no banco.
+def montar_linha_voto(voto: Dict, id_sessao_db: int, uri_sessao: str, mapa_deputados: Dict) -> Optional[Dict]:
+    id_deputado_api = extrair_id_deputado(voto)
+    deputado_db = mapa_deputados.get(id_deputado_api) if id_deputado_api else None
+    if deputado_db is None:
+        return None
+    id_deputado_db, sigla_partido = deputado_db
+    deputado_info = voto.get('deputado_') or {}
+    data_hora_registro = voto.get("dataRegistroVoto") or voto.get("dataHoraVoto")
+
+    return {
+        "id_votacao": id_sessao_db,
+        "id_deputado": id_deputado_db,
+        "tipo_voto": voto.get('tipoVoto') or voto.get('voto'),
+        "data_hora_registro": data_hora_registro,
+        **campos_data(data_hora_registro),
+        "sigla_partido_deputado": sigla_partido,
+        "uri_deputado": deputado_info.get('uri') or voto.get('deputado_uri'),
+        "uri_sessao_votacao": uri_sessao
+    }
+
+# Lê o arquivo anual de votos em streaming e envia ao gravador os votos das sessões conhecidas.
+# Retorna o conjunto de ids (do banco) das sessões que apareceram no arquivo.
+# sessoes_no_arquivo: conjunto preenchido durante a leitura, para quem chamou saber quais sessões o arquivo
+# já tinha alcançado se a leitura falhar no meio.
+def salvar_votos_do_arquivo(caminho: str, mapa_sessoes: Dict, mapa_deputados: Dict, votos_existentes: set,
+                            gravador: GravadorEmThread, progress_callback, deputados_com_falha: set = frozenset(),
+                            falhas: Optional[RegistroFalhas] = None, sessoes_no_arquivo: Optional[set] = None) -> set:
+    sessoes_no_arquivo = sessoes_no_arquivo if sessoes_no_arquivo is not None else set()
+    medidor = MedidorProgresso(progress_callback, 'votos', "Lendo votos do arquivo anual")
+    for voto in iterar_array_json_no_arquivo(caminho, chave='dados'):
+        medidor.avancar()
+        sessao_db = mapa_sessoes.get(str(voto.get('idVotacao')))
+        if sessao_db is None:
+            continue
+        id_sessao_db, uri_sessao = sessao_db
+        sessoes_no_arquivo.add(id_sessao_db)
+
+        linha = montar_linha_voto(voto, id_sessao_db, uri_sessao, mapa_deputados)
+        if linha is None:
+            if falhas:
+                registrar_voto_sem_deputado(voto, uri_sessao, deputados_com_falha, falhas)
+            continue
+        if (id_sessao_db, linha["id_deputado"]) in votos_existentes:
+            continue
+        gravador.adicionar(linha)
+        votos_existentes.add((id_sessao_db, linha["id_deputado"]))
+    medidor.concluir()
+    return sessoes_no_arquivo
+
+# Apaga os votos das sessões dadas e retorna quantos foram removidos. Não faz commit.
+def descartar_votos_das_sessoes(session: Session, ids_sessoes: set) -> int:
+    removidos = 0
+    for bloco in dividir_em_blocos(sorted(ids_sessoes)):
+        removidos += session.execute(delete(VotoIndividual).where(VotoIndividual.id_votacao.in_(bloco))).rowcount
+    return removidos
+
+# Marca d'água dos votos: maior id de sessão já considerado e data da sessão mais recente do ano que já tem votos.
+# Sessões sem votos depois dessa data voltam a ser consultadas na próxima sincronização.
+def registrar_marca_votos(session: Session, ano: int, versao_remota: Optional[str], caminho_arquivo: Optional[str]):
+    stmt_data = select(func.max(SessaoVotacao.data_hora_registro)).where(
+        SessaoVotacao.ano == ano,
+        SessaoVotacao.id.in_(select(VotoIndividual.id_votacao).distinct())
+    )
+    campos = {
+        "ultima_data_sessao": session.exec(stmt_data).one(),
+        "ultimo_id_sessao": session.exec(select(func.max(SessaoVotacao.id))).one(),
+    }
+    if caminho_arquivo and os.path.exists(caminho_arquivo):
+        campos.update(etag=versao_remota, hash_arquivo=calcular_hash_arquivo(caminho_arquivo))
+    registrar_marca(session, 'votos', **campos)
+
+# Extrai a lista de votos do corpo JSON de '{uri_sessao}/votos'
+def extrair_votos_json(conteudo: bytes) -> List[Dict]:
+    return json.loads(conteudo).get('dados', [])
 
 #  Busca os votos individuais de UMA sessão de votação e retorna a lista de votos
-def buscar_votos_por_sessao(uri_sessao: str, http_session: requests.Session) -> List[Dict]:
+# falhas: registra a URI no livro de falhas quando a requisição não dá certo (a sessão fica sem votos)
+def buscar_votos_por_sessao(uri_sessao: str, http_session: requests.Session, falhas: Optional[RegistroFalhas] = None) -> List[Dict]:
+    url_votos = f"{uri_sessao}/votos"
     try:
-        url_votos = f"{uri_sessao}/votos"
         response = http_session.get(url_votos, headers={'accept': 'application/json'}, timeout=30)
         response.raise_for_status()
-        return response.json().get('dados', [])
-    except requests.exceptions.RequestException:
+        return extrair_votos_json(response.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if falhas:
+            falhas.registrar('votos', url_votos, e)
         return []
 
+# Busca CONCORRENTE os votos de um conjunto de sessões, em fluxo: gera (sessao_db, votos) assim que a resposta
+# de cada sessão chega (fora de ordem), enquanto as próximas continuam sendo buscadas.
+def buscar_votos_em_fluxo(sessoes: List, http_session: requests.Session, buscador: Optional[BuscadorAsync],
+                          falhas: Optional[RegistroFalhas] = None, progress_callback=None) -> Iterator[Tuple[Any, List[Dict]]]:
+    falhas = falhas if falhas is not None else RegistroFalhas()
+    uris_sessoes = [s.uri for s in sessoes]
+    if buscador:
+        urls_votos = [f"{uri}/votos" for uri in uris_sessoes]
+        resultados_votos = buscador.buscar_em_fluxo(urls_votos, extrair_votos_json, headers={'accept': 'application/json'}, em_erro=falhas.em_erro('votos', list), etapa='votos')
+    else:
+        resultados_votos = buscar_em_fluxo_threads(uris_sessoes, partial(buscar_votos_por_sessao, http_session=http_session, falhas=falhas), max_workers=10)
+
+    with MedidorProgresso(progress_callback, 'votos', "Buscando votos das sessões", total=len(uris_sessoes)) as medidor:
+        for indice, lista_de_votos in resultados_votos:
+            yield sessoes[indice], lista_de_votos
+            medidor.avancar(votos=len(lista_de_votos))
+
+# Busca, monta e grava os votos das sessões pela API, em pipeline: a busca (BuscadorAsync ou threads), a montagem
+# das linhas (esta thread) e a gravação (GravadorEmThread) rodam ao mesmo tempo, ligadas por filas limitadas,
+# então só algumas sessões ficam em memória por vez. Os votos de cada sessão vão juntos ao gravador, que só faz
+# commit (e chama ao_confirmar, ex: checkpoint) entre sessões. No fim, as URIs que falharam vão para o livro de falhas.
+def salvar_votos_da_api(session: Session, sessoes: List, http_session: requests.Session, buscador: Optional[BuscadorAsync],
+                        mapa_deputados: Dict, votos_existentes: set, alocador: AlocadorChaves, progress_callback,
+                        falhas: RegistroFalhas, ao_confirmar=None):
+    deputados_com_falha = ids_com_falha(session, 'deputados')
+    tentadas, concluido = [], False
+    try:
+        with GravadorEmThread(session.get_bind(), VotoIndividual, progress_callback, nome="Votos individuais",
+                              alocador=alocador, ao_confirmar=ao_confirmar) as gravador:
+            for sessao_db, lista_de_votos_api in buscar_votos_em_fluxo(sessoes, http_session, buscador, falhas, progress_callback):
+                tentadas.append(f"{sessao_db.uri}/votos")
+                linhas_da_sessao = []
+                for voto_api in lista_de_votos_api:
+                    linha = montar_linha_voto(voto_api, sessao_db.id, sessao_db.uri, mapa_deputados)
+                    if linha is None:
+                        registrar_voto_sem_deputado(voto_api, sessao_db.uri, deputados_com_falha, falhas)
+                        continue # Pula voto se o deputado não estiver no nosso banco
+
+                    if (sessao_db.id, linha["id_deputado"]) in votos_existentes:
+                        continue
+
+                    linhas_da_sessao.append(linha)
+                    votos_existentes.add((sessao_db.id, linha["id_deputado"]))
+                gravador.enviar(linhas_da_sessao)
+        concluido = True
+    finally:
+        # Mesmo numa interrupção as falhas vão para o livro; só uma execução completa dá URIs como resolvidas
+        falhas.gravar(session, 'votos', tentadas if concluido else ())
+        session.commit()
+
 #  Busca os votos individuais para todas as sessões de um ano de forma concorrente e otimizada.
-def fetch_and_save_votos(session: Session, http_session: requests.Session, ano: int, progress_callback):
+# usar_arquivo: lê os votos do arquivo anual 'votacoesVotos-{ano}.json'; a API (um GET por sessão)
+# fica apenas para as sessões que não aparecem no arquivo.
+# incremental: não pula a etapa quando já há votos; processa só as sessões sem votos que são novas
+# (id acima da marca d'água) ou recentes (data a partir da última sessão que já tinha votos).
+# retomar: a etapa foi interrompida; sessões já gravadas são puladas e os votos do arquivo são conferidos por (sessão, deputado).
+# falhas: sessões cujos votos não puderam ser buscados na API são registradas no livro de falhas do banco.
+def fetch_and_save_votos(session: Session, http_session: requests.Session, ano: int, progress_callback, buscador: Optional[BuscadorAsync] = None,
+                         usar_arquivo: bool = True, incremental: bool = False, retomar: bool = False,
+                         falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
     progress_callback('log', f"-> Iniciando processamento de votos individuais para o ano {ano}...")
 
     stmt_verificacao = select(VotoIndividual)
     votos_existente = session.exec(stmt_verificacao).first()
 
-    if votos_existente:
+    if votos_existente and not (incremental or retomar):
         progress_callback('log', f"-> Votos para o ano {ano} já constam no banco. Etapa concluída.")
         return 
 
     # --- 1. Otimizações pré-loop: Carregar dados do DB em memória ---
     progress_callback('log', "   - Carregando dados do banco para otimização...")
     
-    # a) Busca apenas as sessões do ano de interesse do nosso banco
-    stmt_sessoes = select(SessaoVotacao).where(SessaoVotacao.data_hora_registro.like(f'{ano}%'))
+    # a) Busca apenas as sessões do ano de interesse do nosso banco (id, uri, id_dados_abertos)
+    stmt_sessoes = select(SessaoVotacao.id, SessaoVotacao.uri, SessaoVotacao.id_dados_abertos).where(SessaoVotacao.ano == ano)
+    if incremental:
+        marca = obter_marca(session, 'votos')
+        sessoes_com_votos = select(VotoIndividual.id_votacao).distinct()
+        stmt_sessoes = stmt_sessoes.where(SessaoVotacao.id.not_in(sessoes_com_votos))
+        if marca.ultimo_id_sessao is not None and marca.ultima_data_sessao:
+            stmt_sessoes = stmt_sessoes.where(or_(SessaoVotacao.id > marca.ultimo_id_sessao,
+                                                  SessaoVotacao.data_hora_registro >= marca.ultima_data_sessao))
     sessoes_do_ano_db = session.exec(stmt_sessoes).all()
     
-    # b) Cria um mapa de id_dados_abertos -> objeto Deputado completo
-    mapa_deputados = {dep.id_dados_abertos: dep for dep in session.exec(select(Deputado)).all()}
+    # b) Cria um mapa de id_dados_abertos -> (id, sigla_partido) do deputado.
+    # Tuplas simples não são expiradas pelos commits feitos a cada lote.
+    stmt_deputados = select(Deputado.id_dados_abertos, Deputado.id, Deputado.sigla_partido)
+    mapa_deputados = {id_da: (id_db, sigla) for id_da, id_db, sigla in session.exec(stmt_deputados).all()}
 
     # c) Pega os votos que já existem para as sessões deste ano para evitar duplicatas
     ids_sessoes_db = [s.id for s in sessoes_do_ano_db]
@@ -44,61 +241,92 @@ def fetch_and_save_votos(session: Session, http_session: requests.Session, ano:
     votos_existentes = set(session.exec(stmt_existentes).all())
     
     if not sessoes_do_ano_db:
-        progress_callback('log', "   - Nenhuma sessão de votação encontrada no banco para este ano.")
+        if incremental:
+            progress_callback('log', "-> Votos individuais já estão atualizados.")
+        else:
+            progress_callback('log', "   - Nenhuma sessão de votação encontrada no banco para este ano.")
         return
 
-    # --- 2. Busca CONCORRENTE dos votos de todas as sessões ---
-    progress_callback('log', f"   - Buscando votos para {len(sessoes_do_ano_db)} sessões simultaneamente...")
-    uris_sessoes = [s.uri for s in sessoes_do_ano_db]
-    
-    mapa_sessao_para_votos = {}
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        buscar_com_sessao = partial(buscar_votos_por_sessao, http_session=http_session)
-        resultados_votos = executor.map(buscar_com_sessao, uris_sessoes)
-        
-        total_sessoes_a_buscar = len(uris_sessoes)
-        for i, (sessao_db, lista_de_votos) in enumerate(zip(sessoes_do_ano_db, resultados_votos)):
-            mapa_sessao_para_votos[sessao_db.id] = lista_de_votos
-            
-            if (i + 1) % 100 == 0 or (i + 1) == total_sessoes_a_buscar:
-                print(f"\r      Buscando votos das sessões: {i + 1}/{total_sessoes_a_buscar}", end="", flush=True)
-        print()
-
-    # --- 3. Itera sobre os resultados e salva os votos novos ---
-    progress_callback('log', "   - Processando e salvando novos votos...")
-    objetos_voto_para_salvar = []
-    
-    for sessao_db in sessoes_do_ano_db:
-        lista_de_votos_api = mapa_sessao_para_votos.get(sessao_db.id, [])
-        
-        for voto_api in lista_de_votos_api:
-            deputado_info = voto_api.get('deputado_')
-            if not deputado_info or not deputado_info.get('id'):
-                continue
-                
-            id_deputado_api = int(deputado_info.get('id'))
-            deputado_db = mapa_deputados.get(id_deputado_api)
-
-            if deputado_db is None:
-                continue # Pula voto se o deputado não estiver no nosso banco
-            
-            if (sessao_db.id, deputado_db.id) in votos_existentes:
-                continue
-
-            novo_voto = VotoIndividual(
-                id_votacao=sessao_db.id,
-                id_deputado=deputado_db.id,
-                tipo_voto=voto_api.get('tipoVoto'),
-                data_hora_registro=voto_api.get("dataRegistroVoto"),
-                sigla_partido_deputado=deputado_db.sigla_partido,
-                uri_deputado=deputado_info.get('uri'),
-                uri_sessao_votacao=sessao_db.uri
-            )
-            objetos_voto_para_salvar.append(novo_voto)
-            votos_existentes.add((sessao_db.id, deputado_db.id))
-    
-    if objetos_voto_para_salvar:
-        progress_callback('log', f"   - Adicionando {len(objetos_voto_para_salvar)} novos registros de votos à sessão...")
-        session.add_all(objetos_voto_para_salvar)
+    # Chaves dos votos definidas pelo ETL, compartilhadas entre a leitura do arquivo e a busca na API
+    chaves_votos = AlocadorChaves(session, VotoIndividual)
+    registrar_checkpoint_votos = lambda sessao_escrita, linhas, _: registrar_lote(sessao_escrita, 'votos', registros=linhas)
+
+    # --- 2. Arquivo anual de votos (um único download em vez de um GET por sessão) ---
+    sessoes_pendentes = sessoes_do_ano_db
+    versao_remota = None
+    if usar_arquivo and incremental:
+        caminho_local = os.path.join(DATA_DIR, f"votacoesVotos_{ano}.json")
+        _, versao_remota = verificar_arquivo_remoto(session, http_session, 'votos', URL_ARQUIVO_VOTOS.format(ano=ano), caminho_local, progress_callback)
+    caminho_arquivo = download_votos_file(ano, http_session, progress_callback) if usar_arquivo else None
+    if caminho_arquivo:
+        progress_callback('log', "   - Lendo votos do arquivo anual...")
+        mapa_sessoes = {s.id_dados_abertos: (s.id, s.uri) for s in sessoes_do_ano_db}
+        sessoes_lidas = set()
+        try:
+            # A leitura do arquivo (esta thread) e a gravação (outra thread, com Session própria) acontecem ao mesmo tempo
+            with GravadorEmThread(session.get_bind(), VotoIndividual, progress_callback, nome="Votos individuais (arquivo)",
+                                  alocador=chaves_votos, ao_confirmar=registrar_checkpoint_votos) as gravador:
+                sessoes_no_arquivo = salvar_votos_do_arquivo(caminho_arquivo, mapa_sessoes, mapa_deputados, votos_existentes, gravador, progress_callback,
+                                                             ids_com_falha(session, 'deputados'), falhas, sessoes_lidas)
+            falhas.gravar(session, 'votos')
+            session.commit()
+            sessoes_pendentes = [s for s in sessoes_do_ano_db if s.id not in sessoes_no_arquivo]
+        except ValueError as e:
+            # Arquivo corrompido ou truncado: descarta para baixar de novo na próxima execução
+            progress_callback('log', f"   - AVISO: Arquivo de votos inválido ({e}), usando a API.")
+            os.remove(caminho_arquivo)
+            session.rollback()
+            # O gravador confirma grupos de linhas soltas, sem respeitar o limite das sessões, e ainda descarrega
+            # os grupos já enviados ao sair do bloco: as sessões alcançadas pelo arquivo podem ter ficado pela
+            # metade. Os votos delas são apagados para que a API grave cada uma por inteiro.
+            removidos = descartar_votos_das_sessoes(session, sessoes_lidas)
+            session.commit()
+            if removidos:
+                progress_callback('log', f"   - {removidos} votos de {len(sessoes_lidas)} sessões lidas do arquivo descartados.")
+            votos_existentes = set(session.exec(stmt_existentes).all())
+
+        if not sessoes_pendentes:
+            if incremental:
+                registrar_marca_votos(session, ano, versao_remota, caminho_arquivo)
+            progress_callback('log', "-> Processamento de votos individuais concluído.")
+            return
+        progress_callback('log', f"   - {len(sessoes_pendentes)} sessões não constam no arquivo, buscando na API...")
+
+    # Sessões que já têm votos foram gravadas por inteiro (bloco anterior ou execução interrompida)
+    ids_sessoes_com_votos = {id_votacao for id_votacao, _ in votos_existentes}
+    sessoes_pendentes = [s for s in sessoes_pendentes if s.id not in ids_sessoes_com_votos]
+
+    # --- 3. Busca, montagem e gravação dos votos das sessões restantes, em pipeline ---
+    if sessoes_pendentes:
+        progress_callback('log', f"   - Buscando votos para {len(sessoes_pendentes)} sessões simultaneamente...")
+        salvar_votos_da_api(session, sessoes_pendentes, http_session, buscador, mapa_deputados, votos_existentes, chaves_votos,
+                            progress_callback, falhas, ao_confirmar=registrar_checkpoint_votos)
+
+    if incremental:
+        registrar_marca_votos(session, ano, versao_remota, caminho_arquivo)
+    progress_callback('log', "-> Processamento de votos individuais concluído.")
+
+# Modo de reprocessamento: busca de novo só os votos das sessões registradas no livro de falhas
+def reprocessar_falhas_votos(session: Session, http_session: requests.Session, progress_callback, buscador: Optional[BuscadorAsync] = None,
+                             falhas: Optional[RegistroFalhas] = None):
+    falhas = falhas if falhas is not None else RegistroFalhas()
+    uris_falhas = [registro.uri for registro in falhas_registradas(session, 'votos')]
+    if not uris_falhas:
+        return
+    uris_sessoes = [uri[:-len("/votos")] for uri in uris_falhas if uri.endswith("/votos")]
+    sessoes = session.exec(select(SessaoVotacao.id, SessaoVotacao.uri, SessaoVotacao.id_dados_abertos)
+                           .where(SessaoVotacao.uri.in_(uris_sessoes))).all()
+    progress_callback('log', f"   - Buscando de novo os votos de {len(sessoes)} sessões...")
+
+    mapa_deputados = {id_da: (id_db, sigla) for id_da, id_db, sigla in
+                      session.exec(select(Deputado.id_dados_abertos, Deputado.id, Deputado.sigla_partido)).all()}
+    votos_existentes = set(session.exec(select(VotoIndividual.id_votacao, VotoIndividual.id_deputado)
+                                        .where(VotoIndividual.id_votacao.in_([s.id for s in sessoes]))).all())
+    salvar_votos_da_api(session, sessoes, http_session, buscador, mapa_deputados, votos_existentes,
+                        AlocadorChaves(session, VotoIndividual), progress_callback, falhas)
 
-    progress_callback('log', "-> Processamento de votos individuais concluído.")
\ No newline at end of file
+    # URIs de sessões que não estão mais no banco não têm o que reprocessar
+    orfas = set(uris_falhas) - {f"{s.uri}/votos" for s in sessoes}
+    if orfas:
+        falhas.gravar(session, 'votos', orfas)
+        session.commit()
@@ -1,14 +1,15 @@
-from sqlmodel import select, func
-from api.models.despesa import Despesa
+from sqlmodel import select
+from api.models.agregado_deputado import AgregadoDeputado
 
+# Total de despesas por deputado, lido da tabela agregada montada ao final do ETL (só deputados com despesas)
 def get_despesas_deputado_2024_subquery():
     
     despesas_subquery = (
         select(
-            Despesa.id_deputado,
-            func.sum(Despesa.valor_liquido).label("total_despesas")
+            AgregadoDeputado.id_deputado,
+            AgregadoDeputado.total_despesas
         )
-        .group_by(Despesa.id_deputado)
+        .where(AgregadoDeputado.quantidade_despesas > 0)
         .subquery() 
     )
     return despesas_subquery
\ No newline at end of file
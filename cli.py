@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import sys
+from api.tratamentoDados.processador import run_data_processing
+from api.tratamentoDados.backfillAnos import MAX_PROCESSOS_BACKFILL, ORCAMENTO_HTTP_GLOBAL, run_backfill
+from api.tratamentoDados.agendadorEtapas import MAX_ETAPAS_PARALELAS
+from api.tratamentoDados.analiseXml import PROCESSOS_PARSE
+from api.tratamentoDados.eventosProgresso import CAMINHO_LOG_EVENTOS, RenderizadorTerminal, criar_barramento
+from api.tratamentoDados.statusBancos import anos_com_banco, formatar_status, resumo_banco
+from api.tratamentoDados.migracoes import migrar_bancos
+
+# Linha de comando sem interface gráfica, para servidores (cron, systemd):
+#   python cli.py etl --year 2024
+#   python cli.py etl --years 2019-2024 --incremental
+#   python cli.py serve --host 0.0.0.0 --port 8000 --workers 4
+#   python cli.py status [--json]
+#   python cli.py migrate [ano ...]
+# Os caminhos 'dbs', 'data' e 'cache_http' são relativos à pasta atual, como no main_app.py.
+
+# Converte "2019-2024" (ou só "2024") no par (ano_inicial, ano_final)
+def intervalo_anos(texto: str):
+    partes = texto.split("-")
+    try:
+        if len(partes) == 1:
+            return int(partes[0]), int(partes[0])
+        if len(partes) == 2:
+            ano_inicial, ano_final = int(partes[0]), int(partes[1])
+            if ano_inicial <= ano_final:
+                return ano_inicial, ano_final
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"intervalo de anos inválido: '{texto}' (use, por exemplo, 2019-2024)")
+
+# Um ano roda direto no processo atual; um intervalo usa o backfill (um processo por ano).
+# O código de saída é 0 só se todos os anos terminaram com sucesso.
+def comando_etl(args) -> int:
+    opcoes = {"usar_async": not args.sync, "usar_cache": not args.sem_cache, "incremental": args.incremental,
+              "max_etapas_paralelas": args.etapas_paralelas, "processos_parse": args.processos_parse,
+              "reprocessar_falhas": args.retry_failed}
+    barramento = criar_barramento(RenderizadorTerminal(), caminho_jsonl=args.log_jsonl)
+    try:
+        if args.year is not None:
+            try:
+                return 0 if run_data_processing(args.year, barramento, **opcoes) else 1
+            except Exception as e:
+                barramento('log', f"ERRO CRÍTICO: {e}")
+                return 1
+
+        ano_inicial, ano_final = args.years
+        resultados = run_backfill(ano_inicial, ano_final, barramento, max_processos=args.processos,
+                                  orcamento_http=args.orcamento_http, **opcoes)
+        return 0 if resultados and all(r["ok"] for r in resultados.values()) else 1
+    finally:
+        barramento.fechar()
+
+# Sobe a API com o uvicorn. A aplicação é passada como "api.main:app" para que cada worker a importe no seu processo,
+# com o seu próprio registro de engines; as opções de aquecimento e threads chegam aos workers pelo ambiente.
+def comando_serve(args) -> int:
+    import uvicorn
+
+    if args.aquecer is not None:
+        os.environ["API_ANOS_AQUECIDOS"] = args.aquecer
+    if args.threads is not None:
+        os.environ["API_THREADS"] = str(args.threads)
+    uvicorn.run("api.main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level,
+                proxy_headers=args.proxy_headers, forwarded_allow_ips=args.forwarded_allow_ips)
+    return 0
+
+def comando_status(args) -> int:
+    anos = args.anos or anos_com_banco()
+    resumos = [resumo_banco(ano) for ano in anos]
+    if args.json:
+        print(json.dumps(resumos, ensure_ascii=False, indent=2))
+    else:
+        print(formatar_status(resumos))
+    return 1 if any(r["erro"] for r in resumos) else 0
+
+# Atualiza o esquema dos bancos já existentes (o 'etl' faz isso sozinho ao abrir o banco de um ano)
+def comando_migrate(args) -> int:
+    barramento = criar_barramento(RenderizadorTerminal())
+    try:
+        migrar_bancos(args.anos, barramento)
+    except Exception as e:
+        barramento('log', f"ERRO na migração: {e}")
+        return 1
+    finally:
+        barramento.fechar()
+    return 0
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Coleta de dados da Câmara dos Deputados e API, sem interface gráfica.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    etl = subparsers.add_parser("etl", help="monta (ou atualiza) o banco de um ano ou de um intervalo de anos")
+    anos = etl.add_mutually_exclusive_group(required=True)
+    anos.add_argument("--year", type=int, help="ano a processar")
+    anos.add_argument("--years", type=intervalo_anos, help="intervalo de anos, ex: 2019-2024 (um processo por ano)")
+    etl.add_argument("--incremental", action="store_true", help="busca apenas o que é novo ou mudou")
+    etl.add_argument("--retry-failed", action="store_true", help="busca de novo apenas as requisições registradas no livro de falhas")
+    etl.add_argument("--sem-cache", action="store_true", help="não usa o cache HTTP em disco")
+    etl.add_argument("--sync", action="store_true", help="usa threads em vez do BuscadorAsync para as requisições de detalhes")
+    etl.add_argument("--etapas-paralelas", type=int, default=MAX_ETAPAS_PARALELAS, help="etapas independentes rodando ao mesmo tempo")
+    etl.add_argument("--processos-parse", type=int, default=PROCESSOS_PARSE, help="processos que leem os XMLs de detalhes (0 = desligado)")
+    etl.add_argument("--processos", type=int, default=MAX_PROCESSOS_BACKFILL, help="com --years: anos processados ao mesmo tempo")
+    etl.add_argument("--orcamento-http", type=int, default=ORCAMENTO_HTTP_GLOBAL, help="com --years: requisições HTTP simultâneas somando todos os processos")
+    etl.add_argument("--log-jsonl", default=CAMINHO_LOG_EVENTOS, help="arquivo JSON-lines que recebe logs e eventos de progresso")
+    etl.set_defaults(funcao=comando_etl)
+
+    serve = subparsers.add_parser("serve", help="sobe a API (e o frontend) com o uvicorn")
+    serve.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    serve.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    serve.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", "1")), help="processos do uvicorn")
+    serve.add_argument("--log-level", default="info", choices=["critical", "error", "warning", "info", "debug"])
+    serve.add_argument("--proxy-headers", action="store_true", help="confia nos cabeçalhos X-Forwarded-* (atrás de um proxy reverso)")
+    serve.add_argument("--forwarded-allow-ips", default="127.0.0.1", help="IPs do proxy reverso aceitos com --proxy-headers")
+    serve.add_argument("--aquecer", help="anos abertos por cada worker ao subir, ex: 2023,2024 (padrão: os bancos mais recentes em 'dbs')")
+    serve.add_argument("--threads", type=int, help="threads por worker para as rotas síncronas (padrão do anyio: 40)")
+    serve.set_defaults(funcao=comando_serve)
+
+    status = subparsers.add_parser("status", help="linhas por tabela, duração do build e tamanho de cada banco anual")
+    status.add_argument("anos", type=int, nargs="*", help="anos a mostrar (padrão: todos os bancos em 'dbs')")
+    status.add_argument("--json", action="store_true", help="saída em JSON")
+    status.set_defaults(funcao=comando_status)
+
+    migrate = subparsers.add_parser("migrate", help="leva os bancos anuais já existentes ao esquema atual (colunas e índices novos)")
+    migrate.add_argument("anos", type=int, nargs="*", help="anos a migrar (padrão: todos os bancos em 'dbs')")
+    migrate.set_defaults(funcao=comando_migrate)
+    return parser
+
+def main(argv=None) -> int:
+    args = criar_parser().parse_args(argv)
+    return args.funcao(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,7 @@ import webbrowser
 import time
 import uvicorn
 from api.tratamentoDados.processador import run_data_processing
+from api.tratamentoDados.eventosProgresso import criar_barramento, formatar_evento
 from api.main import app as fastapi_app
 from style_config import configure_styles
 
@@ -58,6 +59,9 @@ class App:
         ttk.Label(main_frame, text="Progresso:").pack(anchor=tk.W, pady=(15, 0))
         self.progress_bar = ttk.Progressbar(main_frame, orient='horizontal', mode='determinate', length=400, style="TProgressbar", maximum=100)
         self.progress_bar.pack(fill=tk.X, pady=4)
+        # Último evento de progresso da etapa em andamento (contadores, taxa e tempo restante)
+        self.status_label = ttk.Label(main_frame, text="")
+        self.status_label.pack(anchor=tk.W)
 
         # --- Seção de Log ---
         ttk.Label(main_frame, text="Log de Atividades:").pack(anchor=tk.W, pady=(15, 0))
@@ -88,6 +92,8 @@ class App:
                     self.log(data)
                 elif message_type == 'progress':
                     self.progress_bar['value'] = data
+                elif message_type == 'evento':
+                    self.status_label.config(text=formatar_evento(data))
                 elif message_type == 'done':
                     self.start_button.config(state="normal")
         finally:
@@ -102,6 +108,7 @@ class App:
         self.start_button.config(state="disabled")
         self.progress_bar['value'] = 0
         self.progress_bar['maximum'] = 100  # Reset maximum for each run
+        self.status_label.config(text="")
         self.log_area.configure(state='normal')
         self.log_area.delete('1.0', tk.END)
         self.log_area.configure(state='disabled')
@@ -121,8 +128,8 @@ class App:
                 return s.getsockname()[1] # Retorna o número da porta alocada
             
     def main_orchestrator(self, year):
-        def progress_callback(msg_type, data):
-            self.queue.put((msg_type, data))
+        # A interface é um dos assinantes; com ETL_LOG_EVENTOS definido, tudo também vai para um arquivo JSON-lines
+        progress_callback = criar_barramento(lambda msg_type, data: self.queue.put((msg_type, data)))
 
         try:
             success = run_data_processing(year, progress_callback)
@@ -150,6 +157,7 @@ class App:
         except Exception as e:
             self.queue.put(('log', f"ERRO CRÍTICO: {e}"))
         finally:
+            progress_callback.fechar()
             self.queue.put(('done', None))
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import asyncio
+import socket
+import threading
+import time
+from collections import Counter
+
+import pytest
+from aiohttp import web
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from api.models.requisicao_falha import RequisicaoFalha
+from api.tratamentoDados.buscadorAsync import BuscadorAsync
+from api.tratamentoDados.orcamentoHttp import OrcamentoHttp
+from api.tratamentoDados.registroFalhas import RegistroFalhas
+
+# Servidor aiohttp local, numa thread com o seu próprio event loop (o BuscadorAsync roda o dele com asyncio.run).
+# /ok responde 200; /instavel/{n} responde 503 nas n primeiras chamadas; /limite responde 429 (Retry-After: 0)
+# na primeira; /erro sempre 500; /ausente sempre 404; /lento segura a resposta e mede quantas estão em andamento.
+class ServidorTeste:
+    def __init__(self):
+        self.chamadas = Counter()
+        self.em_andamento = 0
+        self.pico = 0
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._pronto = threading.Event()
+        self.porta = None
+
+    def url(self, caminho: str) -> str:
+        return f"http://127.0.0.1:{self.porta}{caminho}"
+
+    def zerar(self):
+        with self._lock:
+            self.chamadas.clear()
+            self.em_andamento = self.pico = 0
+
+    async def _responder(self, request: web.Request) -> web.Response:
+        caminho = request.path
+        with self._lock:
+            self.chamadas[caminho] += 1
+            chamada = self.chamadas[caminho]
+        if caminho == "/ok":
+            return web.Response(text="ok")
+        if caminho.startswith("/instavel/"):
+            return web.Response(status=503) if chamada <= int(caminho.rsplit("/", 1)[1]) else web.Response(text="ok")
+        if caminho == "/limite":
+            return web.Response(status=429, headers={"Retry-After": "0"}) if chamada == 1 else web.Response(text="ok")
+        if caminho == "/erro":
+            return web.Response(status=500)
+        if caminho.startswith("/lento/"):
+            with self._lock:
+                self.em_andamento += 1
+                self.pico = max(self.pico, self.em_andamento)
+            await asyncio.sleep(0.05)
+            with self._lock:
+                self.em_andamento -= 1
+            return web.Response(text=caminho)
+        return web.Response(status=404)
+
+    async def _iniciar(self):
+        app = web.Application()
+        app.router.add_route("GET", "/{caminho:.*}", self._responder)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        conexao = socket.socket()
+        conexao.bind(("127.0.0.1", 0))
+        self.porta = conexao.getsockname()[1]
+        await web.SockSite(self._runner, conexao).start()
+
+    def _rodar(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._iniciar())
+        self._pronto.set()
+        self._loop.run_forever()
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._rodar, daemon=True)
+        self._thread.start()
+        self._pronto.wait(5)
+
+    def parar(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+@pytest.fixture(scope="module")
+def servidor():
+    servidor = ServidorTeste()
+    servidor.iniciar()
+    yield servidor
+    servidor.parar()
+
+@pytest.fixture(autouse=True)
+def _zerar_servidor(servidor):
+    servidor.zerar()
+
+# Backoff curto e sem limite de taxa por host, para o teste não esperar os segundos do ETL
+def novo_buscador(**kwargs) -> BuscadorAsync:
+    opcoes = {"tentativas": 3, "backoff": 0.01, "requisicoes_por_segundo_por_host": 0}
+    opcoes.update(kwargs)
+    return BuscadorAsync(**opcoes)
+
+def test_repete_5xx_e_429_ate_conseguir(servidor):
+    urls = [servidor.url("/ok"), servidor.url("/instavel/2"), servidor.url("/limite")]
+    resultados = novo_buscador().buscar_todos(urls, lambda corpo: corpo.decode())
+
+    assert resultados == ["ok", "ok", "ok"]
+    assert servidor.chamadas["/ok"] == 1
+    assert servidor.chamadas["/instavel/2"] == 3
+    assert servidor.chamadas["/limite"] == 2
+
+def test_desiste_depois_das_tentativas_e_nao_repete_404(servidor):
+    erros = {}
+    def em_erro(url, erro):
+        erros[url] = erro
+
+    resultados = novo_buscador().buscar_todos([servidor.url("/erro"), servidor.url("/ausente")], lambda corpo: corpo, em_erro=em_erro)
+
+    assert resultados == [None, None]
+    assert servidor.chamadas["/erro"] == 4  # a primeira chamada e as 3 novas tentativas
+    assert servidor.chamadas["/ausente"] == 1
+    assert erros[servidor.url("/erro")].status == 500
+    assert erros[servidor.url("/ausente")].status == 404
+
+def test_respeita_o_limite_de_concorrencia(servidor):
+    urls = [servidor.url(f"/lento/{i}") for i in range(20)]
+    resultados = novo_buscador(max_concorrencia=3, concorrencia_inicial=3).buscar_todos(urls, lambda corpo: corpo.decode())
+
+    assert resultados == [f"/lento/{i}" for i in range(20)]
+    assert 1 < servidor.pico <= 3
+
+def test_respeita_o_orcamento_compartilhado(servidor):
+    orcamento = OrcamentoHttp(threading.Semaphore(2))
+    urls = [servidor.url(f"/lento/{i}") for i in range(12)]
+    novo_buscador(max_concorrencia=10, orcamento=orcamento).buscar_todos(urls, lambda corpo: corpo)
+
+    assert servidor.pico <= 2
+
+def test_falhas_vao_para_o_livro_de_falhas(servidor):
+    falhas = RegistroFalhas()
+    urls = [servidor.url("/ok"), servidor.url("/erro"), servidor.url("/instavel/1")]
+    resultados = novo_buscador().buscar_todos(urls, lambda corpo: corpo.decode(), em_erro=falhas.em_erro("votos", padrao=list))
+    assert resultados == ["ok", [], "ok"]
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=[RequisicaoFalha.__table__])
+    with Session(engine) as session:
+        falhas.gravar(session, "votos", urls)
+        session.commit()
+        registros = session.exec(select(RequisicaoFalha)).all()
+
+    assert [(r.uri, r.etapa, r.tentativas) for r in registros] == [(servidor.url("/erro"), "votos", 1)]
+    assert "HTTP 500" in registros[0].erro
+
+def test_taxa_por_host_vale_para_chamadas_em_paralelo(servidor):
+    buscador = novo_buscador(requisicoes_por_segundo_por_host=20)
+    urls = [servidor.url("/ok")] * 10
+    inicio = time.monotonic()
+    etapas = [threading.Thread(target=buscador.buscar_todos, args=(urls, lambda corpo: corpo), kwargs={"etapa": etapa})
+              for etapa in ("deputados", "votos")]
+    for etapa in etapas:
+        etapa.start()
+    for etapa in etapas:
+        etapa.join()
+
+    # 20 requisições ao mesmo host a 20/s: ao menos 19 intervalos de 50 ms, somando as duas etapas
+    assert servidor.chamadas["/ok"] == 20
+    assert time.monotonic() - inicio >= 0.9
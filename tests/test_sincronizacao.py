@@ -0,0 +1,86 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from sqlmodel import Session, SQLModel, create_engine
+
+from api.models.marca_sincronizacao import MarcaSincronizacao
+from api.tratamentoDados import sincronizacao
+
+# Servidor local que não manda ETag nem Last-Modified (como o de arquivos da Câmara) e atende 'Range: bytes=-N'
+class ArquivoSemVersao(BaseHTTPRequestHandler):
+    conteudo = b""
+    aceita_range = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.conteudo)))
+        self.end_headers()
+
+    def do_GET(self):
+        pedido = re.fullmatch(r"bytes=-(\d+)", self.headers.get("Range", ""))
+        if not (pedido and self.aceita_range):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(self.conteudo)))
+            self.end_headers()
+            self.wfile.write(self.conteudo)
+            return
+        inicio = max(0, len(self.conteudo) - int(pedido[1]))
+        parte = self.conteudo[inicio:]
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {inicio}-{len(self.conteudo) - 1}/{len(self.conteudo)}")
+        self.send_header("Content-Length", str(len(parte)))
+        self.end_headers()
+        self.wfile.write(parte)
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), ArquivoSemVersao)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=[MarcaSincronizacao.__table__])
+    with Session(engine) as session:
+        yield session
+
+# Cópia local já processada na sincronização anterior, com a marca d'água gravada
+def preparar(servidor, session, tmp_path, conteudo_local: bytes, conteudo_remoto: bytes, aceita_range=True):
+    ArquivoSemVersao.conteudo = conteudo_remoto
+    ArquivoSemVersao.aceita_range = aceita_range
+    caminho = tmp_path / "despesas_2024.json"
+    caminho.write_bytes(conteudo_local)
+    sincronizacao.registrar_marca(session, "despesas", hash_arquivo=sincronizacao.calcular_hash_arquivo(str(caminho)))
+    return f"http://127.0.0.1:{servidor.server_port}/despesas_2024.json", str(caminho)
+
+def verificar(session, url, caminho):
+    return sincronizacao.verificar_arquivo_remoto(session, requests.Session(), "despesas", url, caminho, lambda tipo, dado: None)
+
+ARQUIVO = b'{"dados": [' + b", ".join(b'{"id": %d}' % i for i in range(20000)) + b"]}"
+
+def test_sem_etag_mantem_a_copia_local_igual(servidor, session, tmp_path):
+    url, caminho = preparar(servidor, session, tmp_path, ARQUIVO, ARQUIVO)
+
+    assert verificar(session, url, caminho) == (False, None)
+    assert os.path.exists(caminho)
+
+def test_sem_etag_apaga_a_copia_local_que_mudou(servidor, session, tmp_path):
+    url, caminho = preparar(servidor, session, tmp_path, ARQUIVO, ARQUIVO[:-2] + b', {"id": 20000}]}')
+
+    assert verificar(session, url, caminho) == (True, None)
+    assert not os.path.exists(caminho)
+
+def test_sem_etag_e_sem_range_baixa_de_novo(servidor, session, tmp_path):
+    url, caminho = preparar(servidor, session, tmp_path, ARQUIVO, ARQUIVO, aceita_range=False)
+
+    assert verificar(session, url, caminho) == (True, None)
+    assert not os.path.exists(caminho)
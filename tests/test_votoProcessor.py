@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from sqlalchemy import func
+from sqlmodel import Session, SQLModel, create_engine, select
+
+# Todos os modelos ligados por relacionamento precisam estar registrados antes do primeiro mapeamento
+from api.models.checkpoint_etapa import CheckpointEtapa
+from api.models.deputado import Deputado
+from api.models.despesa import Despesa
+from api.models.marca_sincronizacao import MarcaSincronizacao
+from api.models.partido import Partido
+from api.models.proposicao import Proposicao
+from api.models.requisicao_falha import RequisicaoFalha
+from api.models.sessao_votacao import SessaoVotacao
+from api.models.votacao_proposicao import VotacaoProposicao
+from api.models.voto_individual import VotoIndividual
+from api.tratamentoDados import votoProcessor
+
+SESSOES = 600
+DEPUTADOS = [101, 102, 103]
+
+def votos_da_sessao(indice: int):
+    return [{"idVotacao": f"S{indice}", "voto": "Sim", "dataHoraVoto": "2024-03-01T10:00:00", "deputado_id": d}
+            for d in DEPUTADOS]
+
+# API local: '/votacoes/S{n}/votos' devolve os votos completos da sessão, no formato da API
+class ApiVotos(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        encontrado = re.fullmatch(r"/votacoes/S(\d+)/votos", self.path)
+        if not encontrado:
+            self.send_response(404)
+            self.end_headers()
+            return
+        dados = [{"tipoVoto": v["voto"], "dataRegistroVoto": v["dataHoraVoto"], "deputado_": {"id": v["deputado_id"]}}
+                 for v in votos_da_sessao(int(encontrado[1]))]
+        corpo = json.dumps({"dados": dados}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+@pytest.fixture
+def api_votos():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), ApiVotos)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_port}"
+    servidor.shutdown()
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch, api_votos):
+    monkeypatch.chdir(tmp_path)
+    engine = create_engine(f"sqlite:///{tmp_path / 'camara_2024.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for id_dados_abertos in DEPUTADOS:
+            session.add(Deputado(id_dados_abertos=id_dados_abertos, nome_eleitoral=f"Dep {id_dados_abertos}", sigla_partido="P", sigla_uf="DF"))
+        for indice in range(SESSOES):
+            session.add(SessaoVotacao(id_dados_abertos=f"S{indice}", ano=2024, descricao="votação",
+                                      uri=f"{api_votos}/votacoes/S{indice}"))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+# Arquivo anual cortado no meio de uma sessão, depois de o gravador já ter confirmado grupos de linhas
+def gravar_arquivo_truncado(votos_completos: int):
+    votos = [voto for indice in range(SESSOES) for voto in votos_da_sessao(indice)]
+    conteudo = json.dumps({"dados": votos})
+    corte = conteudo.index(json.dumps(votos[votos_completos]))
+    os.makedirs(votoProcessor.DATA_DIR, exist_ok=True)
+    with open(os.path.join(votoProcessor.DATA_DIR, "votacoesVotos_2024.json"), "w", encoding="utf-8") as arquivo:
+        arquivo.write(conteudo[:corte + 20])
+
+def test_arquivo_truncado_nao_deixa_sessoes_pela_metade(banco):
+    gravar_arquivo_truncado(votos_completos=3 * 400 + 1)
+    logs = []
+
+    with Session(banco) as session:
+        votoProcessor.fetch_and_save_votos(session, requests.Session(), 2024, lambda tipo, dado: logs.append(dado))
+
+    with Session(banco) as session:
+        votos_por_sessao = dict(session.exec(
+            select(VotoIndividual.id_votacao, func.count(VotoIndividual.id)).group_by(VotoIndividual.id_votacao)).all())
+    assert len(votos_por_sessao) == SESSOES
+    assert set(votos_por_sessao.values()) == {len(DEPUTADOS)}
+    assert any("Arquivo de votos inválido" in str(log) for log in logs)
+    assert not os.path.exists(os.path.join(votoProcessor.DATA_DIR, "votacoesVotos_2024.json"))